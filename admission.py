@@ -0,0 +1,237 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, Iterator, List
+
+import requests
+
+# Lower rank is served first when requests are queued
+PRIORITIES = ("login", "search", "bulk", "admin")
+
+_local = threading.local()
+
+
+class AdmissionRejected(requests.exceptions.ConnectionError):
+    """Raised when a request waited its whole queue deadline without being admitted.
+
+    Like CircuitOpen it is a RequestException, so the app.py helpers report it
+    through their existing error path instead of piling more load on the API.
+    """
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket: rate requests per second on average, bursts of up to burst"""
+    rate: float
+    burst: int
+
+
+class TokenBucket:
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(float(self.limit.burst), self.tokens + (now - self.updated_at) * self.limit.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available; 0 if one is available now"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.limit.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Run the enclosed API calls, on this thread, in the given priority class"""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority class {name!r}")
+    previous = getattr(_local, "priority", None)
+    _local.priority = name
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority() -> Optional[str]:
+    return getattr(_local, "priority", None)
+
+
+class _Waiter:
+    """One queued request; ordered by priority class, then arrival"""
+    __slots__ = ("rank", "seq", "endpoint", "cond", "granted", "cancelled")
+
+    def __init__(self, rank: int, seq: int, endpoint: str, cond: threading.Condition):
+        self.rank = rank
+        self.seq = seq
+        self.endpoint = endpoint
+        self.cond = cond
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class AdmissionController:
+    """Process-wide gate in front of the API: rate limits, a concurrency cap and a priority queue.
+
+    A request is admitted when a concurrency slot is free and its endpoint's
+    token bucket has a token. Otherwise it queues in its endpoint's heap,
+    ordered by priority class then arrival. Whenever a slot or token frees
+    up, the best head among the endpoints that could go now is admitted and
+    only that waiter is woken, so a rate-limited endpoint doesn't block the
+    rest and a release costs O(endpoints + log n), not a scan per waiter.
+    Each class has a queue deadline; a request still waiting at its deadline
+    is rejected with AdmissionRejected rather than joining a backlog the API
+    can't clear in time.
+    """
+
+    def __init__(self, max_concurrency: int = 16, limits: Optional[Dict[str, RateLimit]] = None,
+                 deadlines: Optional[Dict[str, float]] = None, default_priority: Optional[Dict[str, str]] = None):
+        self.max_concurrency = max_concurrency
+        self._buckets = {endpoint: TokenBucket(limit) for endpoint, limit in (limits or {}).items()}
+        self.deadlines = dict(deadlines or {})
+        self.default_priority = dict(default_priority or {})
+        self._in_flight = 0
+        self._queues: Dict[str, List[_Waiter]] = {}  # endpoint -> heap of waiting requests
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {name: {"admitted": 0, "queued": 0, "rejected": 0}
+                                                  for name in PRIORITIES}
+
+    def priority_for(self, endpoint: str) -> str:
+        """The caller's priority() class if set, else the endpoint's default, else admin"""
+        return current_priority() or self.default_priority.get(endpoint, "admin")
+
+    def _wait_time(self, endpoint: str, now: float) -> float:
+        bucket = self._buckets.get(endpoint)
+        return bucket.wait_time(now) if bucket is not None else 0.0
+
+    def _head(self, endpoint: str) -> Optional[_Waiter]:
+        heap = self._queues[endpoint]
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _dispatch(self, now: float, changed: Optional[str] = None):
+        """Admit queued requests while slots allow, best eligible head first; caller holds _lock.
+
+        changed names an endpoint whose head was just cancelled.
+        """
+        moved = {changed} if changed is not None else set()
+        while self._in_flight < self.max_concurrency:
+            ready = [head for head in map(self._head, list(self._queues))
+                     if head is not None and self._wait_time(head.endpoint, now) == 0.0]
+            if not ready:
+                break
+            waiter = min(ready)
+            heapq.heappop(self._queues[waiter.endpoint])
+            self._admit(waiter.endpoint)
+            waiter.granted = True
+            waiter.cond.notify()
+            moved.add(waiter.endpoint)
+        # A new head may be waiting on its bucket rather than a slot: let it time its own wake-up
+        for endpoint in moved:
+            head = self._head(endpoint)
+            if head is not None:
+                head.cond.notify()
+
+    def _admit(self, endpoint: str):
+        bucket = self._buckets.get(endpoint)
+        if bucket is not None:
+            bucket.take()
+        self._in_flight += 1
+
+    def acquire(self, endpoint: str) -> str:
+        """Block until the request may be sent and return its priority class; pair with release()"""
+        name = self.priority_for(endpoint)
+        start = time.monotonic()
+        deadline = start + self.deadlines.get(name, 30.0)
+        with self._lock:
+            waiter = _Waiter(PRIORITIES.index(name), next(self._seq), endpoint, threading.Condition(self._lock))
+            heapq.heappush(self._queues.setdefault(endpoint, []), waiter)
+            self._dispatch(start)
+            queued = not waiter.granted
+            while not waiter.granted:
+                now = time.monotonic()
+                if now >= deadline:
+                    waiter.cancelled = True
+                    self._stats[name]["rejected"] += 1
+                    self._dispatch(now, changed=endpoint)
+                    raise AdmissionRejected(f"{endpoint} not admitted within {deadline - start:.0f}s: "
+                                            f"the API is at its request budget")
+                # Only the head of a heap needs to wake when its bucket refills
+                refill = self._wait_time(endpoint, now) if self._head(endpoint) is waiter else 0.0
+                waiter.cond.wait(min(deadline - now, refill) if refill else deadline - now)
+                if not waiter.granted:
+                    self._dispatch(time.monotonic())
+            self._stats[name]["admitted"] += 1
+            self._stats[name]["queued"] += queued
+        return name
+
+    def try_acquire(self, endpoint: str) -> bool:
+        """Take a slot and token now if that delays no one; pair a True with release().
+
+        For optional extra requests such as hedges: fails if any request is
+        queued, the cap is reached or the endpoint's bucket is empty.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (self._in_flight >= self.max_concurrency or self._wait_time(endpoint, now) > 0.0
+                    or any(self._head(queued) is not None for queued in list(self._queues))):
+                return False
+            self._admit(endpoint)
+            self._stats[self.priority_for(endpoint)]["admitted"] += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting: Dict[str, int] = {}
+            for heap in self._queues.values():
+                for waiter in heap:
+                    if not waiter.cancelled:
+                        waiting[PRIORITIES[waiter.rank]] = waiting.get(PRIORITIES[waiter.rank], 0) + 1
+            return {
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "waiting": sum(waiting.values()),
+                "classes": {name: dict(counts, waiting=waiting.get(name, 0)) for name, counts in self._stats.items()},
+            }
+
+
+def with_priority(name: str, fn: Callable) -> Callable:
+    """fn wrapped to run in a priority class on whichever (worker) thread calls it"""
+    def wrapper(*args, **kwargs):
+        with priority(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+_shared_controller: Optional[AdmissionController] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_admission(max_concurrency: int = 16, limits: Optional[Dict[str, RateLimit]] = None,
+                         deadlines: Optional[Dict[str, float]] = None,
+                         default_priority: Optional[Dict[str, str]] = None) -> AdmissionController:
+    """Return the process-wide admission controller, creating it on first use"""
+    global _shared_controller
+    with _shared_lock:
+        if _shared_controller is None:
+            _shared_controller = AdmissionController(max_concurrency=max_concurrency, limits=limits,
+                                                     deadlines=deadlines, default_priority=default_priority)
+        return _shared_controller
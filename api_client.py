@@ -0,0 +1,499 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Sequence, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from admission import AdmissionController, AdmissionRejected
+from balancer import Backend, BackendPool
+from fanout import fan_out
+from metrics import ApiMetrics
+from profiler import NETWORK, track
+from resilience import CircuitBreaker, CircuitOpen, LatencyWindow
+from singleflight import SingleFlight
+
+TIMEOUT_MULTIPLIER = 3.0  # Adaptive timeout = this many times the recent p99, within policy bounds
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    """Timeout, retry, hedging and circuit-breaker behaviour for one API endpoint.
+
+    timeout is the ceiling; once enough latencies are seen the client uses
+    TIMEOUT_MULTIPLIER x p99, but never less than min_timeout. hedge sends a
+    second copy of a slow GET after the recent p95 and keeps the first answer.
+    """
+    timeout: float = 10.0
+    retries: int = 0
+    backoff_factor: float = 0.25
+    retry_statuses: Tuple[int, ...] = (502, 503, 504)
+    min_timeout: float = 1.0
+    hedge: bool = False
+    breaker_failures: int = 5
+    breaker_reset: float = 10.0
+    write: bool = False  # routed by the pool's write rule instead of least-latency
+    coalesce: bool = True  # identical concurrent GETs share one upstream request
+    revalidate: bool = False  # GETs send ETag/Last-Modified validators; a 304 is served from the last body
+
+
+# Reads are safe to retry; enroll/remove/clear are not, so they get a single attempt.
+# Face endpoints do model work, so their adaptive timeout never drops below 5 s
+DEFAULT_POLICIES: Dict[str, EndpointPolicy] = {
+    "health": EndpointPolicy(timeout=5, retries=1),
+    "collection_info": EndpointPolicy(timeout=10, retries=2, revalidate=True),
+    "collection_list": EndpointPolicy(timeout=10, retries=2, revalidate=True),
+    "enroll": EndpointPolicy(timeout=30, min_timeout=5, write=True),
+    "login": EndpointPolicy(timeout=30, retries=1, min_timeout=5),
+    "search": EndpointPolicy(timeout=30, retries=1, min_timeout=5),
+    "remove": EndpointPolicy(timeout=10, write=True),
+    "clear": EndpointPolicy(timeout=30, write=True),
+}
+
+
+@dataclass
+class Snapshot:
+    """Last 200 body of a revalidated GET and the validators that came with it"""
+    content: bytes
+    headers: Dict[str, str]
+    encoding: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_response(self, not_modified: requests.Response) -> requests.Response:
+        """A 200 Response carrying the stored body, for callers that never see the 304"""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK (not modified)"
+        response._content = self.content
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        return response
+
+
+@dataclass
+class ClientStats:
+    """Request counters kept by ApiClient"""
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    short_circuited: int = 0
+    hedges: int = 0
+    hedges_skipped: int = 0
+    rejected: int = 0
+    by_endpoint: Dict[str, int] = field(default_factory=dict)
+
+
+class ApiClient:
+    """Pooled, keep-alive HTTP client for the Face Recognition API.
+
+    A single instance is meant to be shared by every Streamlit session in the
+    process; requests.Session and its urllib3 pool are thread-safe for this use.
+    base_url may be a list of replicas, which are load-balanced by BackendPool.
+    """
+
+    def __init__(self, base_url: Union[str, Sequence[str]], pool_size: int = 10,
+                 policies: Optional[Dict[str, EndpointPolicy]] = None, write_routing: str = "primary",
+                 admission: Optional[AdmissionController] = None):
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.backends = BackendPool(urls, write_routing=write_routing)
+        self.base_url = self.backends.backends[0].url
+        self.pool_size = pool_size
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+
+        self._adapter = HTTPAdapter(pool_connections=len(urls), pool_maxsize=pool_size, pool_block=False)
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._stats = ClientStats()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._health_pool: Optional[ThreadPoolExecutor] = None
+        self._flights = SingleFlight()
+        self._snapshots: "OrderedDict[Tuple, Snapshot]" = OrderedDict()
+        self.max_snapshots = 256
+        self.metrics = ApiMetrics()
+        self.admission = admission
+
+    def policy(self, endpoint: str) -> EndpointPolicy:
+        """Return the policy for an endpoint, falling back to the defaults"""
+        return self.policies.get(endpoint, EndpointPolicy())
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                policy = self.policy(endpoint)
+                breaker = self._breakers[endpoint] = CircuitBreaker(policy.breaker_failures, policy.breaker_reset)
+            return breaker
+
+    def _window(self, endpoint: str) -> LatencyWindow:
+        with self._lock:
+            window = self._windows.get(endpoint)
+            if window is None:
+                window = self._windows[endpoint] = LatencyWindow()
+            return window
+
+    def timeout_for(self, endpoint: str) -> float:
+        """Current adaptive timeout: a multiple of recent p99, clamped to the policy"""
+        policy = self.policy(endpoint)
+        p99 = self._window(endpoint).quantile(0.99)
+        if p99 is None:
+            return policy.timeout
+        return min(policy.timeout, max(policy.min_timeout, p99 * TIMEOUT_MULTIPLIER))
+
+    def request(self, endpoint: str, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request through the endpoint's circuit breaker, retrying per its policy.
+
+        Identical GETs already in flight from other sessions are joined rather
+        than sent again; every caller gets the same (fully read) Response.
+        For revalidated endpoints a 304 comes back as the stored 200 body.
+        Raises requests.exceptions.RequestException once retries are exhausted,
+        or CircuitOpen (also a RequestException) without touching the network
+        while the breaker is open, so callers keep their existing error handling.
+        """
+        with track(NETWORK):
+            return self._coalesced(endpoint, method, path, **kwargs)
+
+    def _coalesced(self, endpoint: str, method: str, path: str, **kwargs) -> requests.Response:
+        policy = self.policy(endpoint)
+        if method != "GET" or not set(kwargs) <= {"params", "timeout"}:
+            return self._request(endpoint, method, path, **kwargs)
+
+        key = (endpoint, path, tuple(sorted((kwargs.get("params") or {}).items())))
+        if policy.revalidate:
+            fetch = lambda: self._conditional_get(endpoint, path, key, **kwargs)
+        else:
+            fetch = lambda: self._request(endpoint, method, path, **kwargs)
+        if not policy.coalesce:
+            return fetch()
+        response, shared = self._flights.do(key, fetch)
+        if shared:
+            self.metrics.record_coalesced(endpoint)
+        return response
+
+    def _conditional_get(self, endpoint: str, path: str, key: Tuple, **kwargs) -> requests.Response:
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        headers = snapshot.conditional_headers() if snapshot is not None else {}
+        response = self._request(endpoint, "GET", path, headers=headers or None, **kwargs)
+
+        if response.status_code == 304 and snapshot is not None:
+            self.metrics.record_not_modified(endpoint, len(snapshot.content))
+            return snapshot.to_response(response)
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            with self._lock:
+                self._snapshots[key] = Snapshot(content=response.content, headers=dict(response.headers),
+                                                encoding=response.encoding, etag=etag, last_modified=last_modified)
+                self._snapshots.move_to_end(key)
+                while len(self._snapshots) > self.max_snapshots:
+                    self._snapshots.popitem(last=False)
+        return response
+
+    def _request(self, endpoint: str, method: str, path: str, **kwargs) -> requests.Response:
+        """Wait for admission (when configured), then send with retries.
+
+        Time spent queued is recorded apart from upstream latency, which only
+        covers the attempts themselves.
+        """
+        if self.admission is None:
+            return self._attempts(endpoint, method, path, **kwargs)
+        start = time.perf_counter()
+        try:
+            priority_class = self.admission.acquire(endpoint)
+        except AdmissionRejected:
+            self.metrics.observe_queue_wait(endpoint, self.admission.priority_for(endpoint),
+                                            time.perf_counter() - start, admitted=False)
+            with self._lock:
+                self._stats.rejected += 1
+                self._stats.failures += 1
+            raise
+        self.metrics.observe_queue_wait(endpoint, priority_class, time.perf_counter() - start)
+        try:
+            return self._attempts(endpoint, method, path, **kwargs)
+        finally:
+            self.admission.release()
+
+    def _attempts(self, endpoint: str, method: str, path: str, **kwargs) -> requests.Response:
+        policy = self.policy(endpoint)
+        breaker = self.breaker(endpoint)
+        fixed_timeout = kwargs.pop("timeout", None)
+
+        attempt = 0
+        tried: List[Backend] = []
+        while True:
+            if not breaker.allow():
+                self.metrics.record_error(endpoint, "circuit_open")
+                with self._lock:
+                    self._stats.short_circuited += 1
+                    self._stats.failures += 1
+                raise CircuitOpen(f"Circuit open for {endpoint}: the API is failing, not retrying yet")
+            self._count(endpoint, retry=attempt > 0)
+            timeout = fixed_timeout if fixed_timeout is not None else self.timeout_for(endpoint)
+            hedge_after = self._window(endpoint).quantile(0.95) if policy.hedge and method == "GET" else None
+            # Retries go to a different replica when there is one
+            backend = self.backends.pick(write=policy.write, exclude=tried)
+            tried.append(backend)
+            try:
+                if hedge_after is not None:
+                    response = self._send_hedged(endpoint, method, backend, path, hedge_after,
+                                                 timeout=timeout, **kwargs)
+                else:
+                    response = self._send(endpoint, method, backend, path, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException:
+                breaker.record_failure()
+                if attempt >= policy.retries:
+                    self._count_failure()
+                    raise
+            except Exception:
+                breaker.record_failure()
+                raise
+            else:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code not in policy.retry_statuses or attempt >= policy.retries:
+                    return response
+                response.close()
+            time.sleep(policy.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    def _send(self, endpoint: str, method: str, backend: Backend, path: str, **kwargs) -> requests.Response:
+        """One timed attempt against one replica; feeds metrics, the latency window and the pool"""
+        self.backends.start(backend)
+        penalty = self.policy(endpoint).timeout
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{backend.url}{path}", **kwargs)
+        except requests.exceptions.RequestException as e:
+            latency = time.perf_counter() - start
+            self.backends.finish(backend, latency, ok=False, penalty=penalty)
+            self._observe_failure(endpoint, e, latency)
+            if isinstance(e, requests.exceptions.Timeout):
+                # Count the timeout as a (censored) sample so a slowdown widens the budget
+                self._window(endpoint).add(latency)
+            raise
+        except Exception:
+            self.backends.finish(backend, time.perf_counter() - start, ok=False, penalty=penalty)
+            raise
+        latency = time.perf_counter() - start
+        self.backends.finish(backend, latency, ok=response.status_code < 500, penalty=penalty)
+        self._observe(endpoint, response, latency)
+        if response.status_code < 500:
+            self._window(endpoint).add(latency)
+        return response
+
+    def _send_hedged(self, endpoint: str, method: str, backend: Backend, path: str, hedge_after: float,
+                     **kwargs) -> requests.Response:
+        """Send once; if no answer within hedge_after seconds, send again and take the first reply.
+
+        The second copy goes to another replica when there is one. With
+        admission control it needs a slot of its own, taken only if that
+        delays no queued request; otherwise the hedge is skipped.
+        """
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="api-hedge")
+            pool = self._hedge_pool
+        primary = pool.submit(self._send, endpoint, method, backend, path, **kwargs)
+        if wait([primary], timeout=hedge_after).done:
+            return primary.result()
+        if self.admission is not None and not self.admission.try_acquire(endpoint):
+            with self._lock:
+                self._stats.hedges_skipped += 1
+            return primary.result()
+
+        with self._lock:
+            self._stats.hedges += 1
+        backup = self.backends.pick(exclude=[backend])
+        hedge = pool.submit(self._send, endpoint, method, backup, path, **kwargs)
+        if self.admission is not None:
+            # The slot is held until the hedge's upstream request ends, even if it loses the race
+            hedge.add_done_callback(lambda _: self.admission.release())
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    loser.add_done_callback(_close_response)
+                return future.result()
+        raise error
+
+    def get(self, endpoint: str, path: str, **kwargs) -> requests.Response:
+        return self.request(endpoint, "GET", path, **kwargs)
+
+    def post(self, endpoint: str, path: str, **kwargs) -> requests.Response:
+        return self.request(endpoint, "POST", path, **kwargs)
+
+    def delete(self, endpoint: str, path: str, **kwargs) -> requests.Response:
+        return self.request(endpoint, "DELETE", path, **kwargs)
+
+    def _observe(self, endpoint: str, response: requests.Response, latency: float):
+        body = response.request.body
+        request_bytes = len(body) if isinstance(body, (bytes, str)) else 0
+        self.metrics.observe(endpoint, str(response.status_code), latency,
+                             request_bytes=request_bytes, response_bytes=len(response.content))
+        if response.status_code >= 500:
+            self.metrics.record_error(endpoint, "http_5xx")
+
+    def _observe_failure(self, endpoint: str, error: requests.exceptions.RequestException, latency: float):
+        if isinstance(error, requests.exceptions.Timeout):
+            kind = "timeout"
+        elif isinstance(error, requests.exceptions.ConnectionError):
+            kind = "connection"
+        else:
+            kind = "other"
+        self.metrics.observe(endpoint, "timeout" if kind == "timeout" else "error", latency)
+        self.metrics.record_error(endpoint, kind)
+
+    def _count(self, endpoint: str, retry: bool = False):
+        with self._lock:
+            self._stats.requests += 1
+            self._stats.by_endpoint[endpoint] = self._stats.by_endpoint.get(endpoint, 0) + 1
+            if retry:
+                self._stats.retries += 1
+
+    def _count_failure(self):
+        with self._lock:
+            self._stats.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Request and connection-reuse counters.
+
+        Connection numbers come from the urllib3 pool: every request that did
+        not need a new connection was served over a kept-alive one.
+        """
+        pools = self._adapter.poolmanager.pools
+        opened = pooled_requests = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                pooled_requests += pool.num_requests
+        with self._lock:
+            return {
+                "requests": self._stats.requests,
+                "retries": self._stats.retries,
+                "failures": self._stats.failures,
+                "short_circuited": self._stats.short_circuited,
+                "hedges": self._stats.hedges,
+                "hedges_skipped": self._stats.hedges_skipped,
+                "rejected": self._stats.rejected,
+                "coalesced": self._flights.stats()["followers"],
+                "by_endpoint": dict(self._stats.by_endpoint),
+                "pool_size": self.pool_size,
+                "connections_opened": opened,
+                "connections_reused": max(pooled_requests - opened, 0),
+            }
+
+    def check_backends(self) -> Dict[str, Any]:
+        """GET /health on every replica in parallel and eject or restore each one.
+
+        Health checks bypass the circuit breaker (they are what closes it);
+        returns {url: Response, or an error message}. They run on their own
+        small pool, since the status monitor calls this from the shared
+        fan-out pool; a check that missed the local deadline is not held
+        against its replica.
+        """
+        policy = self.policy("health")
+        with self._lock:
+            if self._health_pool is None:
+                self._health_pool = ThreadPoolExecutor(max_workers=max(1, len(self.backends.backends)),
+                                                       thread_name_prefix="api-health")
+            pool = self._health_pool
+        calls = {b.url: (lambda b=b: self._send("health", "GET", b, "/health", timeout=policy.timeout))
+                 for b in self.backends.backends}
+        reads = fan_out(calls, deadline=policy.timeout + 1, executor=pool)
+        results: Dict[str, Any] = {}
+        for backend in self.backends.backends:
+            read = reads[backend.url]
+            if not read.timed_out:
+                self.backends.mark_health(backend, read.ok and read.value.status_code == 200)
+            results[backend.url] = read.value if read.ok else (read.error or "Health check timed out")
+        breaker = self.breaker("health")
+        if any(isinstance(r, requests.Response) and r.status_code == 200 for r in results.values()):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        return results
+
+    def apply_health(self, backends: Dict[str, bool]):
+        """Apply replica health checked by another worker, as check_backends would have"""
+        for backend in self.backends.backends:
+            if backend.url in backends:
+                self.backends.mark_health(backend, backends[backend.url])
+        breaker = self.breaker("health")
+        if any(backends.values()):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def breakers(self) -> Dict[str, Dict[str, Any]]:
+        """Breaker state and current adaptive timeout for every endpoint used so far"""
+        with self._lock:
+            endpoints = sorted(self._breakers)
+        return {endpoint: dict(self.breaker(endpoint).snapshot(), timeout=self.timeout_for(endpoint))
+                for endpoint in endpoints}
+
+    def close(self):
+        self.session.close()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        if self._health_pool is not None:
+            self._health_pool.shutdown(wait=False)
+
+
+def _close_response(future: Future):
+    """Release the connection held by a hedged request that lost the race"""
+    if future.exception() is None:
+        future.result().close()
+
+
+_shared_clients: Dict[str, ApiClient] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_client(base_url: Union[str, Sequence[str]], pool_size: int = 10,
+                      policies: Optional[Dict[str, EndpointPolicy]] = None,
+                      write_routing: str = "primary",
+                      admission: Optional[AdmissionController] = None) -> ApiClient:
+    """Return the process-wide client for base_url (one URL or a list of replicas).
+
+    Kept at module level rather than in st.cache_resource so worker threads
+    without a Streamlit script context can use it too.
+    """
+    with _shared_lock:
+        key = base_url if isinstance(base_url, str) else ",".join(base_url)
+        client = _shared_clients.get(key)
+        if client is None:
+            client = ApiClient(base_url, pool_size=pool_size, policies=policies, write_routing=write_routing,
+                               admission=admission)
+            _shared_clients[key] = client
+        return client
@@ -1,12 +1,87 @@
 import streamlit as st
 import requests
-from PIL import Image
-from typing import Optional, Dict, Any
-from io import BytesIO
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Dict, Any, List, Tuple
 from urllib.parse import urlparse
 
+from dataclasses import replace
+from admission import AdmissionController, RateLimit, get_shared_admission, priority, with_priority
+from api_client import ApiClient, DEFAULT_POLICIES, get_shared_client
+from monitor import StatusMonitor, get_shared_monitor
+from images import ImageCache, ImageProbeError, ImageTooLarge, get_shared_image_cache
+from host_cache import HostCache, get_shared_host_cache
+from bulk import (EnrollmentRow, validate_phone, parse_manifest, iter_queued_enroll, row_idempotency_key,
+                  summarize, outcomes_to_csv)
+from audit import parse_probes, iter_audit, load_records, summarize_audit
+from roster import RosterStore, get_shared_roster_store
+from thumbnails import ThumbnailCache, get_shared_thumbnail_cache
+from uploads import PreparedUpload, prepare_upload
+from metrics import ensure_metrics_server
+from result_cache import ResultCache, content_key, get_shared_result_cache
+from enroll_queue import EnrollJob, EnrollmentQueue, get_shared_queue
+from dedupe import BulkDuplicateGuard, DuplicateIndex, dhash, get_shared_duplicate_index
+from frames import FrameBurst, FrameScore, login_best_frames
+from speculative import Speculator, speculation_stats
+from profiler import DECODE, NETWORK, RenderProfiler, current_rerun, get_shared_profiler, phase, profiled, track
+
 # Configuration
 API_BASE_URL = "http://35.154.225.172:8003"  # Update this to match your API server
+API_BACKENDS: List[str] = []  # All API replicas, e.g. ["http://10.0.0.5:8003", ...]; empty means API_BASE_URL only
+API_WRITE_ROUTING = "primary"  # Writes go to the first available replica ("primary") or are balanced ("balanced")
+API_POOL_SIZE = 20  # Max kept-alive connections shared by all sessions
+API_MAX_IN_FLIGHT = 16  # API requests this process sends at once, across all sessions; the rest queue
+API_RATE_LIMITS = {  # Token buckets per endpoint (requests/s, burst); unlisted endpoints are not rate limited
+    "login": RateLimit(rate=20, burst=40),
+    "search": RateLimit(rate=10, burst=20),
+    "enroll": RateLimit(rate=5, burst=10),
+}
+API_PRIORITY = {"login": "login", "search": "search", "enroll": "bulk"}  # Queue class per endpoint; others are "admin"
+API_QUEUE_DEADLINES = {"login": 10, "search": 10, "bulk": 60, "admin": 5}  # Seconds a request may queue before it fails
+API_HEDGE_READS = False  # Re-send slow /health and /collection/* reads after the recent p95
+STATUS_POLL_INTERVAL = 10  # Seconds between background health/collection polls
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024  # Memory budget for cached image downloads
+IMAGE_CACHE_MAX_AGE = 300  # Seconds before a cached image is revalidated
+IMAGE_MAX_BYTES = 10 * 1024 * 1024  # Larger images are probed but never buffered
+HOST_CACHE_PATH = ".host_cache.db"  # Responses and images shared by every frontend process on this host (SQLite, WAL)
+HOST_CACHE_BYTES = 512 * 1024 * 1024  # Disk budget for the host cache; least recently read entries go first
+HOST_HEALTH_TTL = 5  # Seconds one worker's health check answers for the whole host
+THUMBNAIL_DIR = ".thumbnail_cache"  # On-disk previews, kept across restarts
+THUMBNAIL_CACHE_BYTES = 256 * 1024 * 1024  # Disk budget for previews
+THUMBNAIL_MAX_SIDE = 600  # Preview size in pixels (2x the 300px display width)
+UPLOAD_MAX_SIDE = 1024  # Uploaded photos are downscaled to this longest side
+UPLOAD_TARGET_BYTES = 200 * 1024  # JPEG size the upload encoder aims for
+API_UPLOAD_FIELD = "file"  # Multipart field name the API reads uploads from
+METRICS_PORT = int(os.environ.get("FACE_METRICS_PORT", 9108))  # Prometheus /metrics for API client metrics; 0 disables it
+METRICS_HOST = os.environ.get("FACE_METRICS_HOST", "127.0.0.1")  # Unauthenticated: loopback unless scraped from elsewhere
+METRICS_PORT_SPAN = 16  # Workers on one host take the first free port of METRICS_PORT .. METRICS_PORT + 15
+BULK_MAX_CONCURRENCY = 16  # Upper bound for the bulk photo check/queueing worker pool
+AUDIT_DIR = "audit_runs"  # Batch audit results are appended here as JSON lines
+ROSTER_TTL = 30  # Seconds the management page reuses its roster index
+ROSTER_FETCH_PAGE = 5000  # Phones requested per /collection/list page
+RESULT_CACHE_ENTRIES = 1024  # Login/search results kept per process
+RESULT_CACHE_TTL = 300  # Seconds a result is trusted without a collection change
+DEDUPE_INDEX_PATH = ".dedupe_index.jsonl"  # Perceptual hashes of enrolled photos, kept across restarts
+DEDUPE_MAX_DISTANCE = 6  # dHash bits (of 64) within which two photos count as duplicates
+DEDUPE_SESSION_HASHES = 16  # Photo hashes each session remembers, so reruns don't re-download and re-decode
+ENROLL_QUEUE_PATH = "enroll_queue.db"  # Durable queue of pending enrollments (SQLite, WAL)
+ENROLL_QUEUE_CONCURRENCY = 4  # Parallel /enroll calls made by the queue drainer
+ENROLL_QUEUE_BATCH = 16  # Jobs claimed per drain cycle
+ENROLL_QUEUE_WAIT = 3  # Seconds the enroll page waits for a queued job before moving on
+LOGIN_BURST_MAX_FRAMES = 60  # Frames scored per login burst; extra frames are ignored
+LOGIN_BURST_ATTEMPTS = 2  # Best-scoring frames sent to /login before giving up
+LOGIN_MIN_SIDE = 320  # Frames with a shorter side below this score lower
+# Opt-in: a speculative /login is a real authentication event, and a speculative /search real backend
+# load, sent whether or not the button is clicked. When off, only the photo download is started early.
+SPECULATE_LOGIN = False  # Send /login in the background once a photo is given; the click uses the ready result
+SPECULATE_SEARCH = False  # Send /search the same way, at the current match limit
+SPECULATION_TTL = 60  # Seconds a speculative result stays usable
+PROFILE_RERUNS = False  # Time every rerun by phase (network / decode / render); can be switched on from Admin
+PROFILE_CALLS = False  # Also run each rerun under cProfile (one session at a time); noticeably slower
+PROFILE_WINDOW = 50  # Recent reruns kept for the admin page
 
 # Page configuration
 st.set_page_config(
@@ -65,183 +140,607 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def get_profiler() -> RenderProfiler:
+    """Return the process-wide rerun profiler"""
+    return get_shared_profiler(window=PROFILE_WINDOW, enabled=PROFILE_RERUNS, capture_calls=PROFILE_CALLS)
+
+def get_admission() -> AdmissionController:
+    """Return the process-wide admission controller in front of the API"""
+    return get_shared_admission(max_concurrency=API_MAX_IN_FLIGHT, limits=API_RATE_LIMITS,
+                                deadlines=API_QUEUE_DEADLINES, default_priority=API_PRIORITY)
+
+def get_api_client() -> ApiClient:
+    """Return the process-wide API client shared by every session"""
+    policies = None
+    if API_HEDGE_READS:
+        policies = {name: replace(DEFAULT_POLICIES[name], hedge=True)
+                    for name in ("health", "collection_info", "collection_list")}
+    return get_shared_client(API_BACKENDS or API_BASE_URL, pool_size=API_POOL_SIZE, policies=policies,
+                             write_routing=API_WRITE_ROUTING, admission=get_admission())
+
+def render_metrics() -> str:
+    """Prometheus text for everything the frontend measures about the API"""
+    return get_api_client().metrics.render_prometheus()
+
+def get_host_cache() -> HostCache:
+    """Return the cache shared with the other frontend processes on this host"""
+    return get_shared_host_cache(HOST_CACHE_PATH, max_bytes=HOST_CACHE_BYTES, max_entry_bytes=IMAGE_MAX_BYTES)
+
 def check_api_health() -> Dict[str, Any]:
-    """Check if the API is running and healthy"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
-        return {
-            "status": "healthy" if response.status_code == 200 else "unhealthy",
-            "data": response.json() if response.status_code == 200 else None
-        }
-    except requests.exceptions.RequestException:
-        return {"status": "offline", "data": None}
+    """API health, checked by at most one worker on the host per HOST_HEALTH_TTL.
+
+    A worker answered from the host cache still applies the per-replica
+    results to its own balancer and health breaker.
+    """
+    cache = get_host_cache()
+    health = cache.get_json("health", "")
+    if health is not None:
+        get_api_client().apply_health(health.get("backends", {}))
+        return health
+    health = check_replicas()
+    cache.put_json("health", "", health, HOST_HEALTH_TTL)
+    return health
+
+def check_replicas() -> Dict[str, Any]:
+    """Check every API replica; healthy if at least one is, ejecting the ones that are not"""
+    results = get_api_client().check_backends()
+    responses = [r for r in results.values() if isinstance(r, requests.Response)]
+    healthy = [r for r in responses if r.status_code == 200]
+    backends = {url: isinstance(r, requests.Response) and r.status_code == 200 for url, r in results.items()}
+    if healthy:
+        return {"status": "healthy", "data": healthy[0].json(), "backends": backends,
+                "replicas_up": len(healthy), "replicas": len(results)}
+    return {"status": "unhealthy" if responses else "offline", "data": None, "backends": backends,
+            "replicas_up": 0, "replicas": len(results)}
 
 def get_collection_info() -> Optional[Dict[str, Any]]:
-    """Get collection information from API"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/collection/info", timeout=10)
-        return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException:
+    """Get collection information from API, shared by the workers on this host"""
+    def fetch():
+        try:
+            response = get_api_client().get("collection_info", "/collection/info")
+            return response.json() if response.status_code == 200 else None
+        except requests.exceptions.RequestException:
+            return None
+    return get_host_cache().fetch_json("collection_info", "", STATUS_POLL_INTERVAL, fetch, collection=True)
+
+def transport_error(error: requests.exceptions.RequestException) -> Dict[str, Any]:
+    """Helper result for a request that got no HTTP answer (network error, timeout, open circuit, admission).
+
+    status_code is 0 and transport_error is set, so callers can retry it and
+    the UI can say the API was unreachable instead of reporting a server error.
+    """
+    return {
+        "success": False,
+        "data": {"detail": f"Could not reach the API: {str(error)}"},
+        "status_code": 0,
+        "transport_error": True
+    }
+
+def upload_files(upload: Optional[PreparedUpload]) -> Optional[Dict[str, Any]]:
+    """Multipart file field for a prepared upload, or None to send image_url only"""
+    if upload is None:
         return None
+    return {API_UPLOAD_FIELD: (upload.filename, upload.data, "image/jpeg")}
+
+def invalidate_collection_caches():
+    """Drop collection reads cached by this process and by every worker on the host"""
+    get_result_cache().bump()
+    get_host_cache().invalidate_collection()
+
+def enroll_employee(image_url: Optional[str], phone: Optional[str] = None,
+                    upload: Optional[PreparedUpload] = None, idempotency_key: Optional[str] = None,
+                    invalidate: bool = True) -> Dict[str, Any]:
+    """Enroll an employee via API, from a URL or an uploaded photo.
 
-def enroll_employee(image_url: str, phone: Optional[str] = None) -> Dict[str, Any]:
-    """Enroll an employee via API"""
+    A 2xx response invalidates the collection caches unless invalidate is
+    False; bulk runs pass False and invalidate once when the run finishes.
+    """
     try:
-        data = {"image_url": image_url}
+        data = {"image_url": image_url} if image_url else {}
         if phone:
             data["phone"] = phone
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
         
-        response = requests.post(f"{API_BASE_URL}/enroll", data=data, timeout=30)
+        response = get_api_client().post("enroll", "/enroll", data=data, files=upload_files(upload), headers=headers)
+        if invalidate and 200 <= response.status_code < 300:
+            invalidate_collection_caches()
         return {
             "success": response.status_code == 200,
             "data": response.json(),
             "status_code": response.status_code
         }
     except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "data": {"detail": f"Request failed: {str(e)}"},
-            "status_code": 500
-        }
+        return transport_error(e)
 
-def login_employee(image_url: str) -> Dict[str, Any]:
-    """Login an employee via API"""
+def login_employee(image_url: Optional[str], upload: Optional[PreparedUpload] = None) -> Dict[str, Any]:
+    """Login an employee via API, from a URL or an uploaded photo"""
     try:
-        data = {"image_url": image_url}
+        data = {"image_url": image_url} if image_url else {}
         
-        response = requests.post(f"{API_BASE_URL}/login", data=data, timeout=30)
+        response = get_api_client().post("login", "/login", data=data, files=upload_files(upload))
         return {
             "success": response.status_code == 200,
             "data": response.json(),
             "status_code": response.status_code
         }
     except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "data": {"detail": f"Request failed: {str(e)}"},
-            "status_code": 500
-        }
+        return transport_error(e)
 
-def search_faces(image_url: str, limit: int = 5) -> Dict[str, Any]:
-    """Search for face matches via API"""
+def search_faces(image_url: Optional[str], limit: int = 5, upload: Optional[PreparedUpload] = None) -> Dict[str, Any]:
+    """Search for face matches via API, from a URL or an uploaded photo"""
     try:
-        data = {"image_url": image_url, "limit": limit}
+        data = {"image_url": image_url, "limit": limit} if image_url else {"limit": limit}
         
-        response = requests.post(f"{API_BASE_URL}/search", data=data, timeout=30)
+        response = get_api_client().post("search", "/search", data=data, files=upload_files(upload))
         return {
             "success": response.status_code == 200,
             "data": response.json(),
             "status_code": response.status_code
         }
     except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "data": {"detail": f"Request failed: {str(e)}"},
-            "status_code": 500
-        }
+        return transport_error(e)
 
-def list_enrolled_phones() -> Optional[Dict[str, Any]]:
-    """Get list of enrolled phone numbers"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/collection/list", timeout=10)
-        return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException:
-        return None
+def list_enrolled_phones(offset: Optional[int] = None, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Get list of enrolled phone numbers, one page at a time if offset/limit are given"""
+    def fetch():
+        try:
+            params = {}
+            if offset is not None:
+                params["offset"] = offset
+            if limit is not None:
+                params["limit"] = limit
+            response = get_api_client().get("collection_list", "/collection/list", params=params or None)
+            return response.json() if response.status_code == 200 else None
+        except requests.exceptions.RequestException:
+            return None
+    return get_host_cache().fetch_json("collection_list", f"{offset}:{limit}", ROSTER_TTL, fetch, collection=True)
+
+def list_roster_changes(since: int) -> Optional[Dict[str, Any]]:
+    """Get the phones added and removed since a collection version (delta sync)"""
+    def fetch():
+        try:
+            response = get_api_client().get("collection_list", "/collection/list", params={"since": since})
+            return response.json() if response.status_code == 200 else None
+        except requests.exceptions.RequestException:
+            return None
+    return get_host_cache().fetch_json("collection_list", f"since:{since}", ROSTER_TTL, fetch, collection=True)
 
 def remove_enrollment(phone: str) -> Dict[str, Any]:
     """Remove an enrollment"""
     try:
-        response = requests.delete(f"{API_BASE_URL}/enroll/{phone}", timeout=10)
+        response = get_api_client().delete("remove", f"/enroll/{phone}")
+        if 200 <= response.status_code < 300:
+            invalidate_collection_caches()
+        if response.status_code == 200:
+            get_duplicate_index().remove_phone(phone)
         return {
             "success": response.status_code == 200,
             "data": response.json(),
             "status_code": response.status_code
         }
     except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "data": {"detail": f"Request failed: {str(e)}"},
-            "status_code": 500
-        }
+        return transport_error(e)
 
 def clear_collection() -> Dict[str, Any]:
     """Clear all data from collection"""
     try:
-        response = requests.delete(f"{API_BASE_URL}/collection/clear", timeout=30)
+        response = get_api_client().delete("clear", "/collection/clear")
+        if 200 <= response.status_code < 300:
+            invalidate_collection_caches()
+        if response.status_code == 200:
+            get_duplicate_index().clear()
         return {
             "success": response.status_code == 200,
             "data": response.json(),
             "status_code": response.status_code
         }
     except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "data": {"detail": f"Request failed: {str(e)}"},
-            "status_code": 500
-        }
+        return transport_error(e)
+
+def get_status_monitor() -> StatusMonitor:
+    """Return the background monitor that polls API health and collection info"""
+    return get_shared_monitor(check_api_health, get_collection_info, interval=STATUS_POLL_INTERVAL)
+
+def get_image_cache() -> ImageCache:
+    """Return the process-wide cache of downloaded image bytes"""
+    return get_shared_image_cache(max_bytes=IMAGE_CACHE_BYTES, max_age=IMAGE_CACHE_MAX_AGE,
+                                  max_image_bytes=IMAGE_MAX_BYTES, shared=get_host_cache())
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Return the process-wide on-disk thumbnail cache"""
+    return get_shared_thumbnail_cache(THUMBNAIL_DIR, max_bytes=THUMBNAIL_CACHE_BYTES,
+                                      max_age=IMAGE_CACHE_MAX_AGE, max_side=THUMBNAIL_MAX_SIDE)
+
+def get_roster_store() -> RosterStore:
+    """Return the process-wide compact roster index"""
+    return get_shared_roster_store(ttl=ROSTER_TTL)
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide login/search result cache"""
+    return get_shared_result_cache(max_entries=RESULT_CACHE_ENTRIES, ttl=RESULT_CACHE_TTL)
+
+def image_content_key(image_url: Optional[str], upload: Optional[PreparedUpload]) -> Optional[str]:
+    """Result cache key for the probe photo, or None if it can't be identified cheaply.
+
+    Uploads are keyed on their bytes. URLs are keyed on the URL plus the
+    ETag/Last-Modified a header probe reports, so a changed image gets a new
+    key without the frontend downloading the original; a URL whose server
+    sends neither is not cached.
+    """
+    if upload is not None:
+        return content_key(upload.data)
+    try:
+        with track(NETWORK):
+            validator = get_image_cache().validator(image_url)
+    except (requests.exceptions.RequestException, ImageProbeError):
+        return None
+    return content_key(f"{image_url}\0{validator}".encode()) if validator else None
+
+def cached_login(image_url: Optional[str], upload: Optional[PreparedUpload] = None) -> Tuple[Dict[str, Any], bool]:
+    """login_employee behind the result cache; returns (result, served_from_cache)"""
+    cache = get_result_cache()
+    cache.observe_collection(get_status_monitor().snapshot().collection_info)
+    key = image_content_key(image_url, upload)
+    if key is not None:
+        cached = cache.get("login", key)
+        if cached is not None:
+            return cached, True
+    generation = cache.generation
+    result = login_employee(image_url, upload=upload)
+    if key is not None:
+        cache.put("login", key, result, generation)
+    return result, False
+
+SPECULATING_PAGES = {"🔐 Employee Login": "login", "🔍 Face Search": "search"}
+
+def get_speculator(page: str) -> Speculator:
+    """This session's background head start on a page's main request"""
+    key = f"{page}_speculator"
+    if key not in st.session_state:
+        st.session_state[key] = Speculator(ttl=SPECULATION_TTL)
+    return st.session_state[key]
+
+def speculate(page: str, key: Any, fn, enabled: bool, image_url: Optional[str]):
+    """Start the page's request (or, if disabled, just the image download) in the background"""
+    speculator = get_speculator(page)
+    if enabled:
+        speculator.start(key, fn, tag=get_result_cache().generation)
+    elif image_url:
+        speculator.start(key, lambda: get_image_cache().get(image_url))
+
+def discard_speculation(page: str):
+    """Drop a page's speculation, if this session has one, once the operator has moved on"""
+    speculator = st.session_state.get(f"{page}_speculator")
+    if speculator is not None:
+        speculator.discard()
+
+def take_speculation(page: str, key: Any, enabled: bool) -> Optional[Tuple[Dict[str, Any], bool]]:
+    """The ready (or still running) speculative cached_* result for key, if it can be used.
+
+    A speculative call that hit a server or transport error is not shown; the click asks again.
+    """
+    if not enabled:
+        return None
+    speculative = get_speculator(page).take(key, tag=get_result_cache().generation)
+    if speculative is None or speculative[0].get("transport_error") or speculative[0]["status_code"] >= 500:
+        return None
+    return speculative
+
+def cached_search(image_url: Optional[str], limit: int = 5,
+                  upload: Optional[PreparedUpload] = None) -> Tuple[Dict[str, Any], bool]:
+    """search_faces behind the result cache; a cached larger limit answers a smaller one"""
+    cache = get_result_cache()
+    cache.observe_collection(get_status_monitor().snapshot().collection_info)
+    key = image_content_key(image_url, upload)
+    if key is not None:
+        cached = cache.get("search", key, limit=limit)
+        if cached is not None:
+            return cached, True
+    generation = cache.generation
+    result = search_faces(image_url, limit, upload=upload)
+    if key is not None:
+        cache.put("search", key, result, generation, limit=limit)
+    return result, False
+
+def get_duplicate_index() -> DuplicateIndex:
+    """Return the process-wide perceptual-hash index of enrolled photos"""
+    return get_shared_duplicate_index(DEDUPE_INDEX_PATH, max_distance=DEDUPE_MAX_DISTANCE)
+
+def photo_source(image_url: Optional[str], upload: Optional[PreparedUpload]) -> str:
+    """Stable name for a photo in the duplicate index"""
+    return image_url if upload is None else f"upload:{content_key(upload.data)}"
+
+def photo_hash(image_url: Optional[str], upload: Optional[PreparedUpload]) -> Optional[int]:
+    """Perceptual hash of a photo, or None if it can't be downloaded or decoded"""
+    try:
+        with track(NETWORK):
+            data = upload.data if upload is not None else get_image_cache().get(image_url)
+        with track(DECODE):
+            return dhash(data) if data else None
+    except Exception:
+        return None
+
+def session_photo_hash(image_url: Optional[str], upload: Optional[PreparedUpload]) -> Optional[int]:
+    """photo_hash memoized in this session per photo, so widget reruns reuse it"""
+    memo = st.session_state.setdefault('photo_hashes', {})
+    source = photo_source(image_url, upload)
+    if source not in memo:
+        value = photo_hash(image_url, upload)
+        if value is None:
+            return None  # try again next rerun
+        if len(memo) >= DEDUPE_SESSION_HASHES:
+            memo.pop(next(iter(memo)))
+        memo[source] = value
+    return memo[source]
+
+def rebuild_duplicate_index(phones: List[str]) -> Tuple[int, int]:
+    """Drop index entries for phones no longer enrolled, then re-hash enrolled URL photos it is missing.
+
+    The roster lists phones only, so photos come from the enrollment queue's
+    successful URL jobs; uploads are not kept after enrolling and can't be re-hashed.
+    Returns (removed, added).
+    """
+    index = get_duplicate_index()
+    removed = index.prune(phones)
+    enrolled = set(phones)
+    missing = {url: phone for url, phone in get_enroll_queue().enrolled_photos()
+               if phone in enrolled and not index.has_source(url)}
+    with ThreadPoolExecutor(max_workers=BULK_MAX_CONCURRENCY, thread_name_prefix="dedupe-rebuild") as pool:
+        hashes = pool.map(lambda url: photo_hash(url, None), missing)
+        entries = [(value, missing[url], url) for url, value in zip(missing, hashes) if value is not None]
+    if entries:
+        index.load(entries)
+    return removed, len(entries)
+
+def on_collection_changed():
+    """Refresh everything derived from the collection after an enroll, remove or clear"""
+    get_roster_store().invalidate()
+    get_result_cache().bump()
+    get_status_monitor().refresh()
+
+def sync_collection_across_workers():
+    """Catch up with an enroll, remove or clear made by another worker on this host"""
+    if get_host_cache().collection_changed():
+        on_collection_changed()
+
+def send_queued_enrollment(job: EnrollJob) -> Dict[str, Any]:
+    """Queue drainer's enroll call; every retry of a job sends the same idempotency key"""
+    upload = None
+    if job.upload is not None:
+        upload = PreparedUpload(data=job.upload, width=job.meta.get("width", 0), height=job.meta.get("height", 0),
+                                quality=job.meta.get("quality", 0), original_bytes=len(job.upload),
+                                filename=job.filename or "upload.jpg")
+    if job.meta.get("run"):
+        # Bulk rows run in the bulk class and leave invalidation to the end of their run
+        with priority("bulk"):
+            return enroll_employee(job.image_url, job.phone, upload=upload, idempotency_key=job.idempotency_key,
+                                   invalidate=False)
+    return enroll_employee(job.image_url, job.phone, upload=upload, idempotency_key=job.idempotency_key)
+
+def on_enrollment_settled(job: EnrollJob, result: Dict[str, Any]):
+    """Runs on the drainer thread once a queued enrollment succeeds or finally fails"""
+    if job.meta.get("run"):
+        # The last row of a bulk run to settle invalidates once, if any row was enrolled
+        counts = get_enroll_queue().run_counts(job.meta["run"])
+        if counts.get("done") and not counts.get("pending") and not counts.get("in_flight"):
+            invalidate_collection_caches()
+            on_collection_changed()
+        return
+    if not result["success"]:
+        return
+    if job.meta.get("phash"):
+        get_duplicate_index().add(int(job.meta["phash"], 16), job.result_phone or job.phone, job.meta["source"])
+    on_collection_changed()
+
+def get_enroll_queue() -> EnrollmentQueue:
+    """Return the process-wide durable enrollment queue, starting its drainer"""
+    return get_shared_queue(ENROLL_QUEUE_PATH, send_queued_enrollment, on_complete=on_enrollment_settled,
+                            concurrency=ENROLL_QUEUE_CONCURRENCY, batch_size=ENROLL_QUEUE_BATCH)
+
+def queue_enrollment(image_url: Optional[str], phone: Optional[str], upload: Optional[PreparedUpload],
+                     photo_value: Optional[int]) -> int:
+    """Write an enrollment to the durable queue and return its job id"""
+    meta = {"source": photo_source(image_url, upload),
+            "phash": f"{photo_value:016x}" if photo_value is not None else None}
+    if upload is not None:
+        meta.update(width=upload.width, height=upload.height, quality=upload.quality)
+    return get_enroll_queue().submit(image_url, phone, upload=upload.data if upload is not None else None,
+                                     filename=upload.filename if upload is not None else None, meta=meta)
+
+def queue_bulk_row(row: EnrollmentRow, run_id: str, retries: int) -> int:
+    """Write one manifest row of bulk run run_id to the durable queue and return its job id"""
+    meta = {"source": row.image_url, "run": run_id, "idempotency_key": row_idempotency_key(run_id, row),
+            "max_attempts": retries + 1}
+    return get_enroll_queue().submit(row.image_url, row.phone, meta=meta)
+
+def wait_for_job(job_id: int, timeout: float) -> EnrollJob:
+    """Poll a queued job until it settles, its first attempt fails, or timeout passes"""
+    deadline = time.time() + timeout
+    while True:
+        job = get_enroll_queue().jobs([job_id])[0]
+        if job.status in ("done", "failed") or job.attempts > 0 or time.time() >= deadline:
+            return job
+        time.sleep(0.1)
 
 def display_image_with_info(image_url: str, max_width: int = 300):
     """Display image from URL with information"""
     if image_url:
         try:
-            # Download image for info
-            response = requests.get(image_url, timeout=5)
-            if not response.ok:
-                st.error("❌ Failed to load image from URL")
-                return None
-            
-            image_bytes = response.content
-            image = Image.open(BytesIO(image_bytes))
+            # Read format and dimensions from the first few KB only
+            with track(NETWORK):
+                info = get_image_cache().probe(image_url)
             
             # Extract filename from URL
             parsed_url = urlparse(image_url)
             filename = parsed_url.path.split('/')[-1].split('?')[0]
             
-            st.image(image_url, caption=f"From URL: {filename}", width=max_width)
+            # Show a small preview from the on-disk thumbnail cache; the original
+            # is only downloaded (and only if under the cap) on a thumbnail miss.
+            # Bigger files are left for the browser to fetch directly
+            thumbnails = get_thumbnail_cache()
+            with track(DECODE):
+                preview = thumbnails.get_for_url(image_url)
+            if preview is None and (info.size is None or info.size <= IMAGE_MAX_BYTES):
+                try:
+                    with track(NETWORK):
+                        image_bytes = get_image_cache().get(image_url)
+                except ImageTooLarge:
+                    image_bytes = None
+                if image_bytes:
+                    with track(DECODE):
+                        preview = thumbnails.get_or_create(image_bytes, url=image_url)
+            
+            st.image(preview or image_url, caption=f"From URL: {filename}", width=max_width)
             
             # Display image info
             st.write(f"**File Name:** {filename}")
-            st.write(f"**File Size:** {len(image_bytes):,} bytes")
-            st.write(f"**Image Size:** {image.size[0]} x {image.size[1]} pixels")
-            return image
+            st.write(f"**File Size:** {f'{info.size:,} bytes' if info.size is not None else 'Unknown'}")
+            st.write(f"**Image Size:** {info.width} x {info.height} pixels")
+            return info
         except Exception as e:
             st.error(f"❌ Error loading image: {str(e)}")
             return None
     return None
 
+def image_source_input(url_label: str, help: str, key: str) -> Tuple[Optional[str], Optional[PreparedUpload]]:
+    """Let the operator give a photo URL, a file or a camera shot; returns (image_url, upload)"""
+    source = st.radio("Photo source", ["🌐 URL", "📁 Upload", "📷 Camera"], horizontal=True, key=f"{key}_source")
+    
+    if source == "🌐 URL":
+        image_url = st.text_input(url_label, placeholder="https://example.com/image.jpg", help=help, key=f"{key}_url")
+        return image_url or None, None
+    
+    if source == "📁 Upload":
+        raw = st.file_uploader("📁 Photo", type=["jpg", "jpeg", "png"], key=f"{key}_file")
+    else:
+        raw = st.camera_input("📷 Take a photo", key=f"{key}_camera")
+    if raw is None:
+        return None, None
+    
+    # Re-encode once per distinct photo, not on every rerun
+    raw_bytes = raw.getvalue()
+    digest = hashlib.sha1(raw_bytes).hexdigest()
+    cached = st.session_state.get(f"{key}_prepared")
+    if cached and cached[0] == digest:
+        return None, cached[1]
+    try:
+        with track(DECODE):
+            upload = prepare_upload(raw_bytes, max_side=UPLOAD_MAX_SIDE, target_bytes=UPLOAD_TARGET_BYTES,
+                                    filename=raw.name or "camera.jpg")
+    except Exception as e:
+        st.error(f"❌ Error reading photo: {str(e)}")
+        return None, None
+    st.session_state[f"{key}_prepared"] = (digest, upload)
+    return None, upload
+
+def burst_input(key: str) -> Optional[FrameBurst]:
+    """Let the operator give a burst of frames: several photos or one animated image"""
+    files = st.file_uploader("🎞️ Frames (photos from a burst, or an animated GIF/WebP/PNG)",
+                             type=["jpg", "jpeg", "png", "gif", "webp"], accept_multiple_files=True,
+                             key=f"{key}_frames")
+    if not files:
+        return None
+    
+    # Decode and stack the frames once per distinct burst, not on every rerun
+    sources = [f.getvalue() for f in files]
+    digest = hashlib.sha1(b"".join(hashlib.sha1(data).digest() for data in sources)).hexdigest()
+    cached = st.session_state.get(f"{key}_burst")
+    if cached and cached[0] == digest:
+        return cached[1]
+    try:
+        with track(DECODE):
+            burst = FrameBurst(sources, max_frames=LOGIN_BURST_MAX_FRAMES)
+    except Exception as e:
+        st.error(f"❌ Error reading frames: {str(e)}")
+        return None
+    st.session_state[f"{key}_burst"] = (digest, burst)
+    return burst
+
+def login_from_burst(burst: FrameBurst,
+                     ranked: List[FrameScore]) -> Tuple[Optional[Dict[str, Any]], Optional[FrameScore], int]:
+    """Send the best frames of a burst to /login, best first; returns (result, frame used, API calls)"""
+    def login_frame(index: int) -> Tuple[Dict[str, Any], bool]:
+        with track(DECODE):
+            upload = prepare_upload(burst.frame_bytes(index), max_side=UPLOAD_MAX_SIDE,
+                                    target_bytes=UPLOAD_TARGET_BYTES, filename=f"frame_{index}.jpg")
+        return cached_login(None, upload=upload)
+    return login_best_frames(ranked, login_frame, attempts=LOGIN_BURST_ATTEMPTS)
+
+def display_upload_with_info(upload: PreparedUpload, max_width: int = 300):
+    """Display a prepared upload with its size before and after re-encoding"""
+    st.image(upload.data, caption=f"Upload: {upload.filename}", width=max_width)
+    st.write(f"**File Name:** {upload.filename}")
+    st.write(f"**File Size:** {upload.original_bytes:,} → {len(upload.data):,} bytes (JPEG q{upload.quality})")
+    st.write(f"**Image Size:** {upload.width} x {upload.height} pixels")
+
+def display_source_with_info(image_url: Optional[str], upload: Optional[PreparedUpload]):
+    if upload is not None:
+        display_upload_with_info(upload)
+    else:
+        display_image_with_info(image_url)
+
 def main():
     # Header
-    st.markdown("""
-    <div class="main-header">
-        <h1>👤 Face Recognition System</h1>
-        <p>AI-Powered Employee Authentication & Management</p>
-    </div>
-    """, unsafe_allow_html=True)
+    with phase("header"):
+        st.markdown("""
+        <div class="main-header">
+            <h1>👤 Face Recognition System</h1>
+            <p>AI-Powered Employee Authentication & Management</p>
+        </div>
+        """, unsafe_allow_html=True)
 
+        ensure_metrics_server(METRICS_PORT, render_metrics, host=METRICS_HOST, span=METRICS_PORT_SPAN)
+    
     # Sidebar for navigation
     st.sidebar.title("🔧 System Control")
     
     # API Status check
-    with st.sidebar:
+    with st.sidebar, phase("sidebar"):
         st.subheader("📊 System Status")
-        health_status = check_api_health()
+        sync_collection_across_workers()
+        snapshot = get_status_monitor().snapshot()
+        breakers = get_api_client().breakers()
+        troubled = {endpoint: b for endpoint, b in breakers.items()
+                    if b["state"] != "closed" or b["consecutive_failures"]}
         
-        if health_status["status"] == "healthy":
-            st.success("✅ API Online")
-        elif health_status["status"] == "unhealthy":
-            st.warning("⚠️ API Issues")
-        else:
+        health_breaker = breakers.get("health")
+        # Decided from the snapshot, not from local breakers: a worker whose polls
+        # were answered from the host cache may not have sent a request yet
+        if snapshot.age is None:
+            st.info("⏳ Checking API...")
+        elif health_breaker and health_breaker["state"] == "open":
+            st.error(f"❌ API Offline · retrying in {health_breaker['retry_in']:.0f}s")
+        elif snapshot.health["status"] == "offline":
             st.error("❌ API Offline")
+        elif snapshot.health["status"] == "unhealthy":
+            st.error("❌ API Unhealthy")
+        elif troubled:
+            st.warning("⚠️ API Degraded")
+        else:
+            st.success("✅ API Online")
         
-        # Collection info
-        if health_status["status"] == "healthy":
-            collection_info = get_collection_info()
+        state_icons = {"closed": "🟡", "half_open": "🟠", "open": "🔴"}
+        for endpoint, b in troubled.items():
+            detail = {"closed": f"{b['consecutive_failures']} recent failures",
+                      "half_open": "probing", "open": f"open, retry in {b['retry_in'] or 0:.0f}s"}[b["state"]]
+            st.caption(f"{state_icons[b['state']]} {endpoint}: {detail}")
+        
+        if snapshot.health.get("replicas", 1) > 1:
+            st.caption(f"🖧 {snapshot.health['replicas_up']}/{snapshot.health['replicas']} replicas up")
+        if snapshot.age is not None:
+            st.caption(f"Updated {snapshot.age:.0f}s ago")
 
     # Navigation
     page = st.sidebar.selectbox(
         "Choose Action",
         ["🏠 Home", "📝 Enroll Employee", "🔐 Employee Login", "🔍 Face Search", "👥 Manage Employees", "⚙️ System Admin"]
     )
+    rerun = current_rerun()
+    if rerun is not None:
+        rerun.page = page
+    for name, speculating in SPECULATING_PAGES.items():
+        if name != page:
+            discard_speculation(speculating)
 
     if page == "🏠 Home":
         show_home_page()
@@ -256,6 +755,7 @@ def main():
     elif page == "⚙️ System Admin":
         show_admin_page()
 
+@profiled
 def show_home_page():
     """Home page with system overview"""
     col1, col2 = st.columns(2)
@@ -282,19 +782,30 @@ def show_home_page():
     # System Statistics
     st.subheader("📊 System Statistics")
     
-    health_status = check_api_health()
+    snapshot = get_status_monitor().snapshot()
+    health_status = snapshot.health
     if health_status["status"] == "healthy":
-        collection_info = get_collection_info()
-        enrolled_list = list_enrolled_phones()
+        # Health and collection info come from the monitor snapshot, so the roster count is
+        # the page's only read; limit=1 is enough for total_count when the API pages /collection/list
+        roster = list_enrolled_phones(limit=1)
         
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("📱 Enrolled Users", enrolled_list.get("total_count", 0) if enrolled_list else 0)
+            if roster:
+                st.metric("📱 Enrolled Users", roster.get("total_count", 0))
+            else:
+                st.metric("📱 Enrolled Users", "—")
+                st.caption("⚠️ Unavailable")
         with col2:
             st.metric("🟢 System Status", "Online")
+        with col3:
+            st.metric("🗄️ Collection", (snapshot.collection_info or {}).get("status", "Unknown"))
+    elif health_status["status"] == "unknown":
+        st.info("⏳ Checking API status...")
     else:
         st.error("❌ Cannot connect to Face Recognition API. Please ensure the server is running.")
 
+@profiled
 def show_enrollment_page():
     """Employee enrollment page"""
     st.header("📝 Enroll New Employee")
@@ -311,18 +822,23 @@ def show_enrollment_page():
     </div>
     """, unsafe_allow_html=True)
     
-    # Image URL input
-    image_url = st.text_input(
+    mode = st.radio("Enrollment mode", ["Single photo", "Bulk manifest"], horizontal=True)
+    if mode == "Bulk manifest":
+        show_bulk_enrollment()
+        return
+    
+    # Image URL or upload input
+    image_url, upload = image_source_input(
         "🌐 Image URL",
-        placeholder="https://example.com/image.jpg",
-        help="Provide a direct URL to the employee's face photo"
+        help="Provide a direct URL to the employee's face photo",
+        key="enroll"
     )
     
-    if image_url:
+    if image_url or upload:
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            display_image_with_info(image_url)
+            display_source_with_info(image_url, upload)
         
         with col2:
             st.subheader("📋 Enrollment Details")
@@ -337,34 +853,194 @@ def show_enrollment_page():
             # Validate phone if provided
             phone_valid = True
             if phone:
-                if not phone.isdigit() or len(phone) < 10:
-                    st.error("❌ Phone number must be at least 10 digits and contain only numbers")
+                phone_error = validate_phone(phone)
+                if phone_error:
+                    st.error(f"❌ {phone_error}")
                     phone_valid = False
                 else:
                     st.success(f"✅ Phone number: {phone}")
             
+            # Flag photos that look like one already enrolled
+            photo_value = session_photo_hash(image_url, upload)
+            duplicates = get_duplicate_index().find(photo_value) if photo_value is not None else []
+            override = True
+            if duplicates:
+                closest = duplicates[0]
+                st.warning(f"⚠️ This photo looks like one already enrolled for **{closest.label}** "
+                           f"({closest.distance}/64 bits differ)")
+                override = st.checkbox("Enroll anyway", key="enroll_duplicate_override")
+            
             # Enrollment button
-            if st.button("🚀 Enroll Employee", type="primary", disabled=not phone_valid):
+            if st.button("🚀 Enroll Employee", type="primary", disabled=not (phone_valid and override)):
+                # Saved to the durable queue first, so nothing is lost if the API is down
+                job_id = queue_enrollment(image_url, phone or None, upload, photo_value)
+                st.session_state.setdefault('enroll_jobs', []).insert(0, job_id)
                 with st.spinner("Processing enrollment..."):
-                    result = enroll_employee(image_url, phone if phone else None)
+                    job = wait_for_job(job_id, ENROLL_QUEUE_WAIT)
                 
-                if result["success"]:
+                if job.status == "done":
                     st.markdown(f"""
                     <div class="success-box">
                         <h4>✅ Enrollment Successful!</h4>
-                        <p><strong>Phone:</strong> {result['data']['phone']}</p>
-                        <p><strong>Message:</strong> {result['data']['message']}</p>
+                        <p><strong>Phone:</strong> {job.result_phone or job.phone}</p>
+                        <p><strong>Message:</strong> {job.detail}</p>
                     </div>
                     """, unsafe_allow_html=True)
                     st.balloons()
-                else:
+                elif job.status == "failed":
                     st.markdown(f"""
                     <div class="error-box">
                         <h4>❌ Enrollment Failed</h4>
-                        <p>{result['data'].get('detail', 'Unknown error occurred')}</p>
+                        <p>{job.detail or 'Unknown error occurred'}</p>
                     </div>
                     """, unsafe_allow_html=True)
+                else:
+                    st.info(f"📥 Queued as job #{job_id}. The API is slow or unavailable; "
+                            "it will be retried in the background.")
+    
+    show_queued_enrollments()
+
+@profiled
+def show_queued_enrollments():
+    """Status of the enrollments this session has queued"""
+    job_ids = st.session_state.get('enroll_jobs', [])[:10]
+    if not job_ids:
+        return
+    st.subheader("📥 Your Queued Enrollments")
+    icons = {"pending": "⏳", "in_flight": "📤", "done": "✅", "failed": "❌"}
+    st.dataframe([
+        {
+            "Job": job.id,
+            "Status": f"{icons.get(job.status, '❓')} {job.status.replace('_', ' ')}",
+            "Phone": job.result_phone or job.phone or "—",
+            "Photo": job.filename or job.image_url,
+            "Attempts": job.attempts,
+            "Detail": job.detail or "",
+        }
+        for job in get_enroll_queue().jobs(job_ids)
+    ], use_container_width=True)
+    if st.button("🔄 Refresh Status"):
+        st.rerun()
+
+@profiled
+def show_bulk_enrollment():
+    """Bulk enrollment from a CSV/JSON manifest of image_url, phone rows"""
+    st.subheader("📦 Bulk Enrollment")
+    st.caption("Upload a CSV with `image_url` and optional `phone` columns, or a JSON list of the same objects.")
+    
+    manifest = st.file_uploader("📄 Manifest", type=["csv", "json", "jsonl"])
+    col1, col2 = st.columns(2)
+    with col1:
+        concurrency = st.slider("Parallel photo checks", 1, BULK_MAX_CONCURRENCY, 8,
+                                help=f"Rows are sent by the enrollment queue, {ENROLL_QUEUE_CONCURRENCY} at a time")
+    with col2:
+        retries = st.number_input("Retries per row", min_value=0, max_value=5, value=2)
+    skip_duplicates = st.checkbox("Skip likely duplicate photos", value=True,
+                                  help="Compare each photo's perceptual hash with enrolled photos before sending it")
+    
+    if manifest:
+        try:
+            rows, rejected = parse_manifest(manifest.getvalue().decode("utf-8-sig"), manifest.name)
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"❌ Could not read manifest: {str(e)}")
+            return
+        
+        st.info(f"📋 {len(rows)} rows ready, {len(rejected)} rejected by validation")
+        if rejected:
+            with st.expander(f"⚠️ Rejected rows ({len(rejected)})"):
+                st.dataframe([{"Row": o.line, "Image URL": o.image_url, "Phone": o.phone, "Reason": o.detail}
+                              for o in rejected], use_container_width=True)
+        
+        if st.button("🚀 Start Bulk Enrollment", type="primary", disabled=not rows):
+            progress = st.progress(0.0)
+            status = st.empty()
+            outcomes = list(rejected)
+            succeeded = failed = 0
+            start = time.perf_counter()
+            guard = BulkDuplicateGuard(get_duplicate_index(), lambda url: photo_hash(url, None), skip=skip_duplicates)
+            
+            submit = partial(queue_bulk_row, retries=retries)
+            for done, outcome in enumerate(iter_queued_enroll(rows, submit, get_enroll_queue().jobs, concurrency,
+                                                              precheck=guard.check), 1):
+                outcomes.append(outcome)
+                guard.finish(outcome)
+                if outcome.success:
+                    succeeded += 1
+                elif outcome.attempts > 0:
+                    failed += 1
+                elapsed = time.perf_counter() - start
+                progress.progress(done / len(rows))
+                status.write(f"**{done}/{len(rows)}** processed · ✅ {succeeded} · ❌ {failed} · ⏭️ {guard.skipped} · "
+                             f"⚡ {done / elapsed if elapsed > 0 else 0:.1f} items/s")
+            
+            st.session_state['bulk_report'] = {
+                "summary": summarize(outcomes, time.perf_counter() - start),
+                "csv": outcomes_to_csv(outcomes),
+            }
+    
+    report = st.session_state.get('bulk_report')
+    if report:
+        summary = report["summary"]
+        st.subheader("📊 Bulk Enrollment Report")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Succeeded", summary["succeeded"])
+        with col2:
+            st.metric("Failed", summary["failed"] + summary["rejected"])
+        with col3:
+            st.metric("Throughput", f"{summary['throughput']:.1f}/s")
+        with col4:
+            st.metric("p95 Latency", f"{summary['p95_latency']:.2f}s")
+        st.download_button("⬇️ Download Report (CSV)", report["csv"],
+                           file_name="bulk_enrollment_report.csv", mime="text/csv")
 
+def show_login_result(result: Dict[str, Any]):
+    """Render a /login result: welcome or rejection, then the match metrics"""
+    if result["success"]:
+        data = result["data"]
+        
+        # Display authentication result
+        if data["is_authenticated"]:
+            st.markdown(f"""
+            <div class="success-box">
+                <h4>✅ Authentication Successful!</h4>
+                <p><strong>Phone:</strong> {data['phone']}</p>
+                <p><strong>Match Quality:</strong> {data['match_quality'].title()}</p>
+                <p><strong>Confidence:</strong> {data['confidence_score']:.1f}%</p>
+            </div>
+            """, unsafe_allow_html=True)
+            st.success("🎉 Welcome! Login successful.")
+        else:
+            st.markdown(f"""
+            <div class="error-box">
+                <h4>❌ Authentication Failed</h4>
+                <p><strong>Reason:</strong> Face match quality too low</p>
+                <p><strong>Nearest Match:</strong> {data.get('phone', 'None found')}</p>
+                <p><strong>Confidence:</strong> {data.get('confidence_score', 0):.1f}%</p>
+                <p><strong>Match Quality:</strong> {data.get('match_quality', 'Unknown').title()}</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        # Display detailed metrics
+        st.subheader("📊 Authentication Metrics")
+        col3, col4, col5 = st.columns(3)
+        with col3:
+            st.metric("Distance Score", f"{data.get('distance', 0):.2f}")
+        with col4:
+            st.metric("Confidence", f"{data.get('confidence_score', 0):.1f}%")
+        with col5:
+            st.metric("Quality", data.get('match_quality', 'Unknown').title())
+    
+    else:
+        title = "🔌 API Unreachable" if result.get("transport_error") else "❌ Authentication Error"
+        st.markdown(f"""
+        <div class="error-box">
+            <h4>{title}</h4>
+            <p>{result['data'].get('detail', 'Unknown error occurred')}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+@profiled
 def show_login_page():
     """Employee login page"""
     st.header("🔐 Employee Login")
@@ -377,67 +1053,80 @@ def show_login_page():
     </div>
     """, unsafe_allow_html=True)
     
-    # Image URL input
-    image_url = st.text_input(
+    mode = st.radio("Login mode", ["🖼️ Single photo", "🎞️ Frame burst"], horizontal=True, key="login_mode")
+    if mode == "🎞️ Frame burst":
+        discard_speculation("login")
+        show_burst_login()
+        return
+    
+    # Image URL or upload input
+    image_url, upload = image_source_input(
         "🌐 Image URL for authentication",
-        placeholder="https://example.com/image.jpg",
-        help="Provide a direct URL to the photo for face recognition login"
+        help="Provide a direct URL to the photo for face recognition login",
+        key="login"
     )
     
-    if image_url:
+    if image_url or upload:
+        # Start authenticating while the operator is still looking at the photo
+        probe = image_url if upload is None else content_key(upload.data)
+        speculate("login", probe, lambda: cached_login(image_url, upload=upload), SPECULATE_LOGIN, image_url)
+        
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            display_image_with_info(image_url)
+            display_source_with_info(image_url, upload)
         
         with col2:
             if st.button("🔍 Authenticate", type="primary"):
                 with st.spinner("Analyzing face..."):
-                    result = login_employee(image_url)
+                    speculative = take_speculation("login", probe, SPECULATE_LOGIN)
+                    result, from_cache = speculative or cached_login(image_url, upload=upload)
                 
-                if result["success"]:
-                    data = result["data"]
-                    
-                    # Display authentication result
-                    if data["is_authenticated"]:
-                        st.markdown(f"""
-                        <div class="success-box">
-                            <h4>✅ Authentication Successful!</h4>
-                            <p><strong>Phone:</strong> {data['phone']}</p>
-                            <p><strong>Match Quality:</strong> {data['match_quality'].title()}</p>
-                            <p><strong>Confidence:</strong> {data['confidence_score']:.1f}%</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        st.success("🎉 Welcome! Login successful.")
-                    else:
-                        st.markdown(f"""
-                        <div class="error-box">
-                            <h4>❌ Authentication Failed</h4>
-                            <p><strong>Reason:</strong> Face match quality too low</p>
-                            <p><strong>Nearest Match:</strong> {data.get('phone', 'None found')}</p>
-                            <p><strong>Confidence:</strong> {data.get('confidence_score', 0):.1f}%</p>
-                            <p><strong>Match Quality:</strong> {data.get('match_quality', 'Unknown').title()}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # Display detailed metrics
-                    st.subheader("📊 Authentication Metrics")
-                    col3, col4, col5 = st.columns(3)
-                    with col3:
-                        st.metric("Distance Score", f"{data.get('distance', 0):.2f}")
-                    with col4:
-                        st.metric("Confidence", f"{data.get('confidence_score', 0):.1f}%")
-                    with col5:
-                        st.metric("Quality", data.get('match_quality', 'Unknown').title())
-                
-                else:
-                    st.markdown(f"""
-                    <div class="error-box">
-                        <h4>❌ Authentication Error</h4>
-                        <p>{result['data'].get('detail', 'Unknown error occurred')}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+                if speculative is not None:
+                    st.caption("⚡ Prepared in the background while the photo was on screen")
+                elif from_cache:
+                    st.caption("⚡ Served from the result cache (same photo, collection unchanged)")
+                show_login_result(result)
+    else:
+        discard_speculation("login")
+
+@profiled
+def show_burst_login():
+    """Login from a burst of frames: score them locally, send only the best"""
+    burst = burst_input(key="login")
+    if burst is None:
+        st.caption(f"Frames are scored for sharpness, exposure and size; only the best "
+                   f"{LOGIN_BURST_ATTEMPTS} are sent for recognition.")
+        return
+    
+    ranked = burst.ranked(min_side=LOGIN_MIN_SIDE)
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        best = ranked[0]
+        st.image(burst.frame_bytes(best.index), caption=f"Best of {len(burst)} frames (#{best.index + 1})",
+                 width=300)
+        with st.expander(f"📊 Frame scores ({len(burst)})"):
+            st.dataframe([
+                {
+                    "Frame": frame.index + 1,
+                    "Score": f"{frame.score:.2f}",
+                    "Sharpness": f"{frame.sharpness:.2f}",
+                    "Exposure": f"{frame.exposure:.2f}",
+                    "Size": f"{frame.width} x {frame.height}",
+                }
+                for frame in ranked
+            ], use_container_width=True)
+    
+    with col2:
+        if st.button("🔍 Authenticate", type="primary", key="burst_authenticate"):
+            with st.spinner("Analyzing face..."):
+                result, frame, calls = login_from_burst(burst, ranked)
+            
+            st.caption(f"Frame #{frame.index + 1} used; {calls} of {len(burst)} frames sent to the API")
+            show_login_result(result)
 
+@profiled
 def show_search_page():
     """Face search and analysis page"""
     st.header("🔍 Face Search & Analysis")
@@ -450,29 +1139,45 @@ def show_search_page():
     </div>
     """, unsafe_allow_html=True)
     
+    mode = st.radio("Search mode", ["Single probe", "Batch audit"], horizontal=True)
+    if mode == "Batch audit":
+        discard_speculation("search")
+        show_batch_audit()
+        return
+    
     # Search parameters
     col1, col2 = st.columns([2, 1])
     with col2:
         limit = st.slider("Number of matches to return", 1, 10, 5)
     
-    # Image URL input
-    image_url = st.text_input(
+    # Image URL or upload input
+    image_url, upload = image_source_input(
         "🌐 Image URL for face search",
-        placeholder="https://example.com/image.jpg",
-        help="Provide a direct URL to the photo to find similar faces in the database"
+        help="Provide a direct URL to the photo to find similar faces in the database",
+        key="search"
     )
     
-    if image_url:
+    if image_url or upload:
+        # Start searching while the operator is still looking at the photo
+        probe = (image_url if upload is None else content_key(upload.data), limit)
+        speculate("search", probe, lambda: cached_search(image_url, limit, upload=upload), SPECULATE_SEARCH,
+                  image_url)
+        
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            display_image_with_info(image_url)
+            display_source_with_info(image_url, upload)
         
         with col2:
             if st.button("🔎 Search Faces", type="primary"):
                 with st.spinner("Searching database..."):
-                    result = search_faces(image_url, limit)
+                    speculative = take_speculation("search", probe, SPECULATE_SEARCH)
+                    result, from_cache = speculative or cached_search(image_url, limit, upload=upload)
                 
+                if speculative is not None:
+                    st.caption("⚡ Prepared in the background while the photo was on screen")
+                elif from_cache:
+                    st.caption("⚡ Served from the result cache (same photo, collection unchanged)")
                 if result["success"]:
                     data = result["data"]
                     
@@ -496,20 +1201,122 @@ def show_search_page():
                 
                 else:
                     st.error(f"Search failed: {result['data'].get('detail', 'Unknown error')}")
+    else:
+        discard_speculation("search")
 
+@profiled
+def show_batch_audit():
+    """Replay many probe photos through /login and /search and grade the results"""
+    st.subheader("🧪 Batch Audit")
+    st.caption("Upload a CSV/JSON list of probes with `image_url` and optional `expected_phone`.")
+    
+    probes_file = st.file_uploader("📄 Probe list", type=["csv", "json", "jsonl"])
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        endpoints = st.multiselect("Endpoints", ["login", "search"], default=["login", "search"])
+    with col2:
+        concurrency = st.slider("Parallel requests", 1, BULK_MAX_CONCURRENCY, 8)
+    with col3:
+        limit = st.slider("Search matches", 1, 10, 5)
+    
+    if probes_file:
+        try:
+            probes = parse_probes(probes_file.getvalue().decode("utf-8-sig"), probes_file.name)
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"❌ Could not read probe list: {str(e)}")
+            return
+        
+        st.info(f"📋 {len(probes)} probes, {len(probes) * len(endpoints)} API calls")
+        if st.button("▶️ Run Audit", type="primary", disabled=not probes or not endpoints):
+            os.makedirs(AUDIT_DIR, exist_ok=True)
+            results_path = os.path.join(AUDIT_DIR, f"audit_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+            # Remember the file first so a partial run is still reported after navigating away
+            st.session_state['audit_results_path'] = results_path
+            st.session_state['audit_elapsed'] = None
+            
+            total = len(probes) * len(endpoints)
+            progress = st.progress(0.0)
+            status = st.empty()
+            start = time.perf_counter()
+            for done, _ in enumerate(iter_audit(probes, with_priority("bulk", login_employee),
+                                                with_priority("bulk", search_faces), tuple(endpoints),
+                                                concurrency, limit, results_path), 1):
+                elapsed = time.perf_counter() - start
+                progress.progress(done / total)
+                status.write(f"**{done}/{total}** calls · ⚡ {done / elapsed if elapsed > 0 else 0:.1f} calls/s")
+            st.session_state['audit_elapsed'] = time.perf_counter() - start
+    
+    results_path = st.session_state.get('audit_results_path')
+    if results_path:
+        records = load_records(results_path)
+        if not records:
+            return
+        summary = summarize_audit(records, st.session_state.get('audit_elapsed'))
+        st.subheader(f"📊 Audit Results ({len(records)} calls)")
+        
+        for endpoint, stats in summary.items():
+            st.markdown(f"### /{endpoint}")
+            col1, col2, col3, col4, col5 = st.columns(5)
+            with col1:
+                st.metric("Accuracy", f"{stats['accuracy'] * 100:.1f}%" if stats["accuracy"] is not None else "n/a")
+            with col2:
+                st.metric("Errors", stats["errors"])
+            with col3:
+                st.metric("p50", f"{stats['latency_p50']:.2f}s")
+            with col4:
+                st.metric("p95", f"{stats['latency_p95']:.2f}s")
+            with col5:
+                st.metric("p99", f"{stats['latency_p99']:.2f}s")
+            if stats["throughput"]:
+                st.caption(f"⚡ {stats['throughput']:.1f} calls/s over {stats['calls']} calls")
+            
+            st.dataframe([
+                {
+                    "Quality": quality.title(),
+                    "Count": bucket["count"],
+                    "Accuracy": f"{bucket['accuracy'] * 100:.1f}%" if bucket["accuracy"] is not None else "n/a",
+                    "Distance p50": bucket["distance"].get("p50"),
+                    "Distance p95": bucket["distance"].get("p95"),
+                    "Confidence p50": bucket["confidence_score"].get("p50"),
+                    "Confidence min": bucket["confidence_score"].get("min"),
+                }
+                for quality, bucket in stats["by_quality"].items()
+            ], use_container_width=True)
+        
+        with open(results_path, "rb") as f:
+            st.download_button("⬇️ Download Raw Results (JSONL)", f.read(),
+                               file_name=os.path.basename(results_path), mime="application/json")
+
+@profiled
 def show_management_page():
     """Employee management page"""
     st.header("👥 Employee Management")
     
-    # Get enrolled employees
-    enrolled_data = list_enrolled_phones()
+    # Get enrolled employees as a compact sorted index
+    roster = get_roster_store().get(list_enrolled_phones, page_size=ROSTER_FETCH_PAGE,
+                                    delta_fn=list_roster_changes)
     
-    if enrolled_data:
-        st.subheader(f"📊 Enrolled Employees ({enrolled_data['total_count']})")
+    if roster is not None:
+        st.subheader(f"📊 Enrolled Employees ({len(roster):,})")
         
-        if enrolled_data['phones']:
-            # Display as a table
-            phones_df = [{"Phone Number": phone, "Status": "✅ Active"} for phone in enrolled_data['phones']]
+        if len(roster):
+            # Search and paging controls
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                query = st.text_input("🔎 Search phone", placeholder="98765")
+            with col2:
+                search_mode = st.radio("Match", ["prefix", "contains"], horizontal=True)
+            with col3:
+                page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+            
+            matches = roster.search(query, search_mode)
+            page_count = max(1, -(-len(matches) // page_size))
+            page_no = st.number_input(f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1)
+            page_phones = roster.page(matches, page_no - 1, page_size)
+            
+            # Display only the current page
+            st.caption(f"{len(matches):,} matching · showing {len(page_phones)}")
+            phones_df = [{"Phone Number": phone, "Status": "✅ Active"} for phone in page_phones]
             st.dataframe(phones_df, use_container_width=True)
             
             # Remove employee section
@@ -518,8 +1325,8 @@ def show_management_page():
             
             with col1:
                 phone_to_remove = st.selectbox(
-                    "Select phone number to remove",
-                    [""] + enrolled_data['phones']
+                    "Select phone number to remove (current page)",
+                    [""] + page_phones
                 )
             
             with col2:
@@ -533,6 +1340,7 @@ def show_management_page():
                         if result["success"]:
                             st.success(f"✅ Successfully removed {phone_to_remove}")
                             st.session_state['confirm_removal'] = False
+                            on_collection_changed()
                             st.rerun()
                         else:
                             st.error(f"❌ Failed to remove: {result['data'].get('detail', 'Unknown error')}")
@@ -544,6 +1352,7 @@ def show_management_page():
     else:
         st.error("❌ Could not retrieve employee list. Check API connection.")
 
+@profiled
 def show_admin_page():
     """System administration page"""
     st.header("⚙️ System Administration")
@@ -552,7 +1361,8 @@ def show_admin_page():
     
     # System health
     st.subheader("🏥 System Health Check")
-    health_status = check_api_health()
+    snapshot = get_status_monitor().snapshot()
+    health_status = snapshot.health
     
     if health_status["status"] == "healthy" and health_status["data"]:
         data = health_status["data"]
@@ -564,7 +1374,238 @@ def show_admin_page():
         with col2:
             st.success(f"🤖 Face Model: {data.get('face_model', 'Unknown')}")
             st.info(f"📊 Collection Loaded: {'Yes' if data.get('collection_loaded') else 'No'}")
-    
+
+    # Connection pool
+    st.subheader("🔌 API Connection Pool")
+    client_stats = get_api_client().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Requests", client_stats["requests"])
+    with col2:
+        st.metric("Connections Opened", client_stats["connections_opened"])
+    with col3:
+        st.metric("Connections Reused", client_stats["connections_reused"])
+    with col4:
+        st.metric("Retries", client_stats["retries"])
+    st.caption(f"{client_stats['short_circuited']} calls refused by open circuit breakers, "
+               f"{client_stats['hedges']} hedged reads ({client_stats['hedges_skipped']} skipped for lack of "
+               f"admission capacity), "
+               f"{client_stats['coalesced']} upstream calls saved by joining identical in-flight reads")
+    replicas = get_api_client().backends.snapshot()
+    if len(replicas) > 1:
+        st.dataframe([
+            {
+                "Replica": replica["url"],
+                "Status": "✅ in rotation" if replica["available"] else f"⛔ ejected ({replica['ejected_for']:.0f}s)",
+                "EWMA Latency": f"{replica['ewma'] * 1000:.0f} ms" if replica["ewma"] is not None else "—",
+                "In Flight": replica["inflight"],
+                "Requests": replica["requests"],
+                "Failures": replica["failures"],
+            }
+            for replica in replicas
+        ], use_container_width=True)
+        st.caption(f"Reads: least-latency (power of two choices); writes: {API_WRITE_ROUTING}")
+
+    # Admission control: what waits in this process before it reaches the API
+    st.subheader("🚦 Admission Control")
+    admission = get_admission().stats()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("In Flight", f"{admission['in_flight']} / {admission['max_concurrency']}")
+    with col2:
+        st.metric("Queued Now", admission["waiting"])
+    st.dataframe([
+        {
+            "Priority": name,
+            "Admitted": counts["admitted"],
+            "Had to Queue": counts["queued"],
+            "Rejected": counts["rejected"],
+            "Waiting": counts["waiting"],
+            "Queue Deadline": f"{API_QUEUE_DEADLINES.get(name, 30)} s",
+        }
+        for name, counts in admission["classes"].items()
+    ], use_container_width=True)
+    st.caption("Rate limits: " + ", ".join(f"{endpoint} {limit.rate:g}/s (burst {limit.burst})"
+                                           for endpoint, limit in API_RATE_LIMITS.items())
+               + ". Queue wait is shown per endpoint below, apart from server latency.")
+
+    # Per-endpoint latency as seen from the frontend
+    st.subheader("⏱️ API Latency")
+    latency_summary = get_api_client().metrics.summary()
+    breakers = get_api_client().breakers()
+    if latency_summary:
+        def ms(value):
+            return f"{value * 1000:.0f} ms" if value is not None else "—"
+        st.dataframe([
+            {
+                "Endpoint": endpoint,
+                "Requests": stats["requests"],
+                "Errors": stats["errors"],
+                "Timeouts": stats["timeouts"],
+                "p50": ms(stats["p50"]),
+                "p95": ms(stats["p95"]),
+                "p99": ms(stats["p99"]),
+                "Sent": f"{stats['request_bytes']:,} B",
+                "Received": f"{stats['response_bytes']:,} B",
+                "Queue p95": ms(stats["queue_p95"]),
+                "Rejected": stats["rejected"],
+                "Coalesced": stats["coalesced"],
+                "304s": stats["not_modified"],
+                "Saved": f"{stats['saved_bytes']:,} B",
+                "Breaker": breakers.get(endpoint, {}).get("state", "—"),
+                "Timeout": f"{breakers[endpoint]['timeout']:.1f} s" if endpoint in breakers else "—",
+            }
+            for endpoint, stats in latency_summary.items()
+        ], use_container_width=True)
+    else:
+        st.info("No API requests recorded yet.")
+    metrics_server = ensure_metrics_server(METRICS_PORT, render_metrics, host=METRICS_HOST, span=METRICS_PORT_SPAN)
+    if metrics_server is not None:
+        host, port = metrics_server.server_address[:2]
+        st.caption(f"Prometheus metrics for this worker are served at {host}:{port}/metrics")
+    st.download_button("⬇️ Download Metrics (Prometheus)", render_metrics(),
+                       file_name="face_api_metrics.prom", mime="text/plain")
+
+    # Image cache
+    st.subheader("🖼️ Image Cache")
+    cache_stats = get_image_cache().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Hits", cache_stats["hits"])
+    with col2:
+        st.metric("Misses", cache_stats["misses"])
+    with col3:
+        st.metric("Evictions", cache_stats["evictions"])
+    with col4:
+        st.metric("Cached", f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+    st.caption(f"{cache_stats['entries']} images cached, {cache_stats['revalidated']} revalidated, "
+               f"{cache_stats['shared_hits']} taken from other workers, "
+               f"budget {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    host_stats = get_host_cache().stats()
+    if host_stats["entries"] is not None:
+        st.caption(f"Host cache ({HOST_CACHE_PATH}): {host_stats['entries']} entries, "
+                   f"{host_stats['bytes'] / 1024 / 1024:.1f} of {host_stats['max_bytes'] / 1024 / 1024:.0f} MB, "
+                   f"collection generation {host_stats['generation']}; this worker {host_stats['hits']} hits, "
+                   f"{host_stats['misses']} misses, {host_stats['refused']} stale writes refused")
+    else:
+        st.caption(f"Host cache ({HOST_CACHE_PATH}) is unavailable; every worker is reading the API directly")
+    thumb_stats = get_thumbnail_cache().stats()
+    st.caption(f"Thumbnails: {thumb_stats['hits']} hits, {thumb_stats['misses']} decoded "
+               f"({thumb_stats['decode_seconds']:.2f}s), {thumb_stats['evictions']} evicted, "
+               f"{thumb_stats['bytes'] / 1024 / 1024:.1f} of {thumb_stats['max_bytes'] / 1024 / 1024:.0f} MB on disk")
+    result_stats = get_result_cache().stats()
+    st.caption(f"Login/search results: {result_stats['hits']} hits, {result_stats['misses']} misses, "
+               f"{result_stats['entries']} cached, collection generation {result_stats['generation']}")
+    spec = speculation_stats()
+    st.caption(f"Speculative login/search: {spec['started']} started, {spec['ready']} ready on click, "
+               f"{spec['joined']} joined in flight, {spec['cancelled']} cancelled, "
+               f"{spec['discarded'] + spec['stale']} discarded, {spec['failed']} failed")
+    roster_stats = get_roster_store().stats()
+    st.caption(f"Roster: {roster_stats['size']:,} phones at collection version {roster_stats['version']}, "
+               f"{roster_stats['full']} full downloads, {roster_stats['delta']} delta syncs")
+
+    # Durable enrollment queue
+    st.subheader("📥 Enrollment Queue")
+    queue = get_enroll_queue()
+    queue_stats = queue.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Queue Depth", queue_stats["depth"])
+    with col2:
+        oldest = queue_stats["oldest_age"]
+        st.metric("Oldest Waiting", f"{oldest:.0f}s" if oldest is not None else "—")
+    with col3:
+        st.metric("Drain Rate", f"{queue_stats['drain_rate'] * 60:.1f}/min")
+    with col4:
+        st.metric("Failed", queue_stats["failed"])
+    st.caption(f"{queue_stats['in_flight']} in flight, {queue_stats['done']} done; "
+               f"{ENROLL_QUEUE_CONCURRENCY} parallel, batches of {ENROLL_QUEUE_BATCH}")
+    if queue_stats["failed"]:
+        with st.expander(f"❌ Failed enrollments ({queue_stats['failed']})"):
+            st.dataframe([{"Job": job.id, "Photo": job.filename or job.image_url, "Phone": job.phone,
+                           "Status Code": job.status_code, "Detail": job.detail} for job in queue.failed()],
+                         use_container_width=True)
+            if st.button("🔁 Retry Failed"):
+                st.success(f"✅ Re-queued {queue.retry_failed()} enrollments")
+
+    # Duplicate photo index
+    st.subheader("🧬 Duplicate Photo Index")
+    dedupe_stats = get_duplicate_index().stats()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Indexed Photos", f"{dedupe_stats['entries']:,}")
+    with col2:
+        st.metric("Lookups", dedupe_stats["lookups"])
+    with col3:
+        st.metric("Mean Lookup", f"{dedupe_stats['mean_lookup_seconds'] * 1e6:.0f} µs")
+    st.caption(f"Photos within {dedupe_stats['max_distance']} of 64 dHash bits of an enrolled one are flagged")
+    if st.button("🔁 Rebuild from Roster",
+                 help="Drop indexed photos whose phone is no longer enrolled and re-hash enrolled URL photos "
+                      "the index is missing"):
+        roster = get_roster_store().get(list_enrolled_phones, page_size=ROSTER_FETCH_PAGE,
+                                        delta_fn=list_roster_changes)
+        if roster is None:
+            st.error("❌ Could not load the roster")
+        else:
+            with st.spinner("Re-hashing enrolled photos..."):
+                removed, added = rebuild_duplicate_index([roster[i] for i in range(len(roster))])
+            st.success(f"✅ Removed {removed} stale entries, added {added} missing photos")
+
+    # Rerun profiler
+    st.subheader("🧪 Rerun Profiler")
+    profiler = get_profiler()
+    col1, col2 = st.columns(2)
+    with col1:
+        profiler.enabled = st.checkbox("Profile reruns", value=profiler.enabled,
+                                       help="Time each phase of every rerun, in every session")
+    with col2:
+        profiler.capture_calls = st.checkbox("Capture cProfile", value=profiler.capture_calls,
+                                             disabled=not profiler.enabled,
+                                             help="Run reruns under cProfile, one session at a time")
+    phase_summary = profiler.summary()
+    if phase_summary:
+        def ms(value):
+            return f"{value * 1000:.1f} ms"
+        st.dataframe([
+            {
+                "Phase": name,
+                "Runs": stats["count"],
+                "Mean": ms(stats["mean"]),
+                "p95": ms(stats["p95"]),
+                "Network": ms(stats["network"]),
+                "Decode": ms(stats["decode"]),
+                "Render": ms(stats["render"]),
+            }
+            for name, stats in phase_summary.items()
+        ], use_container_width=True)
+        reruns = profiler.reruns()
+        with st.expander(f"🕒 Recent reruns ({len(reruns)})"):
+            st.dataframe([
+                {
+                    "Started": time.strftime("%H:%M:%S", time.localtime(record.started_at)),
+                    "Page": record.page,
+                    "Total": ms(record.total),
+                    "Network": ms(sum(t.network for t in record.phases.values())),
+                    "Decode": ms(sum(t.decode for t in record.phases.values())),
+                    "Render": ms(sum(t.render for t in record.phases.values())),
+                    "Slowest Phase": max(record.phases, key=lambda name: record.phases[name].total, default="—"),
+                    "cProfile": "✅" if record.pstats_data is not None else "",
+                }
+                for record in reruns
+            ], use_container_width=True)
+        top = profiler.top_functions()
+        if top is not None:
+            with st.expander("🔥 Top functions (cumulative)"):
+                st.code(top, language=None)
+            st.download_button("⬇️ Download pstats", profiler.pstats_bytes(), file_name="reruns.pstats",
+                               mime="application/octet-stream",
+                               help="Open with pstats, snakeviz, or flameprof for a flame graph")
+        if st.button("🧹 Clear Profile Data"):
+            profiler.clear()
+            st.rerun()
+    elif profiler.enabled:
+        st.info("Profiling is on; reruns will appear here.")
+
     # Database operations
     st.subheader("🗄️ Database Operations")
     
@@ -572,7 +1613,7 @@ def show_admin_page():
     
     with col1:
         st.markdown("### 📈 Collection Statistics")
-        collection_info = get_collection_info()
+        collection_info = snapshot.collection_info
         if collection_info:
             st.metric("Collection Name", collection_info.get("collection_name", "Unknown"))
             st.metric("Status", collection_info.get("status", "Unknown"))
@@ -581,6 +1622,9 @@ def show_admin_page():
         st.markdown("### 🧹 Maintenance")
         
         if st.button("🔄 Refresh Data", help="Reload collection information"):
+            get_host_cache().delete("health", "")
+            get_host_cache().delete("collection_info", "")
+            get_status_monitor().refresh(wait=2)
             st.rerun()
         
         st.markdown("---")
@@ -596,6 +1640,7 @@ def show_admin_page():
                 if result["success"]:
                     st.success("✅ All data cleared successfully")
                     st.session_state['confirm_clear'] = False
+                    on_collection_changed()
                     st.rerun()
                 else:
                     st.error(f"❌ Failed to clear data: {result['data'].get('detail', 'Unknown error')}")
@@ -604,4 +1649,5 @@ def show_admin_page():
                 st.session_state['confirm_clear'] = True
 
 if __name__ == "__main__":
-    main()
+    with get_profiler().rerun():
+        main()
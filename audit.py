@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+
+from bulk import read_records, percentile
+
+LoginFn = Callable[[str], Dict[str, Any]]
+SearchFn = Callable[[str, int], Dict[str, Any]]
+
+QUALITY_BUCKETS = ["excellent", "good", "fair", "poor", "very poor"]
+
+
+@dataclass
+class Probe:
+    """One probe photo, with the phone it should match if known"""
+    line: int
+    image_url: str
+    expected_phone: Optional[str] = None
+
+
+@dataclass
+class AuditRecord:
+    """Outcome of one /login or /search call for a probe"""
+    line: int
+    endpoint: str
+    image_url: str
+    expected_phone: Optional[str]
+    success: bool
+    status_code: int
+    latency: float
+    phone: Optional[str] = None
+    is_authenticated: Optional[bool] = None
+    distance: Optional[float] = None
+    confidence_score: Optional[float] = None
+    match_quality: Optional[str] = None
+    correct: Optional[bool] = None  # None when no expected phone was given
+    detail: str = ""
+
+
+def parse_probes(text: str, filename: str = "") -> List[Probe]:
+    """Read probes from CSV/JSON with an image_url and optional expected_phone column"""
+    probes = []
+    for line, record in enumerate(read_records(text, filename), 1):
+        image_url = str(record.get("image_url") or "").strip()
+        if image_url:
+            expected = str(record.get("expected_phone") or record.get("phone") or "").strip() or None
+            probes.append(Probe(line=line, image_url=image_url, expected_phone=expected))
+    return probes
+
+
+def _call(probe: Probe, endpoint: str, login_fn: LoginFn, search_fn: SearchFn, limit: int) -> AuditRecord:
+    start = time.perf_counter()
+    try:
+        result = login_fn(probe.image_url) if endpoint == "login" else search_fn(probe.image_url, limit)
+    except Exception as e:
+        result = {"success": False, "data": {"detail": f"Request failed: {str(e)}"}, "status_code": 500}
+    latency = time.perf_counter() - start
+
+    record = AuditRecord(line=probe.line, endpoint=endpoint, image_url=probe.image_url,
+                         expected_phone=probe.expected_phone, success=result["success"],
+                         status_code=result["status_code"], latency=latency)
+    data = result.get("data") or {}
+    if not result["success"]:
+        record.detail = data.get("detail", "Unknown error")
+        return record
+
+    if endpoint == "login":
+        match = data
+        record.is_authenticated = bool(data.get("is_authenticated"))
+    else:
+        matches = data.get("matches") or []
+        match = matches[0] if matches else {}
+
+    record.phone = match.get("phone")
+    record.distance = match.get("distance")
+    record.confidence_score = match.get("confidence_score")
+    record.match_quality = match.get("match_quality")
+    if probe.expected_phone:
+        accepted = record.is_authenticated if endpoint == "login" else bool(match)
+        record.correct = bool(accepted) and record.phone == probe.expected_phone
+    return record
+
+
+def iter_audit(probes: List[Probe], login_fn: LoginFn, search_fn: SearchFn,
+               endpoints: Tuple[str, ...] = ("login", "search"), concurrency: int = 8, limit: int = 5,
+               results_path: Optional[str] = None) -> Iterator[AuditRecord]:
+    """Replay probes through /login and /search concurrently, yielding records as they land.
+
+    When results_path is given every record is appended to it as a JSON line
+    and flushed immediately, so an interrupted run can still be summarized
+    with load_records().
+    """
+    out = open(results_path, "a", encoding="utf-8") if results_path else None
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="audit")
+    try:
+        futures = [pool.submit(_call, probe, endpoint, login_fn, search_fn, limit)
+                   for probe in probes for endpoint in endpoints]
+        for future in as_completed(futures):
+            record = future.result()
+            if out:
+                out.write(json.dumps(asdict(record)) + "\n")
+                out.flush()
+            yield record
+    finally:
+        # An abandoned run (e.g. the operator navigated away) drops its queued calls
+        pool.shutdown(wait=False, cancel_futures=True)
+        if out:
+            out.close()
+
+
+def load_records(path: str) -> List[AuditRecord]:
+    """Load records written by iter_audit, skipping a torn final line"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(AuditRecord(**json.loads(line)))
+            except (ValueError, TypeError):
+                continue
+    return records
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "min": min(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values),
+    }
+
+
+def summarize_audit(records: List[AuditRecord], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    """Per-endpoint accuracy, latency percentiles and per-quality score distributions"""
+    summary: Dict[str, Any] = {}
+    for endpoint in sorted({r.endpoint for r in records}):
+        rows = [r for r in records if r.endpoint == endpoint]
+        ok = [r for r in rows if r.success]
+        graded = [r for r in ok if r.correct is not None]
+        latencies = [r.latency for r in rows]
+
+        buckets = {}
+        for quality in QUALITY_BUCKETS + sorted({r.match_quality for r in ok if r.match_quality} - set(QUALITY_BUCKETS)):
+            in_bucket = [r for r in ok if r.match_quality == quality]
+            if in_bucket:
+                bucket_graded = [r for r in in_bucket if r.correct is not None]
+                buckets[quality] = {
+                    "count": len(in_bucket),
+                    "accuracy": (sum(r.correct for r in bucket_graded) / len(bucket_graded)) if bucket_graded else None,
+                    "distance": _distribution([r.distance for r in in_bucket if r.distance is not None]),
+                    "confidence_score": _distribution([r.confidence_score for r in in_bucket
+                                                       if r.confidence_score is not None]),
+                }
+
+        summary[endpoint] = {
+            "calls": len(rows),
+            "errors": len(rows) - len(ok),
+            "accuracy": (sum(r.correct for r in graded) / len(graded)) if graded else None,
+            "graded": len(graded),
+            "throughput": len(rows) / elapsed if elapsed else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "by_quality": buckets,
+        }
+    return summary
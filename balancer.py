@@ -0,0 +1,128 @@
+import math
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, List, Sequence
+
+
+class Backend:
+    """One API replica and what the client has observed about it"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.ewma: Optional[float] = None  # seconds, peak-sensitive
+        self.updated_at = 0.0
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def cost(self) -> float:
+        """Expected wait if sent here: latency estimate scaled by queued work.
+
+        An unmeasured replica costs 0 so new or recovered ones get traffic.
+        """
+        return (self.ewma or 0.0) * (self.inflight + 1)
+
+
+class BackendPool:
+    """Routes requests across API replicas.
+
+    Reads use power-of-two-choices over a peak-EWMA latency estimate: two
+    available replicas are sampled and the one with the lower cost wins, which
+    avoids herding onto a single "fastest" replica. Writes either go to the
+    first available replica in configured order ("primary", so enroll,
+    remove and clear land on one replica) or are balanced like reads.
+
+    A replica is ejected for eject_for seconds after eject_after consecutive
+    failures, or at once when a health check fails; a passing health check
+    brings it straight back.
+    """
+
+    def __init__(self, urls: Sequence[str], decay: float = 10.0, eject_after: int = 3,
+                 eject_for: float = 15.0, write_routing: str = "primary", seed: Optional[int] = None):
+        if not urls:
+            raise ValueError("At least one backend URL is required")
+        if write_routing not in ("primary", "balanced"):
+            raise ValueError(f"Unknown write routing {write_routing!r}")
+        self.backends = [Backend(url) for url in urls]
+        self.decay = decay
+        self.eject_after = eject_after
+        self.eject_for = eject_for
+        self.write_routing = write_routing
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _available(self, exclude: Sequence[Backend]) -> List[Backend]:
+        now = time.monotonic()
+        available = [b for b in self.backends if b.ejected_until <= now and b not in exclude]
+        if available:
+            return available
+        # Everything is ejected or already tried: fall back to whatever comes back soonest
+        candidates = [b for b in self.backends if b not in exclude] or self.backends
+        return [min(candidates, key=lambda b: b.ejected_until)]
+
+    def pick(self, write: bool = False, exclude: Sequence[Backend] = ()) -> Backend:
+        """Choose a replica; exclude lets a retry avoid the one that just failed"""
+        with self._lock:
+            available = self._available(exclude)
+            if write and self.write_routing == "primary":
+                return available[0]
+            if len(available) == 1:
+                return available[0]
+            first, second = self._random.sample(available, 2)
+            return first if first.cost() <= second.cost() else second
+
+    def start(self, backend: Backend):
+        with self._lock:
+            backend.inflight += 1
+            backend.requests += 1
+
+    def finish(self, backend: Backend, latency: float, ok: bool, penalty: float = 0.0):
+        """Record an attempt; ok is False for network errors and 5xx responses.
+
+        A failure counts as at least `penalty` seconds (the request timeout),
+        so a replica that fails fast doesn't look cheap to power-of-two-choices.
+        """
+        with self._lock:
+            backend.inflight -= 1
+            now = time.monotonic()
+            if not ok:
+                latency = max(latency, penalty)
+            if backend.ewma is None or latency > backend.ewma:
+                backend.ewma = latency  # peak: jump up at once, decay down slowly
+            else:
+                weight = math.exp(-(now - backend.updated_at) / self.decay)
+                backend.ewma = backend.ewma * weight + latency * (1 - weight)
+            backend.updated_at = now
+            if ok:
+                backend.consecutive_failures = 0
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.eject_after:
+                    backend.ejected_until = now + self.eject_for
+
+    def mark_health(self, backend: Backend, ok: bool):
+        """Apply an active health check result"""
+        with self._lock:
+            if ok:
+                backend.consecutive_failures = 0
+                backend.ejected_until = 0.0
+            else:
+                backend.consecutive_failures = max(backend.consecutive_failures, self.eject_after)
+                backend.ejected_until = time.monotonic() + self.eject_for
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [{
+                "url": b.url,
+                "available": b.ejected_until <= now,
+                "ejected_for": max(0.0, b.ejected_until - now),
+                "ewma": b.ewma,
+                "inflight": b.inflight,
+                "requests": b.requests,
+                "failures": b.failures,
+            } for b in self.backends]
@@ -0,0 +1,512 @@
+"""Benchmarks for the Streamlit client paths, run against the local stub API.
+
+    python bench.py fanout --latency 0.2 --runs 20
+    python bench.py thumbs --images ./samples
+    python bench.py dedupe --entries 1000000 --lookups 2000
+    python bench.py burst --bursts 40 --frames 10
+    python bench.py --json new.json load --concurrency 16 --requests 2000 --jitter 0.02
+    python bench.py compare base.json new.json --tolerance 0.1
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+from api_client import ApiClient
+from bulk import percentile
+from dedupe import DuplicateIndex
+from fanout import fan_out
+from frames import FrameBurst, is_authenticated, login_best_frames
+from stub_api import serve_in_background
+from thumbnails import make_thumbnail
+from uploads import prepare_upload
+
+
+def _timings(fn: Callable[[], Any], runs: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "runs": runs,
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+    }
+
+
+def bench_fanout(latency: float, runs: int, deadline: float) -> Dict[str, Any]:
+    """Home-page reads (health, collection info, roster) issued in sequence vs fanned out"""
+    server, base_url = serve_in_background(latency=latency)
+    client = ApiClient(base_url)
+    try:
+        reads = {
+            "health": lambda: client.get("health", "/health").json(),
+            "collection_info": lambda: client.get("collection_info", "/collection/info").json(),
+            "collection_list": lambda: client.get("collection_list", "/collection/list").json(),
+        }
+        sequential = _timings(lambda: [fn() for fn in reads.values()], runs)
+        parallel = _timings(lambda: fan_out(reads, deadline), runs)
+    finally:
+        client.close()
+        server.shutdown()
+    return {
+        "latency_per_call": latency,
+        "sequential": sequential,
+        "fan_out": parallel,
+        "speedup": sequential["mean"] / parallel["mean"] if parallel["mean"] else None,
+    }
+
+
+def sample_images(directory: Optional[str], count: int = 6, size: tuple = (4032, 3024)) -> List[bytes]:
+    """Load JPEG/PNG files from directory, or synthesise camera-sized JPEGs"""
+    if directory:
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                       if name.lower().endswith((".jpg", ".jpeg", ".png")))
+        samples = []
+        for path in paths:
+            with open(path, "rb") as f:
+                samples.append(f.read())
+        return samples
+
+    samples = []
+    for seed in range(count):
+        noise = Image.effect_noise(size, 24 + seed * 8)
+        gradient = Image.linear_gradient("L").resize(size)
+        image = Image.merge("RGB", (noise, gradient, gradient.rotate(90)))
+        out = BytesIO()
+        image.save(out, "JPEG", quality=90)
+        samples.append(out.getvalue())
+    return samples
+
+
+def _full_decode_thumbnail(data: bytes, max_side: int) -> bytes:
+    image = Image.open(BytesIO(data))
+    image.load()
+    image.thumbnail((max_side, max_side))
+    out = BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+    return out.getvalue()
+
+
+def bench_thumbs(directory: Optional[str], max_side: int, runs: int) -> Dict[str, Any]:
+    """Full decode + resize vs draft-mode make_thumbnail over a sample image set"""
+    samples = sample_images(directory)
+    if not samples:
+        raise SystemExit(f"No images found in {directory}")
+
+    full = _timings(lambda: [_full_decode_thumbnail(data, max_side) for data in samples], runs)
+    draft = _timings(lambda: [make_thumbnail(data, max_side) for data in samples], runs)
+    source_bytes = sum(len(data) for data in samples)
+    thumb_bytes = sum(len(make_thumbnail(data, max_side)) for data in samples)
+    return {
+        "images": len(samples),
+        "max_side": max_side,
+        "full_decode_per_image": {k: v / len(samples) for k, v in full.items() if k != "runs"},
+        "draft_decode_per_image": {k: v / len(samples) for k, v in draft.items() if k != "runs"},
+        "speedup": full["mean"] / draft["mean"] if draft["mean"] else None,
+        "source_bytes": source_bytes,
+        "thumbnail_bytes": thumb_bytes,
+        "size_ratio": thumb_bytes / source_bytes if source_bytes else None,
+    }
+
+
+def bench_dedupe(entries: int, lookups: int, max_distance: int, seed: int = 0) -> Dict[str, Any]:
+    """Duplicate index lookup latency at scale, against a linear popcount scan"""
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(entries)]
+    index = DuplicateIndex(max_distance=max_distance)
+    start = time.perf_counter()
+    index.load((value, None, str(i)) for i, value in enumerate(hashes))
+    build = time.perf_counter() - start
+
+    # Half the probes are near-copies of indexed photos, half are unseen photos
+    probes = []
+    for i in range(lookups):
+        if i % 2 == 0:
+            value = rng.choice(hashes)
+            for bit in rng.sample(range(64), rng.randint(0, max_distance)):
+                value ^= 1 << bit
+            probes.append((value, True))
+        else:
+            probes.append((rng.getrandbits(64), False))
+
+    latencies, found = [], 0
+    for value, planted in probes:
+        start = time.perf_counter()
+        matches = index.find(value)
+        latencies.append(time.perf_counter() - start)
+        found += planted and bool(matches)
+
+    scan_runs = min(lookups, 20)
+    start = time.perf_counter()
+    for value, _ in probes[:scan_runs]:
+        [h for h in hashes if (h ^ value).bit_count() <= max_distance]
+    scan = (time.perf_counter() - start) / scan_runs
+
+    mean = sum(latencies) / len(latencies)
+    return {
+        "entries": entries,
+        "max_distance": max_distance,
+        "build_seconds": build,
+        "lookup": {"mean": mean, "p50": percentile(latencies, 50), "p99": percentile(latencies, 99)},
+        "linear_scan_mean": scan,
+        "speedup": scan / mean if mean else None,
+        "recall": found / sum(planted for _, planted in probes),
+        "candidates_per_lookup": index.stats()["candidates"] / lookups,
+    }
+
+
+def _burst_frames(rng: random.Random, frames: int, sharp_rate: float) -> List[Tuple[bytes, bool]]:
+    """One synthetic turnstile burst: (JPEG, recognizable) per frame.
+
+    Every frame shows the same textured "face"; most are motion-blurred and
+    exposure drifts. A frame is recognizable when it is nearly sharp and
+    not far off normal exposure.
+    """
+    noise = np.random.default_rng(rng.getrandbits(32)).random((480, 640)) * 255
+    face = Image.fromarray(noise.astype("uint8")).filter(ImageFilter.GaussianBlur(1.5)).convert("RGB")
+    burst = []
+    for _ in range(frames):
+        radius = rng.uniform(0, 0.8) if rng.random() < sharp_rate else rng.uniform(1.2, 4)
+        gain = rng.uniform(0.4, 1.6)
+        image = ImageEnhance.Brightness(face.filter(ImageFilter.GaussianBlur(radius))).enhance(gain)
+        out = BytesIO()
+        image.save(out, "JPEG", quality=90)
+        burst.append((out.getvalue(), radius <= 1.0 and 0.6 <= gain <= 1.4))
+    return burst
+
+
+def bench_burst(bursts: int, frames: int, sharp_rate: float, latency: float, seed: int = 0) -> Dict[str, Any]:
+    """API calls per successful login: frames sent in capture order vs best-scored frames first.
+
+    The stub recognizes a frame only if it was generated recognizable, so a
+    blurry frame costs a /login call that fails, as at a real turnstile.
+    """
+    rng = random.Random(seed)
+    server, base_url = serve_in_background(latency=latency)
+    state = server.RequestHandlerClass.state
+    client = ApiClient(base_url)
+    recognizable: Dict[str, str] = {}  # sha256 of the prepared upload -> face fingerprint
+    state.recognize = lambda data: recognizable.get(hashlib.sha256(data).hexdigest(), "unrecognized")
+
+    samples = []
+    for b in range(bursts):
+        phone = f"90000{b:05d}"
+        state.phones[phone] = f"face-{phone}"
+        burst = _burst_frames(rng, frames, sharp_rate)
+        uploads = [prepare_upload(data, filename=f"frame_{i}.jpg") for i, (data, _) in enumerate(burst)]
+        for upload, (_, ok) in zip(uploads, burst):
+            if ok:
+                recognizable[hashlib.sha256(upload.data).hexdigest()] = f"face-{phone}"
+        samples.append(([data for data, _ in burst], uploads))
+
+    def login(upload) -> Dict[str, Any]:
+        response = client.post("login", "/login", data={}, files={"file": (upload.filename, upload.data, "image/jpeg")})
+        return {"success": response.status_code == 200, "data": response.json(), "status_code": response.status_code}
+
+    in_order = {"calls": 0, "logins": 0, "first_try": 0}
+    best_first = {"calls": 0, "logins": 0, "first_try": 0}
+    score_seconds = []
+    try:
+        for sources, uploads in samples:
+            # Without scoring: send frames as captured until one works
+            for attempt, upload in enumerate(uploads):
+                in_order["calls"] += 1
+                if is_authenticated(login(upload)):
+                    in_order["logins"] += 1
+                    in_order["first_try"] += attempt == 0
+                    break
+
+            start = time.perf_counter()
+            ranked = FrameBurst(sources).ranked()
+            score_seconds.append(time.perf_counter() - start)
+            result, _, calls = login_best_frames(ranked, lambda i: (login(uploads[i]), False), attempts=2)
+            best_first["calls"] += calls
+            if is_authenticated(result):
+                best_first["logins"] += 1
+                best_first["first_try"] += calls == 1
+    finally:
+        server.shutdown()
+
+    def describe(counts: Dict[str, int]) -> Dict[str, Any]:
+        return {
+            "calls": counts["calls"],
+            "success_rate": counts["logins"] / bursts,
+            "first_try_rate": counts["first_try"] / bursts,
+            "calls_per_login": counts["calls"] / counts["logins"] if counts["logins"] else None,
+        }
+
+    per_frame = sum(score_seconds) / (bursts * frames)
+    return {
+        "bursts": bursts,
+        "frames_per_burst": frames,
+        "recognizable_frames": len(recognizable) / (bursts * frames),
+        "in_capture_order": describe(in_order),
+        "best_scored_first": describe(best_first),
+        "scoring": {"per_burst": sum(score_seconds) / bursts, "per_frame": per_frame,
+                    "frames_per_second": 1 / per_frame if per_frame else None},
+    }
+
+
+DEFAULT_MIX = "login=0.5,search=0.2,enroll=0.1,collection_list=0.1,health=0.05,collection_info=0.05"
+
+
+def _parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        weights.append((name, float(weight or 1)))
+    return weights
+
+
+def _load_operations(app, seeded: List[str]) -> Dict[str, Callable[[random.Random], bool]]:
+    """Map operation names to calls of the real app.py helpers; each returns success"""
+    def enroll(rng: random.Random) -> bool:
+        phone = str(rng.randrange(10 ** 9, 10 ** 10))
+        return app.enroll_employee(f"https://images.example/load/emp_{phone}.jpg", phone)["success"]
+
+    def login(rng: random.Random) -> bool:
+        return app.login_employee(f"https://images.example/load/emp_{rng.choice(seeded)}.jpg")["success"]
+
+    def search(rng: random.Random) -> bool:
+        return app.search_faces(f"https://images.example/load/emp_{rng.choice(seeded)}.jpg", 5)["success"]
+
+    def remove(rng: random.Random) -> bool:
+        phone = str(rng.randrange(10 ** 9, 10 ** 10))
+        app.enroll_employee(f"https://images.example/load/emp_{phone}.jpg", phone)
+        return app.remove_enrollment(phone)["success"]
+
+    return {
+        "health": lambda rng: app.check_api_health()["status"] == "healthy",
+        "collection_info": lambda rng: app.get_collection_info() is not None,
+        "collection_list": lambda rng: app.list_enrolled_phones() is not None,
+        "enroll": enroll,
+        "login": login,
+        "search": search,
+        "remove": remove,
+    }
+
+
+def bench_load(concurrency: int, requests: int, mix: str, seed_count: int, latency: float,
+               jitter: float, error_rate: float, base_url: Optional[str] = None,
+               seed: int = 0, rate_limits: bool = True, max_in_flight: Optional[int] = None) -> Dict[str, Any]:
+    """Drive the app.py helpers from a worker pool and report throughput and latency percentiles.
+
+    rate_limits=False and max_in_flight lift the client's own admission
+    control, so a run measures the server rather than API_RATE_LIMITS.
+    """
+    # app.py renders Streamlit elements at import; in bare mode those only log warnings
+    import streamlit
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    import app
+
+    server = None
+    if base_url is None:
+        server, base_url = serve_in_background(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed)
+    app.API_BASE_URL = base_url
+    # A fresh host cache per run, so one run's reads can't answer the next one's
+    app.HOST_CACHE_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-host-cache-"), "host_cache.db")
+    if not rate_limits:
+        app.API_RATE_LIMITS = {}
+    if max_in_flight is not None:
+        app.API_MAX_IN_FLIGHT = max_in_flight
+
+    weights = _parse_mix(mix)
+    rng = random.Random(seed)
+    seeded = [str(rng.randrange(10 ** 9, 10 ** 10)) for _ in range(seed_count)]
+    for phone in seeded:
+        app.enroll_employee(f"https://images.example/load/emp_{phone}.jpg", phone)
+    operations = _load_operations(app, seeded)
+    plan = rng.choices([name for name, _ in weights], [weight for _, weight in weights], k=requests)
+
+    samples: Dict[str, List[float]] = {name: [] for name, _ in weights}
+    errors: Dict[str, int] = {name: 0 for name, _ in weights}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def run(name: str):
+        if not hasattr(local, "rng"):
+            local.rng = random.Random(f"{seed}-{threading.get_ident()}")
+        start = time.perf_counter()
+        try:
+            ok = operations[name](local.rng)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples[name].append(elapsed)
+            if not ok:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+            list(pool.map(run, plan))
+    finally:
+        if server is not None:
+            server.shutdown()
+    wall = time.perf_counter() - start
+
+    def describe(values: List[float], failed: int) -> Dict[str, Any]:
+        return {
+            "count": len(values),
+            "errors": failed,
+            "throughput": len(values) / wall if wall else 0.0,
+            "mean": sum(values) / len(values) if values else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+
+    all_samples = [value for values in samples.values() for value in values]
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "concurrency": concurrency,
+            "requests": requests,
+            "mix": mix,
+            "seeded_employees": seed_count,
+            "rate_limits": {name: [limit.rate, limit.burst] for name, limit in app.API_RATE_LIMITS.items()},
+            "max_in_flight": app.API_MAX_IN_FLIGHT,
+            "stub": None if server is None else {"latency": latency, "jitter": jitter, "error_rate": error_rate},
+            "wall_seconds": wall,
+        },
+        "overall": describe(all_samples, sum(errors.values())),
+        "operations": {name: describe(values, errors[name]) for name, values in samples.items() if values},
+    }
+
+
+# Metrics where a bigger number is a regression; everything in REGRESS_IF_LOWER is the opposite
+REGRESS_IF_HIGHER = {"mean", "p50", "p95", "p99"}
+REGRESS_IF_LOWER = {"throughput", "speedup"}
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float,
+                    path: str = "") -> List[Dict[str, Any]]:
+    """Walk two reports and list every comparable metric with its relative change"""
+    rows = []
+    for key, base_value in baseline.items():
+        if key == "meta" or key not in current:
+            continue
+        value = current[key]
+        name = f"{path}.{key}" if path else key
+        if isinstance(base_value, dict) and isinstance(value, dict):
+            rows += compare_reports(base_value, value, tolerance, name)
+        elif key in REGRESS_IF_HIGHER | REGRESS_IF_LOWER and isinstance(base_value, (int, float)) and base_value:
+            change = (value - base_value) / base_value
+            worse = change > tolerance if key in REGRESS_IF_HIGHER else change < -tolerance
+            rows.append({"metric": name, "baseline": base_value, "current": value,
+                         "change": change, "regression": worse})
+    return rows
+
+
+def _print_report(name: str, report: Dict[str, Any]):
+    print(f"== {name}")
+    for key, value in report.items():
+        if isinstance(value, dict):
+            cells = ", ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in value.items())
+            print(f"  {key:<16} {cells}")
+        else:
+            print(f"  {key:<16} {value:.4f}" if isinstance(value, float) else f"  {key:<16} {value}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="Also write the report to this file as JSON")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("fanout", help="Page render reads: sequential vs concurrent fan-out")
+    p.add_argument("--latency", type=float, default=0.2, help="Stub latency per call, seconds")
+    p.add_argument("--runs", type=int, default=10)
+    p.add_argument("--deadline", type=float, default=5.0)
+
+    p = sub.add_parser("thumbs", help="Thumbnail decode time and bytes: full decode vs draft mode")
+    p.add_argument("--images", help="Directory of sample images (default: synthetic 12 MP JPEGs)")
+    p.add_argument("--max-side", type=int, default=600)
+    p.add_argument("--runs", type=int, default=3)
+
+    p = sub.add_parser("dedupe", help="Duplicate photo index lookups: multi-index hashing vs linear scan")
+    p.add_argument("--entries", type=int, default=1_000_000)
+    p.add_argument("--lookups", type=int, default=2000)
+    p.add_argument("--max-distance", type=int, default=6)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("burst", help="Login from frame bursts: API calls per successful login, scoring rate")
+    p.add_argument("--bursts", type=int, default=40)
+    p.add_argument("--frames", type=int, default=10, help="Frames per burst (640x480)")
+    p.add_argument("--sharp-rate", type=float, default=0.3, help="Share of frames without motion blur")
+    p.add_argument("--latency", type=float, default=0.02, help="Stub latency per request, seconds")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("load", help="Drive the app.py API helpers at a given concurrency")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--requests", type=int, default=500)
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    p.add_argument("--seed-employees", type=int, default=100, help="Employees enrolled before the run")
+    p.add_argument("--latency", type=float, default=0.05, help="Stub latency per request, seconds")
+    p.add_argument("--jitter", type=float, default=0.0, help="Stub jitter, seconds")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Stub 503 injection rate")
+    p.add_argument("--base-url", help="Target a running API instead of an in-process stub")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--no-rate-limits", action="store_true",
+                   help="Disable the client's API_RATE_LIMITS, so the run measures the server, not the limiter")
+    p.add_argument("--max-in-flight", type=int, help="Override API_MAX_IN_FLIGHT for the run")
+
+    p = sub.add_parser("compare", help="Compare two --json reports and flag regressions")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative change (default 10%%)")
+
+    args = parser.parse_args(argv)
+    if args.bench == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+        rows = compare_reports(baseline, current, args.tolerance)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else "ok"
+            print(f"{row['metric']:<48} {row['baseline']:>10.4f} -> {row['current']:>10.4f} "
+                  f"({row['change'] * 100:+6.1f}%)  {flag}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+    if args.bench == "fanout":
+        report = bench_fanout(args.latency, args.runs, args.deadline)
+    elif args.bench == "thumbs":
+        report = bench_thumbs(args.images, args.max_side, args.runs)
+    elif args.bench == "dedupe":
+        report = bench_dedupe(args.entries, args.lookups, args.max_distance, args.seed)
+    elif args.bench == "burst":
+        report = bench_burst(args.bursts, args.frames, args.sharp_rate, args.latency, args.seed)
+    elif args.bench == "load":
+        report = bench_load(args.concurrency, args.requests, args.mix, args.seed_employees, args.latency,
+                            args.jitter, args.error_rate, base_url=args.base_url, seed=args.seed,
+                            rate_limits=not args.no_rate_limits, max_in_flight=args.max_in_flight)
+
+    _print_report(args.bench, report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({args.bench: report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import csv
+import io
+import json
+import math
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+
+from enroll_queue import DONE, FAILED, EnrollJob
+
+EnrollFn = Callable[..., Dict[str, Any]]  # (image_url, phone, idempotency_key=...) -> result
+PrecheckFn = Callable[["EnrollmentRow"], Optional[str]]
+SubmitFn = Callable[["EnrollmentRow", str], int]  # (row, run_id) -> enrollment queue job id
+JobsFn = Callable[[List[int]], List[EnrollJob]]
+
+
+def validate_phone(phone: str) -> Optional[str]:
+    """Return an error message if phone is invalid, None if it is acceptable"""
+    if not phone.isdigit() or len(phone) < 10:
+        return "Phone number must be at least 10 digits and contain only numbers"
+    return None
+
+
+@dataclass
+class EnrollmentRow:
+    """One (image_url, phone) entry from a bulk manifest"""
+    line: int
+    image_url: str
+    phone: Optional[str] = None
+
+
+@dataclass
+class EnrollmentOutcome:
+    """Result of enrolling one manifest row"""
+    line: int
+    image_url: str
+    phone: Optional[str]
+    success: bool
+    status_code: int
+    detail: str
+    attempts: int
+    latency: float  # seconds across all attempts
+
+
+def read_records(text: str, filename: str = "") -> List[Dict[str, Any]]:
+    """Read manifest records from CSV (with a header row), a JSON list or JSON lines"""
+    if filename.lower().endswith((".json", ".jsonl")) or text.lstrip().startswith(("[", "{")):
+        stripped = text.strip()
+        if stripped.startswith("["):
+            return json.loads(stripped)
+        return [json.loads(line) for line in stripped.splitlines() if line.strip()]
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def parse_manifest(text: str, filename: str = "") -> Tuple[List[EnrollmentRow], List[EnrollmentOutcome]]:
+    """Parse a CSV or JSON manifest and validate every row before anything is sent.
+
+    CSV needs an image_url column and may have a phone column. JSON may be a
+    list of objects or one object per line. Returns the rows that are ready to
+    enroll and a rejected outcome for every row that failed validation.
+    """
+    rows, rejected = [], []
+    for line, record in enumerate(read_records(text, filename), 1):
+        image_url = str(record.get("image_url") or "").strip()
+        phone = str(record.get("phone") or "").strip() or None
+
+        error = None
+        if not image_url:
+            error = "Missing image_url"
+        elif phone:
+            error = validate_phone(phone)
+
+        if error:
+            rejected.append(EnrollmentOutcome(line=line, image_url=image_url, phone=phone, success=False,
+                                              status_code=0, detail=error, attempts=0, latency=0.0))
+        else:
+            rows.append(EnrollmentRow(line=line, image_url=image_url, phone=phone))
+    return rows, rejected
+
+
+def row_idempotency_key(run_id: str, row: EnrollmentRow) -> str:
+    """Sent with every attempt for a row, so a retry after a lost response can't enroll twice"""
+    return f"bulk-{run_id}-{row.line}"
+
+
+def _skipped(row: EnrollmentRow, reason: str, start: float) -> EnrollmentOutcome:
+    return EnrollmentOutcome(line=row.line, image_url=row.image_url, phone=row.phone, success=False,
+                             status_code=0, detail=reason, attempts=0, latency=time.perf_counter() - start)
+
+
+def _enroll_with_retries(row: EnrollmentRow, enroll_fn: EnrollFn, retries: int, backoff: float,
+                         precheck: Optional[PrecheckFn] = None, run_id: str = "") -> EnrollmentOutcome:
+    start = time.perf_counter()
+    skip_reason = precheck(row) if precheck else None
+    if skip_reason:
+        return _skipped(row, skip_reason, start)
+    idempotency_key = row_idempotency_key(run_id, row)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            result = enroll_fn(row.image_url, row.phone, idempotency_key=idempotency_key)
+        except Exception as e:
+            # One malformed response must not abort the whole run
+            result = {"success": False, "data": {"detail": f"Request failed: {str(e)}"}, "status_code": 500}
+        # 4xx means the server rejected this row (no face, bad URL); retrying will not help
+        retryable = result.get("transport_error") or result["status_code"] >= 500
+        if result["success"] or not retryable or attempt > retries:
+            break
+        time.sleep(backoff * (2 ** (attempt - 1)))
+
+    data = result.get("data") or {}
+    return EnrollmentOutcome(
+        line=row.line,
+        image_url=row.image_url,
+        phone=data.get("phone", row.phone) if result["success"] else row.phone,
+        success=result["success"],
+        status_code=result["status_code"],
+        detail=data.get("message", "") if result["success"] else data.get("detail", "Unknown error"),
+        attempts=attempt,
+        latency=time.perf_counter() - start,
+    )
+
+
+def iter_bulk_enroll(rows: List[EnrollmentRow], enroll_fn: EnrollFn, concurrency: int = 8,
+                     retries: int = 2, backoff: float = 0.5,
+                     precheck: Optional[PrecheckFn] = None) -> Iterator[EnrollmentOutcome]:
+    """Enroll rows on a bounded worker pool, yielding outcomes as they complete.
+
+    precheck runs on the worker before any request; if it returns a reason
+    the row is skipped (attempts=0) and reported with that reason. Timeouts
+    and 5xx are retried, each row with an Idempotency-Key of its own.
+    """
+    run_id = uuid.uuid4().hex[:12]
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bulk-enroll")
+    try:
+        futures = [pool.submit(_enroll_with_retries, row, enroll_fn, retries, backoff, precheck, run_id)
+                   for row in rows]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # If the consumer stops early, rows that have not started are dropped
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _queue_row(row: EnrollmentRow, submit_fn: SubmitFn, precheck: Optional[PrecheckFn],
+               run_id: str) -> Tuple[Optional[int], Optional[EnrollmentOutcome], float]:
+    start = time.perf_counter()
+    skip_reason = precheck(row) if precheck else None
+    if skip_reason:
+        return None, _skipped(row, skip_reason, start), start
+    try:
+        return submit_fn(row, run_id), None, start
+    except Exception as e:
+        return None, _skipped(row, f"Could not queue: {str(e)}", start), start
+
+
+def iter_queued_enroll(rows: List[EnrollmentRow], submit_fn: SubmitFn, jobs_fn: JobsFn, concurrency: int = 8,
+                       precheck: Optional[PrecheckFn] = None,
+                       poll_interval: float = 0.25) -> Iterator[EnrollmentOutcome]:
+    """Write rows to the durable enrollment queue, yielding outcomes as the queue settles them.
+
+    precheck and submit_fn run on a pool of `concurrency` workers; the
+    queue's drainer does the sending and the retrying. Jobs outlive this
+    generator: rows already queued when the consumer stops still enroll.
+    """
+    run_id = uuid.uuid4().hex[:12]
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bulk-queue")
+    try:
+        queueing = {pool.submit(_queue_row, row, submit_fn, precheck, run_id): row for row in rows}
+        # Identical rows share one queued job, so a job id may stand for several rows
+        waiting: Dict[int, List[Tuple[EnrollmentRow, float]]] = {}
+        while queueing or waiting:
+            if queueing:
+                finished, _ = wait(list(queueing), timeout=poll_interval if waiting else None,
+                                   return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row = queueing.pop(future)
+                    job_id, outcome, start = future.result()
+                    if outcome is not None:
+                        yield outcome
+                    else:
+                        waiting.setdefault(job_id, []).append((row, start))
+            else:
+                time.sleep(poll_interval)
+            if not waiting:
+                continue
+            for job in jobs_fn(list(waiting)):
+                if job.status not in (DONE, FAILED):
+                    continue
+                success = job.status == DONE
+                for row, start in waiting.pop(job.id):
+                    yield EnrollmentOutcome(
+                        line=row.line,
+                        image_url=row.image_url,
+                        phone=(job.result_phone or row.phone) if success else row.phone,
+                        success=success,
+                        status_code=job.status_code or 0,
+                        detail=job.detail or ("" if success else "Unknown error"),
+                        attempts=job.attempts,
+                        latency=time.perf_counter() - start,
+                    )
+    finally:
+        # If the consumer stops early, rows that have not been queued are dropped
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(outcomes: List[EnrollmentOutcome], elapsed: float) -> Dict[str, Any]:
+    """Counts, throughput and latency percentiles for a bulk run"""
+    sent = [o for o in outcomes if o.attempts > 0]
+    latencies = [o.latency for o in sent]
+    return {
+        "total": len(outcomes),
+        "succeeded": sum(o.success for o in outcomes),
+        "failed": sum(not o.success for o in sent),
+        "rejected": len(outcomes) - len(sent),
+        "elapsed": elapsed,
+        "throughput": len(sent) / elapsed if elapsed > 0 else 0.0,
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+    }
+
+
+def outcomes_to_csv(outcomes: List[EnrollmentOutcome]) -> str:
+    """Render outcomes as a downloadable CSV report, in manifest order"""
+    buffer = io.StringIO()
+    fields = list(EnrollmentOutcome.__dataclass_fields__)
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for outcome in sorted(outcomes, key=lambda o: o.line):
+        row = asdict(outcome)
+        row["latency"] = f"{outcome.latency:.3f}"
+        writer.writerow(row)
+    return buffer.getvalue()
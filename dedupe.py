@@ -0,0 +1,393 @@
+import json
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+from itertools import combinations
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+try:
+    import fcntl
+except ImportError:  # Windows: the log is only safe with a single process
+    fcntl = None
+
+HASH_BITS = 64
+CHUNKS = 4  # 16-bit substrings, one lookup table each
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def dhash(data: bytes, hash_size: int = 8) -> int:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail.
+
+    Survives re-encoding, resizing and mild exposure changes, so the same
+    photo fetched from two URLs or re-saved by a phone hashes within a few bits.
+    """
+    image = Image.open(BytesIO(data))
+    if image.format == "JPEG":
+        image.draft("L", (hash_size * 8, hash_size * 8))
+    image = ImageOps.exif_transpose(image).convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius: int) -> List[int]:
+    """Every CHUNK_BITS-wide mask with at most radius bits set"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), r):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+
+@dataclass
+class DuplicateMatch:
+    phone: Optional[str]
+    source: str
+    distance: int
+
+    @property
+    def label(self) -> str:
+        return self.phone or self.source
+
+
+class DuplicateIndex:
+    """Perceptual-hash index answering "is this photo already enrolled?".
+
+    Lookups use multi-index hashing: the 64-bit hash is split into four
+    16-bit chunks with one table each. Two hashes within distance d agree to
+    within d // 4 bits on at least one chunk, so only a handful of buckets
+    are probed and their members checked with a popcount, instead of
+    scanning every entry. Changes are appended to a JSON-lines log and
+    replayed on start; prune() and clear() rewrite it compactly.
+
+    Several processes may share one log. Writes hold an flock on a sibling
+    .lock file, and every operation first replays what other processes
+    appended (or reloads after one of them compacted the log), so a rewrite
+    never drops another process's records.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_distance: int = 6):
+        self.path = path
+        self.max_distance = max_distance
+        self._lock = threading.RLock()
+        self._stats = {"lookups": 0, "lookup_seconds": 0.0, "candidates": 0}
+        self._offset = 0  # bytes of the log replayed so far
+        self._inode: Optional[int] = None
+        self._reset()
+        with self._lock:
+            self._sync()
+
+    def _reset(self):
+        self._hashes = array("Q")
+        self._phones: List[Optional[str]] = []
+        self._sources: List[str] = []
+        self._alive = bytearray()
+        self._live = 0
+        self._by_phone: Dict[str, List[int]] = {}
+        self._by_source: Dict[str, List[int]] = {}
+        # chunk value -> (entry ids, full hashes); hashes are kept inline so
+        # candidates are checked without indexing back into self._hashes
+        self._tables: List[Dict[int, Tuple[array, array]]] = [{} for _ in range(CHUNKS)]
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock on the log across processes, held around every write"""
+        if not self.path or fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Replay records appended since the last look, or reload if the log was replaced"""
+        if not self.path:
+            return
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset()
+                self._offset, self._inode = 0, None
+            return
+        if status.st_ino != self._inode or status.st_size < self._offset:
+            self._reset()
+            self._offset, self._inode = 0, status.st_ino
+        if status.st_size > self._offset:
+            self._replay(self.path)
+
+    def _replay(self, path: str):
+        with open(path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a write still in progress, or torn by a crash
+                self._offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                op = record.get("op")
+                if op == "add":
+                    self._insert(int(record["hash"], 16), record.get("phone"), record["source"])
+                elif op == "remove_phone":
+                    self._remove_phone(record["phone"])
+                elif op == "remove_source":
+                    self._remove(self._by_source.pop(record["source"], []))
+                elif op == "assign":
+                    self._assign(record["source"], record["phone"])
+
+    def _log(self, record: Dict[str, Any]):
+        """Append one record; callers hold _file_lock and have just called _sync()"""
+        if self.path:
+            line = (json.dumps(record) + "\n").encode()
+            with open(self.path, "ab") as f:
+                f.write(line)
+            if self._inode is None:
+                self._inode = os.stat(self.path).st_ino
+            self._offset += len(line)
+
+    def _insert(self, value: int, phone: Optional[str], source: str):
+        entry = len(self._hashes)
+        self._hashes.append(value)
+        self._phones.append(phone)
+        self._sources.append(source)
+        self._alive.append(1)
+        self._live += 1
+        if phone is not None:
+            self._by_phone.setdefault(phone, []).append(entry)
+        self._by_source.setdefault(source, []).append(entry)
+        for c, table in enumerate(self._tables):
+            key = (value >> (c * CHUNK_BITS)) & CHUNK_MASK
+            bucket = table.get(key)
+            if bucket is None:
+                bucket = table[key] = (array("I"), array("Q"))
+            bucket[0].append(entry)
+            bucket[1].append(value)
+
+    def _remove(self, entries: List[int]) -> int:
+        removed = 0
+        for i in entries:
+            if self._alive[i]:
+                self._alive[i] = 0
+                removed += 1
+        self._live -= removed
+        return removed
+
+    def _remove_phone(self, phone: str) -> int:
+        # assign_phone can move an entry to another phone, so re-check ownership
+        return self._remove([i for i in self._by_phone.pop(phone, []) if self._phones[i] == phone])
+
+    def _assign(self, source: str, phone: str):
+        for i in self._by_source.get(source, []):
+            if self._alive[i] and self._phones[i] != phone:
+                self._phones[i] = phone
+                self._by_phone.setdefault(phone, []).append(i)
+
+    def _find(self, value: int, max_distance: int) -> List[DuplicateMatch]:
+        masks = _flip_masks(max_distance // CHUNKS)
+        found: Dict[int, int] = {}
+        candidates = 0
+        for c, table in enumerate(self._tables):
+            key = (value >> (c * CHUNK_BITS)) & CHUNK_MASK
+            for mask in masks:
+                bucket = table.get(key ^ mask)
+                if bucket is None:
+                    continue
+                candidates += len(bucket[0])
+                for entry, other in zip(*bucket):
+                    distance = (other ^ value).bit_count()
+                    if distance <= max_distance:
+                        found[entry] = distance  # an entry can turn up in several tables
+        self._stats["candidates"] += candidates
+        return sorted((DuplicateMatch(self._phones[entry], self._sources[entry], distance)
+                       for entry, distance in found.items() if self._alive[entry]),
+                      key=lambda m: m.distance)
+
+    def find(self, value: int, max_distance: Optional[int] = None) -> List[DuplicateMatch]:
+        """Enrolled photos within max_distance bits of value, closest first"""
+        start = time.perf_counter()
+        with self._lock:
+            self._sync()
+            matches = self._find(value, self.max_distance if max_distance is None else max_distance)
+            self._stats["lookups"] += 1
+            self._stats["lookup_seconds"] += time.perf_counter() - start
+        return matches
+
+    def add(self, value: int, phone: Optional[str], source: str):
+        """Record an enrolled photo"""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._insert(value, phone, source)
+            self._log({"op": "add", "hash": f"{value:016x}", "phone": phone, "source": source})
+
+    def claim(self, value: int, phone: Optional[str], source: str) -> Optional[DuplicateMatch]:
+        """Return the closest existing match, or record this photo if there is none.
+
+        Check and insert happen under one lock, so two copies of a photo in the
+        same bulk run can't both get through.
+        """
+        with self._lock, self._file_lock():
+            self._sync()
+            matches = self._find(value, self.max_distance)
+            if matches:
+                return matches[0]
+            self._insert(value, phone, source)
+            self._log({"op": "add", "hash": f"{value:016x}", "phone": phone, "source": source})
+            return None
+
+    def assign_phone(self, source: str, phone: str):
+        """Attach the phone the API assigned (e.g. parsed from the filename) to a source"""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._assign(source, phone)
+            self._log({"op": "assign", "source": source, "phone": phone})
+
+    def has_source(self, source: str) -> bool:
+        with self._lock:
+            self._sync()
+            return any(self._alive[i] for i in self._by_source.get(source, []))
+
+    def remove_phone(self, phone: str) -> int:
+        with self._lock, self._file_lock():
+            self._sync()
+            removed = self._remove_phone(phone)
+            if removed:
+                self._log({"op": "remove_phone", "phone": phone})
+            return removed
+
+    def remove_source(self, source: str) -> int:
+        """Forget a photo whose enrollment failed after it was claimed"""
+        with self._lock, self._file_lock():
+            self._sync()
+            removed = self._remove(self._by_source.pop(source, []))
+            if removed:
+                self._log({"op": "remove_source", "source": source})
+            return removed
+
+    def clear(self):
+        with self._lock, self._file_lock():
+            self._reset()
+            self._rewrite()
+
+    def prune(self, phones: Iterable[str]) -> int:
+        """Drop entries for phones no longer enrolled and rewrite the log compactly.
+
+        Entries whose phone was never known are kept; the roster can't confirm
+        or deny them.
+        """
+        enrolled = set(phones)
+        with self._lock, self._file_lock():
+            self._sync()
+            live = [(self._hashes[i], self._phones[i], self._sources[i])
+                    for i in range(len(self._hashes)) if self._alive[i]]
+            kept = [entry for entry in live if entry[1] is None or entry[1] in enrolled]
+            self._reset()
+            self._load(kept)
+            return len(live) - len(kept)
+
+    def load(self, entries: Iterable[Tuple[int, Optional[str], str]]):
+        """Add many (hash, phone, source) entries and write one compact log (rebuilds, benchmarks)"""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._load(entries)
+
+    def _load(self, entries: Iterable[Tuple[int, Optional[str], str]]):
+        for value, phone, source in entries:
+            self._insert(value, phone, source)
+        self._rewrite()
+
+    def _rewrite(self):
+        """Replace the log with one add per live entry; callers hold _file_lock"""
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for i in range(len(self._hashes)):
+                if self._alive[i]:
+                    f.write(json.dumps({"op": "add", "hash": f"{self._hashes[i]:016x}",
+                                        "phone": self._phones[i], "source": self._sources[i]}) + "\n")
+        os.replace(tmp, self.path)
+        status = os.stat(self.path)
+        self._offset, self._inode = status.st_size, status.st_ino
+
+    def __len__(self) -> int:
+        return self._live
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return dict(self._stats, entries=self._live, max_distance=self.max_distance,
+                        mean_lookup_seconds=self._stats["lookup_seconds"] / lookups if lookups else 0.0)
+
+
+class BulkDuplicateGuard:
+    """Duplicate screening for one bulk run.
+
+    check() is the bulk enrollment precheck: it hashes the row's photo and,
+    when skipping, claims it in an in-memory index of this run so later
+    copies in the same run are caught too. Claims and pending hashes are
+    kept per manifest row, so two rows sharing a URL never settle each
+    other. finish() takes every outcome and
+    only then writes successes to the persistent index, so a run abandoned
+    mid-way (a rerun closing the generator, a crash) leaves no photo looking
+    enrolled that never was.
+    """
+
+    def __init__(self, index: DuplicateIndex, hash_fn: Callable[[str], Optional[int]], skip: bool = True):
+        self.index = index
+        self.hash_fn = hash_fn
+        self.skip = skip
+        self.skipped = 0
+        self._claims = DuplicateIndex(max_distance=index.max_distance)  # sent in this run, not yet settled
+        self._pending: Dict[int, int] = {}  # manifest line -> hash
+        self._lock = threading.Lock()
+
+    def check(self, row) -> Optional[str]:
+        value = self.hash_fn(row.image_url)
+        if value is None:
+            return None  # let the API report what's wrong with the image
+        with self._lock:
+            if self.skip:
+                matches = self.index.find(value) or self._claims.find(value)
+                if matches:
+                    self.skipped += 1
+                    return f"Skipped: likely duplicate of {matches[0].label} (distance {matches[0].distance})"
+                self._claims.add(value, row.phone, f"row {row.line}")
+            self._pending[row.line] = value
+        return None
+
+    def finish(self, outcome):
+        with self._lock:
+            value = self._pending.pop(outcome.line, None)
+            if value is None:
+                return
+            if outcome.success:
+                self.index.add(value, outcome.phone, outcome.image_url)
+            self._claims.remove_source(f"row {outcome.line}")
+
+
+_shared_index: Optional[DuplicateIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_duplicate_index(path: Optional[str] = None, max_distance: int = 6) -> DuplicateIndex:
+    """Return the process-wide duplicate index, loading it from disk on first use"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = DuplicateIndex(path, max_distance=max_distance)
+        return _shared_index
@@ -0,0 +1,331 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedupe_key TEXT NOT NULL,
+    image_url TEXT,
+    phone TEXT,
+    upload BLOB,
+    filename TEXT,
+    meta TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    status_code INTEGER,
+    detail TEXT,
+    result_phone TEXT,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (updated_at) WHERE status IN ('done', 'failed');
+"""
+
+
+@dataclass
+class EnrollJob:
+    """One queued enrollment"""
+    id: int
+    dedupe_key: str
+    image_url: Optional[str]
+    phone: Optional[str]
+    upload: Optional[bytes]
+    filename: Optional[str]
+    meta: Dict[str, Any]
+    status: str
+    attempts: int
+    created_at: float
+    status_code: Optional[int] = None
+    detail: Optional[str] = None
+    result_phone: Optional[str] = None
+
+    @property
+    def idempotency_key(self) -> str:
+        """Sent with every attempt of this job, and only this job; meta may carry the submitter's own"""
+        return self.meta.get("idempotency_key") or f"enroll-{self.id}-{self.dedupe_key[:16]}"
+
+
+def dedupe_key(image_url: Optional[str], phone: Optional[str], upload: Optional[bytes]) -> str:
+    """Same photo + same phone -> same key, so a double submit is enqueued once"""
+    digest = hashlib.sha256()
+    digest.update(upload if upload is not None else (image_url or "").encode())
+    digest.update(b"\0" + (phone or "").encode())
+    return digest.hexdigest()
+
+
+EnrollJobFn = Callable[[EnrollJob], Dict[str, Any]]
+CompleteFn = Callable[[EnrollJob, Dict[str, Any]], None]
+
+
+class EnrollmentQueue:
+    """Durable enrollment queue in SQLite (WAL) with a background drainer.
+
+    submit() writes the job and returns at once. The drainer claims ready jobs
+    in batches, sends them on a bounded pool and settles each one: success
+    and 4xx other than 429 are final; 429, 5xx and network errors are
+    retried with exponential backoff until max_attempts (or the job's
+    meta["max_attempts"]). Every attempt carries the job's idempotency key,
+    so a retry after a lost response cannot enroll twice on a server that
+    honours it.
+
+    Several processes may drain one file. A claim takes a lease of
+    lease_seconds, renewed before each attempt; only jobs whose lease has
+    run out (their process died) are taken over by another drainer.
+    """
+
+    def __init__(self, path: str, enroll_fn: EnrollJobFn, on_complete: Optional[CompleteFn] = None,
+                 concurrency: int = 4, batch_size: int = 16, max_attempts: int = 8,
+                 backoff: float = 1.0, max_backoff: float = 300.0, poll_interval: float = 1.0,
+                 lease_seconds: float = 300.0):
+        self.path = path
+        self.enroll_fn = enroll_fn
+        self.on_complete = on_complete
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            if "lease_until" not in columns:  # queue files written before leases
+                db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                db.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Short-lived autocommit connection; closing it rolls back an unfinished BEGIN"""
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute("PRAGMA synchronous=NORMAL")
+            yield db
+        finally:
+            db.close()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="enroll-queue")
+            self._thread = threading.Thread(target=self._run, name="enroll-queue-drainer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def submit(self, image_url: Optional[str], phone: Optional[str] = None, upload: Optional[bytes] = None,
+               filename: Optional[str] = None, meta: Optional[Dict[str, Any]] = None) -> int:
+        """Persist an enrollment and return its job id.
+
+        Submitting a photo and phone that are already waiting returns the
+        waiting job instead of queueing a second one.
+        """
+        key = dedupe_key(image_url, phone, upload)
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?)",
+                             (key, PENDING, IN_FLIGHT)).fetchone()
+            if row is not None:
+                db.execute("COMMIT")
+                return row[0]
+            job_id = db.execute(
+                "INSERT INTO jobs (dedupe_key, image_url, phone, upload, filename, meta, status, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, image_url, phone, upload, filename, json.dumps(meta or {}), PENDING, now, now, now),
+            ).lastrowid
+            db.execute("COMMIT")
+        self._wake.set()
+        return job_id
+
+    def _claim(self) -> List[EnrollJob]:
+        """Lease ready jobs, and in-flight ones whose drainer let its lease run out"""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                "SELECT id, dedupe_key, image_url, phone, upload, filename, meta, status, attempts, "
+                "created_at FROM jobs WHERE (status = ? AND next_attempt_at <= ?) "
+                "OR (status = ? AND COALESCE(lease_until, 0) <= ?) ORDER BY id LIMIT ?",
+                (PENDING, now, IN_FLIGHT, now, self.batch_size)).fetchall()
+            db.executemany("UPDATE jobs SET status = ?, updated_at = ?, owner = ?, lease_until = ? WHERE id = ?",
+                           [(IN_FLIGHT, now, self.owner, now + self.lease_seconds, row[0]) for row in rows])
+            db.execute("COMMIT")
+        return [EnrollJob(id=r[0], dedupe_key=r[1], image_url=r[2], phone=r[3], upload=r[4], filename=r[5],
+                          meta=json.loads(r[6] or "{}"), status=IN_FLIGHT, attempts=r[8], created_at=r[9])
+                for r in rows]
+
+    def _renew(self, job: EnrollJob) -> bool:
+        """Extend this drainer's lease on job; False if another drainer has taken it over"""
+        with self._connect() as db:
+            return db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND owner = ?",
+                              (time.time() + self.lease_seconds, job.id, IN_FLIGHT, self.owner)).rowcount == 1
+
+    def _attempt(self, job: EnrollJob):
+        if not self._renew(job):
+            return
+        try:
+            result = self.enroll_fn(job)
+        except Exception as e:
+            result = {"success": False, "data": {"detail": f"Request failed: {str(e)}"}, "status_code": 500}
+        data = result.get("data") or {}
+        attempts = job.attempts + 1
+        now = time.time()
+
+        retryable = result.get("transport_error") or result["status_code"] >= 500 or result["status_code"] == 429
+        max_attempts = job.meta.get("max_attempts", self.max_attempts)
+        if result["success"] or not retryable or attempts >= max_attempts:
+            status = DONE if result["success"] else FAILED
+            next_attempt_at = now
+        else:
+            status = PENDING
+            next_attempt_at = now + min(self.max_backoff, self.backoff * (2 ** (attempts - 1)))
+        detail = data.get("message", "") if result["success"] else data.get("detail", "Unknown error")
+        with self._connect() as db:
+            settled = db.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, next_attempt_at = ?, updated_at = ?, status_code = ?, "
+                "detail = ?, result_phone = ?, upload = CASE WHEN ? THEN NULL ELSE upload END, "
+                "owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                (status, attempts, next_attempt_at, now, result["status_code"], detail,
+                 data.get("phone") if result["success"] else None, status == DONE, job.id, self.owner)).rowcount
+        if not settled:
+            logger.warning("Enrollment job %s was taken over by another drainer before it settled", job.id)
+            return
+
+        if status != PENDING and self.on_complete is not None:
+            job.status, job.attempts, job.status_code, job.detail = status, attempts, result["status_code"], detail
+            job.result_phone = data.get("phone") if result["success"] else None
+            try:
+                self.on_complete(job, result)
+            except Exception:
+                logger.exception("Enrollment queue completion hook failed for job %s", job.id)
+
+    def _next_due(self) -> Optional[float]:
+        with self._connect() as db:
+            row = db.execute("SELECT MIN(CASE WHEN status = ? THEN next_attempt_at ELSE COALESCE(lease_until, 0) END) "
+                             "FROM jobs WHERE status IN (?, ?)", (PENDING, PENDING, IN_FLIGHT)).fetchone()
+        return row[0]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._claim()
+                if batch:
+                    # The whole batch settles before the next claim, capping load at `concurrency`
+                    list(self._pool.map(self._attempt, batch))
+                    continue
+                due = self._next_due()
+                wait = self.poll_interval if due is None else min(self.poll_interval, max(0.0, due - time.time()))
+            except Exception:
+                logger.exception("Enrollment queue drainer failed; retrying")
+                wait = self.poll_interval
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def jobs(self, ids: List[int]) -> List[EnrollJob]:
+        """Current state of the given jobs, in the order asked for"""
+        if not ids:
+            return []
+        with self._connect() as db:
+            rows = db.execute(
+                f"SELECT id, dedupe_key, image_url, phone, filename, meta, status, attempts, created_at, "
+                f"status_code, detail, result_phone FROM jobs WHERE id IN ({','.join('?' * len(ids))})",
+                ids).fetchall()
+        by_id = {r[0]: EnrollJob(id=r[0], dedupe_key=r[1], image_url=r[2], phone=r[3], upload=None,
+                                 filename=r[4], meta=json.loads(r[5] or "{}"), status=r[6], attempts=r[7],
+                                 created_at=r[8], status_code=r[9], detail=r[10], result_phone=r[11])
+                 for r in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def failed(self, limit: int = 50) -> List[EnrollJob]:
+        with self._connect() as db:
+            ids = [r[0] for r in db.execute("SELECT id FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+                                            (FAILED, limit))]
+        return self.jobs(ids)
+
+    def enrolled_photos(self) -> List[Tuple[str, Optional[str]]]:
+        """(image_url, phone) of every enrollment by URL that succeeded, oldest first"""
+        with self._connect() as db:
+            return db.execute("SELECT image_url, COALESCE(result_phone, phone) FROM jobs "
+                              "WHERE status = ? AND image_url IS NOT NULL ORDER BY id", (DONE,)).fetchall()
+
+    def retry_failed(self) -> int:
+        """Put every failed job back in the queue"""
+        now = time.time()
+        with self._connect() as db:
+            count = db.execute("UPDATE jobs SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? "
+                               "WHERE status = ?", (PENDING, now, now, FAILED)).rowcount
+        self._wake.set()
+        return count
+
+    def run_counts(self, run: str) -> Dict[str, int]:
+        """Jobs submitted with meta["run"] == run, by status"""
+        with self._connect() as db:
+            return dict(db.execute("SELECT status, COUNT(*) FROM jobs WHERE json_extract(meta, '$.run') = ? "
+                                   "GROUP BY status", (run,)).fetchall())
+
+    def stats(self, window: float = 60.0) -> Dict[str, Any]:
+        """Depth, age of the oldest waiting job and completions per second over `window`"""
+        now = time.time()
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = db.execute("SELECT MIN(created_at) FROM jobs WHERE status IN (?, ?)",
+                                (PENDING, IN_FLIGHT)).fetchone()[0]
+            finished = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?) AND updated_at >= ?",
+                                  (DONE, FAILED, now - window)).fetchone()[0]
+        return {
+            "depth": counts.get(PENDING, 0) + counts.get(IN_FLIGHT, 0),
+            "in_flight": counts.get(IN_FLIGHT, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "oldest_age": now - oldest if oldest is not None else None,
+            "drain_rate": finished / window,
+        }
+
+
+_shared_queue: Optional[EnrollmentQueue] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_queue(path: str, enroll_fn: EnrollJobFn, on_complete: Optional[CompleteFn] = None,
+                     concurrency: int = 4, batch_size: int = 16) -> EnrollmentQueue:
+    """Return the process-wide enrollment queue, starting its drainer on first use"""
+    global _shared_queue
+    with _shared_lock:
+        if _shared_queue is None:
+            _shared_queue = EnrollmentQueue(path, enroll_fn, on_complete=on_complete,
+                                            concurrency=concurrency, batch_size=batch_size)
+        _shared_queue.start()
+        return _shared_queue
@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable
+
+from profiler import NETWORK, track
+
+
+@dataclass
+class CallResult:
+    """Outcome of one call in a fan-out"""
+    value: Any = None
+    error: Optional[str] = None
+    timed_out: bool = False
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int = 16) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout")
+        return _executor
+
+
+def fan_out(calls: Dict[str, Callable[[], Any]], deadline: float,
+            executor: Optional[ThreadPoolExecutor] = None) -> Dict[str, CallResult]:
+    """Run independent calls in parallel and wait at most `deadline` seconds for all of them.
+
+    Render time becomes the slowest call rather than the sum. A call still
+    running at the deadline is reported as timed_out so only its widget
+    degrades; it finishes in the background and its result is dropped.
+    Pass executor to run on a dedicated pool instead of the shared one (a
+    fan-out made from inside a shared-pool task must not wait on that pool).
+    """
+    executor = executor or _get_executor()
+    start = time.perf_counter()
+    finished_at: Dict[str, float] = {}
+
+    def timed(name: str, fn: Callable[[], Any]) -> Any:
+        try:
+            return fn()
+        finally:
+            finished_at[name] = time.perf_counter()
+
+    futures = {name: executor.submit(timed, name, fn) for name, fn in calls.items()}
+    with track(NETWORK):
+        wait(futures.values(), timeout=deadline)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            results[name] = CallResult(timed_out=True, latency=time.perf_counter() - start)
+            continue
+        latency = finished_at.get(name, time.perf_counter()) - start
+        try:
+            results[name] = CallResult(value=future.result(), latency=latency)
+        except Exception as e:
+            results[name] = CallResult(error=str(e), latency=latency)
+    return results
@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Dict, Any, Callable, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps, ImageSequence
+
+ANALYSIS_SIDE = 256  # Frames are scored on a grayscale square of this side, center-cropped
+
+
+@dataclass
+class FrameScore:
+    """Local quality estimate for one frame of a burst; score is in [0, 1]"""
+    index: int
+    score: float
+    sharpness: float  # variance of the Laplacian over pixel variance, at analysis size
+    exposure: float  # 1 for mid-grey mean luminance and no clipping, towards 0 for dark/blown-out
+    size: float  # 1 once the shorter side reaches min_side
+    width: int
+    height: int
+
+
+def score_frames(gray: np.ndarray, sizes: np.ndarray, min_side: int = 320) -> Dict[str, np.ndarray]:
+    """Score a stack of frames at once.
+
+    gray is (frames, side, side) uint8 luminance; sizes is (frames, 2) original
+    width and height. Sharpness is normalised to the sharpest frame of the
+    burst, so the score ranks frames rather than judging them absolutely.
+    """
+    x = gray.astype(np.float32)
+    laplacian = (4 * x[:, 1:-1, 1:-1] - x[:, :-2, 1:-1] - x[:, 2:, 1:-1] - x[:, 1:-1, :-2] - x[:, 1:-1, 2:])
+    # Relative to the frame's own contrast, so a brighter exposure doesn't read as sharper
+    sharpness = laplacian.var(axis=(1, 2)) / np.maximum(x.var(axis=(1, 2)), 1e-6)
+
+    mean = x.mean(axis=(1, 2))
+    clipped = ((gray <= 5) | (gray >= 250)).mean(axis=(1, 2))
+    exposure = np.clip(1 - np.abs(mean - 118) / 118, 0, 1) * (1 - clipped)
+
+    size = np.clip(sizes.min(axis=1) / min_side, 0, 1)
+    score = sharpness / max(float(sharpness.max()), 1e-6) * exposure * size
+    return {"score": score, "sharpness": sharpness, "exposure": exposure, "size": size}
+
+
+class FrameBurst:
+    """A short burst of frames: several photos, or one animated GIF/WebP/PNG.
+
+    Frames are decoded once at analysis size (JPEG draft mode where it
+    applies), center-cropped to a square so portrait and landscape frames
+    keep their aspect, and stacked into one array, so scoring a burst is a
+    handful of NumPy operations. Full-size frames are only rebuilt for the ones sent.
+    """
+
+    def __init__(self, sources: Sequence[bytes], max_frames: int = 60, side: int = ANALYSIS_SIDE):
+        self.sources = list(sources)
+        self._frames: List[Tuple[int, int]] = []  # (source, frame within source)
+        sizes, gray = [], []
+        for source_index, data in enumerate(self.sources):
+            image = Image.open(BytesIO(data))
+            size = image.size
+            if getattr(image, "n_frames", 1) == 1:
+                image.draft("L", (side, side))  # JPEG only: decode at 1/2..1/8 scale
+                frames = [image]
+            else:
+                frames = ImageSequence.Iterator(image)
+            for frame_index, frame in enumerate(frames):
+                if len(self._frames) >= max_frames:
+                    break
+                gray.append(np.asarray(ImageOps.fit(frame.convert("L"), (side, side), Image.BILINEAR)))
+                sizes.append(size)
+                self._frames.append((source_index, frame_index))
+        if not self._frames:
+            raise ValueError("No frames in the burst")
+        self.gray = np.stack(gray)
+        self.sizes = np.array(sizes)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def scores(self, min_side: int = 320) -> List[FrameScore]:
+        scored = score_frames(self.gray, self.sizes, min_side=min_side)
+        return [FrameScore(index=i, score=float(scored["score"][i]), sharpness=float(scored["sharpness"][i]),
+                           exposure=float(scored["exposure"][i]), size=float(scored["size"][i]),
+                           width=int(self.sizes[i][0]), height=int(self.sizes[i][1]))
+                for i in range(len(self))]
+
+    def ranked(self, min_side: int = 320) -> List[FrameScore]:
+        """Frames best first"""
+        return sorted(self.scores(min_side=min_side), key=lambda frame: -frame.score)
+
+    def frame_bytes(self, index: int) -> bytes:
+        """Encoded full-size frame, ready for prepare_upload; a still photo is returned as given"""
+        source_index, frame_index = self._frames[index]
+        data = self.sources[source_index]
+        image = Image.open(BytesIO(data))
+        if getattr(image, "n_frames", 1) == 1:
+            return data
+        image.seek(frame_index)
+        out = BytesIO()
+        image.convert("RGB").save(out, "PNG")
+        return out.getvalue()
+
+
+def is_authenticated(result: Dict[str, Any]) -> bool:
+    return bool(result["success"] and result["data"].get("is_authenticated"))
+
+
+def login_best_frames(ranked: Sequence[FrameScore], login_fn: Callable[[int], Tuple[Dict[str, Any], bool]],
+                      attempts: int = 2) -> Tuple[Optional[Dict[str, Any]], Optional[FrameScore], int]:
+    """Try the best frames in order until one authenticates.
+
+    login_fn returns (result, served_from_cache), like cached_login. Returns
+    (last result, frame that produced it, API calls made); answers from the
+    result cache are not calls. At most `attempts` frames are tried, however
+    many were captured.
+    """
+    result, frame, calls = None, None, 0
+    for frame in ranked[:attempts]:
+        result, from_cache = login_fn(frame.index)
+        calls += not from_cache
+        if is_authenticated(result):
+            break
+    return result, frame, calls
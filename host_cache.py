@@ -0,0 +1,241 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+ACCESS_RESOLUTION = 5.0  # Seconds; a read only rewrites an entry's LRU timestamp this often
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    meta TEXT,
+    size INTEGER NOT NULL,
+    generation INTEGER,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expiry ON entries (expires_at);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('generation', 0);
+"""
+
+GENERATION = "(SELECT value FROM counters WHERE name = 'generation')"
+
+
+@dataclass
+class HostEntry:
+    """One cached value as read back from the host cache"""
+    value: bytes
+    meta: Dict[str, Any] = field(default_factory=dict)
+    stored_at: float = 0.0
+
+
+class HostCache:
+    """Cache shared by every frontend process on the host, in one SQLite (WAL) file.
+
+    Entries carry a TTL and the whole file is bounded by max_bytes, evicting
+    the least recently read first. Values derived from the collection are
+    stored with the collection generation they were read under;
+    invalidate_collection() bumps the generation and drops them in one
+    transaction, and a put computed under an older generation is refused, so
+    no worker can re-publish a read that raced an enroll, remove or clear.
+    The file outlives the processes, so a restarted worker starts warm.
+    Every failure is logged and treated as a miss: the cache never breaks a page.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024,
+                 max_entry_bytes: int = 16 * 1024 * 1024, timeout: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "refused": 0, "invalidations": 0, "errors": 0}
+        self._seen_generation: Optional[int] = None
+
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Short-lived autocommit connection; closing it rolls back an unfinished BEGIN"""
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            db.execute("PRAGMA synchronous=NORMAL")
+            yield db
+        finally:
+            db.close()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, namespace: str, key: str) -> Optional[HostEntry]:
+        """The live entry for (namespace, key), or None if absent, expired or from an older generation"""
+        now = time.time()
+        try:
+            with self._connect() as db:
+                row = db.execute(f"SELECT value, meta, stored_at, expires_at, accessed_at, generation, {GENERATION} "
+                                 "FROM entries WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+                if row is not None and row[3] > now and row[5] in (None, row[6]) and now - row[4] >= ACCESS_RESOLUTION:
+                    db.execute("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                               (now, namespace, key))
+        except sqlite3.Error as e:
+            logger.warning("Host cache read failed: %s", e)
+            self._count("errors")
+            return None
+        if row is None or row[3] <= now or row[5] not in (None, row[6]):
+            self._count("misses")
+            return None
+        self._count("hits")
+        return HostEntry(value=row[0], meta=json.loads(row[1]) if row[1] else {}, stored_at=row[2])
+
+    def put(self, namespace: str, key: str, value: bytes, ttl: float,
+            meta: Optional[Dict[str, Any]] = None, generation: Optional[int] = None) -> bool:
+        """Store value for ttl seconds; False if it was too large or its generation is no longer current.
+
+        Pass generation (read with generation() before fetching) for values
+        derived from the collection, so invalidate_collection() covers them.
+        """
+        size = len(value)
+        if size > self.max_entry_bytes or size > self.max_bytes:
+            return False
+        now = time.time()
+        try:
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                stored = db.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, meta, size, generation, "
+                    "stored_at, expires_at, accessed_at) "
+                    f"SELECT ?, ?, ?, ?, ?, ?, ?, ?, ? WHERE ? IS NULL OR ? = {GENERATION}",
+                    (namespace, key, value, json.dumps(meta) if meta else None, size, generation,
+                     now, now + ttl, now, generation, generation)).rowcount
+                if stored:
+                    self._evict(db, now)
+                db.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning("Host cache write failed: %s", e)
+            self._count("errors")
+            return False
+        self._count("stores" if stored else "refused")
+        return bool(stored)
+
+    def delete(self, namespace: str, key: str):
+        """Drop one entry for every worker, so the next read goes to the source"""
+        try:
+            with self._connect() as db:
+                db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            logger.warning("Host cache write failed: %s", e)
+            self._count("errors")
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        """Drop expired entries, then the least recently read until the file is under max_bytes"""
+        db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = db.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at").fetchall()
+        for namespace, key, size in rows:
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            total -= size
+
+    def get_json(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self.get(namespace, key)
+        return json.loads(entry.value) if entry is not None else None
+
+    def put_json(self, namespace: str, key: str, value: Any, ttl: float, generation: Optional[int] = None) -> bool:
+        return self.put(namespace, key, json.dumps(value).encode(), ttl, generation=generation)
+
+    def fetch_json(self, namespace: str, key: str, ttl: float, fetch: Callable[[], Optional[Any]],
+                   collection: bool = False) -> Optional[Any]:
+        """Cached JSON value, or fetch() stored for every worker; None results are not stored"""
+        cached = self.get_json(namespace, key)
+        if cached is not None:
+            return cached
+        generation = self.generation() if collection else None
+        value = fetch()
+        if value is not None and (not collection or generation is not None):
+            self.put_json(namespace, key, value, ttl, generation=generation)
+        return value
+
+    def generation(self) -> Optional[int]:
+        """Current collection generation, or None if the file can't be read"""
+        try:
+            with self._connect() as db:
+                return db.execute(f"SELECT {GENERATION}").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning("Host cache read failed: %s", e)
+            self._count("errors")
+            return None
+
+    def invalidate_collection(self) -> Optional[int]:
+        """Atomically drop every collection-derived entry, on all workers; returns the new generation"""
+        try:
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute("UPDATE counters SET value = value + 1 WHERE name = 'generation'")
+                db.execute("DELETE FROM entries WHERE generation IS NOT NULL")
+                generation = db.execute(f"SELECT {GENERATION}").fetchone()[0]
+                db.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning("Host cache invalidation failed: %s", e)
+            self._count("errors")
+            return None
+        with self._lock:
+            self._stats["invalidations"] += 1
+            self._seen_generation = generation
+        return generation
+
+    def collection_changed(self) -> bool:
+        """Whether another process invalidated the collection since this one last looked"""
+        generation = self.generation()
+        if generation is None:
+            return False
+        with self._lock:
+            changed = self._seen_generation is not None and generation != self._seen_generation
+            self._seen_generation = generation
+        return changed
+
+    def stats(self) -> Dict[str, Any]:
+        """This process's hit/miss counts plus the shared file's entries, bytes and generation"""
+        with self._lock:
+            stats = dict(self._stats, max_bytes=self.max_bytes)
+        try:
+            with self._connect() as db:
+                entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries "
+                                           "WHERE expires_at > ?", (time.time(),)).fetchone()
+                stats.update(entries=entries, bytes=size,
+                             generation=db.execute(f"SELECT {GENERATION}").fetchone()[0])
+        except sqlite3.Error as e:
+            logger.warning("Host cache read failed: %s", e)
+            stats.update(entries=None, bytes=None, generation=None)
+        return stats
+
+
+_shared_cache: Optional[HostCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_host_cache(path: str, max_bytes: int = 512 * 1024 * 1024,
+                          max_entry_bytes: int = 16 * 1024 * 1024) -> HostCache:
+    """Return this process's handle on the host-wide cache, opening it on first use"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = HostCache(path, max_bytes=max_bytes, max_entry_bytes=max_entry_bytes)
+        return _shared_cache
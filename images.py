@@ -0,0 +1,289 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Dict, Any, Tuple
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from host_cache import HostCache
+from singleflight import SingleFlight
+
+SHARED_NAMESPACE = "image"  # Host cache namespace for image bytes, keyed by URL
+
+
+class ImageProbeError(Exception):
+    """Raised when an image cannot be inspected within the configured limits"""
+
+
+class ImageTooLarge(ImageProbeError):
+    """Raised when an image exceeds the byte or pixel limits"""
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """Image metadata read from the headers of a remote image"""
+    format: Optional[str]
+    width: int
+    height: int
+    mode: Optional[str] = None
+    size: Optional[int] = None  # bytes, None if the server did not say
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+_CONTENT_RANGE_TOTAL = re.compile(r"/(\d+)\s*$")
+
+
+def _total_size(response: requests.Response) -> Optional[int]:
+    """Full file size from a Content-Range (206) or Content-Length (200) header"""
+    if response.status_code == 206:
+        match = _CONTENT_RANGE_TOTAL.search(response.headers.get("Content-Range", ""))
+        return int(match.group(1)) if match else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def probe_image(url: str, session: Optional[requests.Session] = None, timeout: float = 5.0,
+                max_probe_bytes: int = 256 * 1024, chunk_size: int = 8 * 1024,
+                max_pixels: Optional[int] = None) -> ImageInfo:
+    """Read an image's format and dimensions without downloading the whole file.
+
+    Asks for the first max_probe_bytes with an HTTP Range request and streams
+    chunks until PIL can parse the header, then drops the connection. Servers
+    that ignore Range are read the same way and cut off early. The file size
+    comes from Content-Range/Content-Length, with a HEAD request as fallback.
+    Memory use is bounded by max_probe_bytes regardless of the image size.
+    """
+    session = session or requests.Session()
+    max_pixels = max_pixels or Image.MAX_IMAGE_PIXELS
+
+    headers = {"Range": f"bytes=0-{max_probe_bytes - 1}"}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code not in (200, 206):
+            raise ImageProbeError(f"HTTP {response.status_code} while probing image")
+        size = _total_size(response)
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+        buffer = bytearray()
+        image = None
+        for chunk in response.iter_content(chunk_size):
+            buffer.extend(chunk)
+            try:
+                image = Image.open(BytesIO(buffer))
+                break
+            except Image.DecompressionBombError:
+                raise
+            except Exception:
+                if len(buffer) >= max_probe_bytes:
+                    break
+        if image is None:
+            raise ImageProbeError(f"Could not read image header within {max_probe_bytes:,} bytes")
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height} pixels, over the {max_pixels:,} pixel limit")
+
+    if size is None:
+        try:
+            head = session.head(url, timeout=timeout, allow_redirects=True)
+            length = head.headers.get("Content-Length")
+            size = int(length) if head.ok and length and length.isdigit() else None
+        except requests.exceptions.RequestException:
+            pass
+
+    return ImageInfo(format=image.format, width=width, height=height, mode=image.mode, size=size,
+                     etag=etag, last_modified=last_modified)
+
+
+@dataclass
+class CachedImage:
+    """Image bytes plus the validators needed to revalidate them"""
+    content: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+
+class ImageCache:
+    """Process-wide LRU cache of image bytes keyed by URL, bounded by total bytes.
+
+    Entries younger than max_age are served straight from memory. Older ones
+    are revalidated with If-None-Match/If-Modified-Since, so an unchanged image
+    costs a 304 instead of a full download. With a host cache, a memory miss
+    first looks for a copy another worker on the host downloaded.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_age: float = 300.0,
+                 timeout: float = 5.0, pool_size: int = 10,
+                 max_image_bytes: int = 10 * 1024 * 1024, max_probes: int = 1024,
+                 shared: Optional[HostCache] = None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.max_age = max_age
+        self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+        self.max_probes = max_probes
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._entries: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._probes: "OrderedDict[str, Tuple[ImageInfo, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+        self._flights = SingleFlight()
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Return the image bytes for url, or None if the server refused it.
+
+        Network errors propagate as requests.exceptions.RequestException and
+        bodies over max_image_bytes raise ImageTooLarge without being buffered.
+        Concurrent misses for one URL (a page render and a background prefetch,
+        say) share a single download.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                if time.time() - entry.fetched_at < self.max_age:
+                    self._stats["hits"] += 1
+                    return entry.content
+
+        content, _ = self._flights.do(url, lambda: self._fetch(url, entry))
+        return content
+
+    def _fetch(self, url: str, entry: Optional[CachedImage]) -> Optional[bytes]:
+        if self.shared is not None:
+            hit = self.shared.get(SHARED_NAMESPACE, url)
+            if hit is not None:
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                self._store(url, CachedImage(content=hit.value, etag=hit.meta.get("etag"),
+                                             last_modified=hit.meta.get("last_modified"), fetched_at=hit.stored_at))
+                return hit.value
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if entry is not None and response.status_code == 304:
+                with self._lock:
+                    entry.fetched_at = time.time()
+                    self._stats["revalidated"] += 1
+                self._publish(url, entry)
+                return entry.content
+            if not response.ok:
+                return None
+            content = self._read_capped(response)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        entry = CachedImage(
+            content=content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=time.time(),
+        )
+        self._store(url, entry)
+        self._publish(url, entry)
+        return content
+
+    def _publish(self, url: str, entry: CachedImage):
+        """Hand a fresh download or revalidation to the other workers on the host"""
+        if self.shared is not None:
+            self.shared.put(SHARED_NAMESPACE, url, entry.content, ttl=self.max_age,
+                            meta={"etag": entry.etag, "last_modified": entry.last_modified})
+
+    def _read_capped(self, response: requests.Response) -> bytes:
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > self.max_image_bytes:
+            raise ImageTooLarge(f"Image is {int(length):,} bytes, over the {self.max_image_bytes:,} byte limit")
+        buffer = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            buffer.extend(chunk)
+            if len(buffer) > self.max_image_bytes:
+                raise ImageTooLarge(f"Image exceeds the {self.max_image_bytes:,} byte limit")
+        return bytes(buffer)
+
+    def probe(self, url: str) -> ImageInfo:
+        """Return header metadata for url, probing at most once per max_age"""
+        with self._lock:
+            cached = self._probes.get(url)
+            if cached is not None and time.time() - cached[1] < self.max_age:
+                self._probes.move_to_end(url)
+                return cached[0]
+
+        info = probe_image(url, session=self.session, timeout=self.timeout)
+        with self._lock:
+            self._probes[url] = (info, time.time())
+            self._probes.move_to_end(url)
+            while len(self._probes) > self.max_probes:
+                self._probes.popitem(last=False)
+        return info
+
+    def validator(self, url: str) -> Optional[str]:
+        """ETag (else Last-Modified) of url's current version, or None if the server sends neither.
+
+        Read from a fresh download when there is one, otherwise from a probe,
+        so identifying the image never costs a full download.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and time.time() - entry.fetched_at < self.max_age:
+                return entry.etag or entry.last_modified
+        info = self.probe(url)
+        return info.etag or info.last_modified
+
+    def _store(self, url: str, entry: CachedImage):
+        size = len(entry.content)
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old is not None:
+                self._size -= len(old.content)
+            if size > self.max_bytes:
+                return
+            self._entries[url] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.content)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, url: str):
+        with self._lock:
+            self._probes.pop(url, None)
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._size -= len(entry.content)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._size, max_bytes=self.max_bytes)
+
+
+_shared_cache: Optional[ImageCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_image_cache(max_bytes: int = 64 * 1024 * 1024, max_age: float = 300.0,
+                           max_image_bytes: int = 10 * 1024 * 1024,
+                           shared: Optional[HostCache] = None) -> ImageCache:
+    """Return the process-wide image cache, creating it on first use"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ImageCache(max_bytes=max_bytes, max_age=max_age, max_image_bytes=max_image_bytes,
+                                       shared=shared)
+        return _shared_cache
@@ -0,0 +1,259 @@
+import logging
+import threading
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cached health check up to the 30 s enroll/login timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, Prometheus style (non-cumulative internally)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class ApiMetrics:
+    """Per-endpoint latency histograms, error/timeout counters and byte totals"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._request_bytes: Dict[str, int] = {}
+        self._response_bytes: Dict[str, int] = {}
+        self._coalesced: Dict[str, int] = {}
+        self._not_modified: Dict[str, int] = {}
+        self._saved_bytes: Dict[str, int] = {}
+        self._queue_wait: Dict[Tuple[str, str], Histogram] = {}
+        self._rejected: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, endpoint: str, status: str, latency: float,
+                request_bytes: int = 0, response_bytes: int = 0):
+        """Record one upstream attempt; status is the HTTP code or "timeout"/"error" """
+        with self._lock:
+            histogram = self._latency.get((endpoint, status))
+            if histogram is None:
+                histogram = self._latency[(endpoint, status)] = Histogram(self.buckets)
+            histogram.observe(latency)
+            self._request_bytes[endpoint] = self._request_bytes.get(endpoint, 0) + request_bytes
+            self._response_bytes[endpoint] = self._response_bytes.get(endpoint, 0) + response_bytes
+
+    def record_error(self, endpoint: str, kind: str):
+        """Count a failed attempt; kind is "timeout", "connection", "http_5xx", ..."""
+        with self._lock:
+            self._errors[(endpoint, kind)] = self._errors.get((endpoint, kind), 0) + 1
+
+    def record_coalesced(self, endpoint: str):
+        """Count a call answered by joining an identical in-flight request"""
+        with self._lock:
+            self._coalesced[endpoint] = self._coalesced.get(endpoint, 0) + 1
+
+    def record_not_modified(self, endpoint: str, saved_bytes: int):
+        """Count a 304 answered from the stored body, and the body bytes it saved"""
+        with self._lock:
+            self._not_modified[endpoint] = self._not_modified.get(endpoint, 0) + 1
+            self._saved_bytes[endpoint] = self._saved_bytes.get(endpoint, 0) + saved_bytes
+
+    def observe_queue_wait(self, endpoint: str, priority: str, wait: float, admitted: bool = True):
+        """Record time spent in the admission queue, apart from upstream latency"""
+        with self._lock:
+            histogram = self._queue_wait.get((endpoint, priority))
+            if histogram is None:
+                histogram = self._queue_wait[(endpoint, priority)] = Histogram(self.buckets)
+            histogram.observe(wait)
+            if not admitted:
+                self._rejected[(endpoint, priority)] = self._rejected.get((endpoint, priority), 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint counts, p50/p95/p99 latency and bytes, for the admin page"""
+        with self._lock:
+            endpoints = sorted({endpoint for endpoint, _ in self._latency} | {e for e, _ in self._errors}
+                               | set(self._coalesced) | {e for e, _ in self._queue_wait})
+            result = {}
+            for endpoint in endpoints:
+                merged = Histogram(self.buckets)
+                for (name, _), histogram in self._latency.items():
+                    if name == endpoint:
+                        merged.merge(histogram)
+                errors = {kind: n for (name, kind), n in self._errors.items() if name == endpoint}
+                queued = Histogram(self.buckets)
+                for (name, _), histogram in self._queue_wait.items():
+                    if name == endpoint:
+                        queued.merge(histogram)
+                result[endpoint] = {
+                    "requests": merged.count,
+                    "errors": sum(errors.values()),
+                    "timeouts": errors.get("timeout", 0),
+                    "p50": merged.quantile(0.50),
+                    "p95": merged.quantile(0.95),
+                    "p99": merged.quantile(0.99),
+                    "mean": merged.sum / merged.count if merged.count else None,
+                    "request_bytes": self._request_bytes.get(endpoint, 0),
+                    "response_bytes": self._response_bytes.get(endpoint, 0),
+                    "coalesced": self._coalesced.get(endpoint, 0),
+                    "not_modified": self._not_modified.get(endpoint, 0),
+                    "saved_bytes": self._saved_bytes.get(endpoint, 0),
+                    "queue_p50": queued.quantile(0.50),
+                    "queue_p95": queued.quantile(0.95),
+                    "rejected": sum(n for (name, _), n in self._rejected.items() if name == endpoint),
+                }
+            return result
+
+    def render_prometheus(self, prefix: str = "face_api") -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            name = f"{prefix}_request_duration_seconds"
+            lines += [f"# HELP {name} Latency of Face Recognition API requests as seen by the frontend.",
+                      f"# TYPE {name} histogram"]
+            for (endpoint, status), histogram in sorted(self._latency.items()):
+                labels = f'endpoint="{endpoint}",status="{status}"'
+                cumulative = 0
+                for bound, n in zip(self.buckets, histogram.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            name = f"{prefix}_request_errors_total"
+            lines += [f"# HELP {name} Failed API attempts by kind (timeout, connection, http_5xx, ...).",
+                      f"# TYPE {name} counter"]
+            for (endpoint, kind), n in sorted(self._errors.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}",kind="{kind}"}} {n}')
+
+            for direction, totals in (("request", self._request_bytes), ("response", self._response_bytes)):
+                name = f"{prefix}_{direction}_bytes_total"
+                lines += [f"# HELP {name} Bytes of {direction} bodies exchanged with the API.",
+                          f"# TYPE {name} counter"]
+                for endpoint, n in sorted(totals.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {n}')
+
+            name = f"{prefix}_coalesced_requests_total"
+            lines += [f"# HELP {name} Calls answered by an identical in-flight request instead of a new one.",
+                      f"# TYPE {name} counter"]
+            for endpoint, n in sorted(self._coalesced.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {n}')
+
+            for name, help_text, totals in (
+                    (f"{prefix}_not_modified_total", "Revalidated reads answered 304 and served from the stored body.",
+                     self._not_modified),
+                    (f"{prefix}_saved_response_bytes_total", "Response body bytes not re-downloaded thanks to a 304.",
+                     self._saved_bytes)):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for endpoint, n in sorted(totals.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {n}')
+
+            name = f"{prefix}_admission_wait_seconds"
+            lines += [f"# HELP {name} Time API requests waited for admission, not counting upstream latency.",
+                      f"# TYPE {name} histogram"]
+            for (endpoint, priority), histogram in sorted(self._queue_wait.items()):
+                labels = f'endpoint="{endpoint}",priority="{priority}"'
+                cumulative = 0
+                for bound, n in zip(self.buckets, histogram.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            name = f"{prefix}_admission_rejected_total"
+            lines += [f"# HELP {name} Requests turned away after waiting their whole queue deadline.",
+                      f"# TYPE {name} counter"]
+            for (endpoint, priority), n in sorted(self._rejected.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}",priority="{priority}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, render: Callable[[], str],
+                         host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve render() at /metrics on a daemon thread; returns None if the port is taken.
+
+    The endpoint has no authentication, so it listens on loopback unless a
+    host is given (e.g. "0.0.0.0" for a scraper on another machine).
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.info("Metrics endpoint not started on %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+_shared_server: Optional[ThreadingHTTPServer] = None
+_shared_started = False
+_shared_lock = threading.Lock()
+
+
+def ensure_metrics_server(port: int, render: Callable[[], str], host: str = "127.0.0.1",
+                          span: int = 1) -> Optional[ThreadingHTTPServer]:
+    """Start the /metrics endpoint once per process; port 0 disables it.
+
+    With several workers on a host, each takes the first free port of
+    port .. port + span - 1, so every worker's metrics are exported.
+    """
+    global _shared_server, _shared_started
+    with _shared_lock:
+        if not _shared_started and port:
+            _shared_started = True
+            for candidate in range(port, port + max(1, span)):
+                _shared_server = start_metrics_server(candidate, render, host=host)
+                if _shared_server is not None:
+                    break
+            else:
+                logger.warning("Metrics endpoint not started: ports %s-%s on %s are taken",
+                               port, port + max(1, span) - 1, host)
+        return _shared_server
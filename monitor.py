@@ -0,0 +1,102 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Callable
+
+from fanout import fan_out
+
+
+@dataclass(frozen=True)
+class StatusSnapshot:
+    """Latest API health and collection info published by StatusMonitor"""
+    health: Dict[str, Any] = field(default_factory=lambda: {"status": "unknown", "data": None})
+    collection_info: Optional[Dict[str, Any]] = None
+    updated_at: Optional[float] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the snapshot was taken, or None before the first poll"""
+        return None if self.updated_at is None else time.time() - self.updated_at
+
+
+class StatusMonitor:
+    """Background thread that polls API health and collection info.
+
+    Page renders read snapshot(), which never blocks on the network, so an
+    offline API costs the poller its timeouts instead of every rerun.
+    """
+
+    def __init__(self, check_health: Callable[[], Dict[str, Any]],
+                 get_collection_info: Callable[[], Optional[Dict[str, Any]]],
+                 interval: float = 10.0, deadline: float = 15.0):
+        self.check_health = check_health
+        self.get_collection_info = get_collection_info
+        self.interval = interval
+        self.deadline = deadline
+
+        self._snapshot = StatusSnapshot()
+        self._lock = threading.Lock()
+        self._updated = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="api-status-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def snapshot(self) -> StatusSnapshot:
+        with self._lock:
+            return self._snapshot
+
+    def refresh(self, wait: float = 0.0) -> StatusSnapshot:
+        """Ask for an immediate poll, optionally waiting up to `wait` seconds for it"""
+        with self._lock:
+            previous = self._snapshot
+        self._wake.set()
+        if wait > 0:
+            with self._updated:
+                self._updated.wait_for(lambda: self._snapshot is not previous, timeout=wait)
+        return self.snapshot()
+
+    def _poll(self) -> StatusSnapshot:
+        reads = fan_out({"health": self.check_health, "collection_info": self.get_collection_info},
+                        deadline=self.deadline)
+        health = reads["health"].value if reads["health"].ok else {"status": "offline", "data": None}
+        collection_info = reads["collection_info"].value if health["status"] == "healthy" else None
+        return StatusSnapshot(health=health, collection_info=collection_info, updated_at=time.time())
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                snapshot = self._poll()
+            except Exception as e:
+                snapshot = StatusSnapshot(health={"status": "offline", "data": None, "error": str(e)},
+                                          updated_at=time.time())
+            with self._updated:
+                self._snapshot = snapshot
+                self._updated.notify_all()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+_shared_monitor: Optional[StatusMonitor] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_monitor(check_health: Callable[[], Dict[str, Any]],
+                       get_collection_info: Callable[[], Optional[Dict[str, Any]]],
+                       interval: float = 10.0) -> StatusMonitor:
+    """Return the process-wide monitor, starting it on first use"""
+    global _shared_monitor
+    with _shared_lock:
+        if _shared_monitor is None:
+            _shared_monitor = StatusMonitor(check_health, get_collection_info, interval=interval)
+        _shared_monitor.start()
+        return _shared_monitor
@@ -0,0 +1,223 @@
+import cProfile
+import functools
+import io
+import marshal
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Callable, Iterator, List
+
+NETWORK = "network"
+DECODE = "decode"
+
+_local = threading.local()
+
+
+@dataclass
+class PhaseTiming:
+    """Wall time of one phase of a rerun, excluding nested phases"""
+    total: float = 0.0
+    network: float = 0.0
+    decode: float = 0.0
+
+    @property
+    def render(self) -> float:
+        """Everything that is not network or decode: widget building, Streamlit, app logic"""
+        return max(0.0, self.total - self.network - self.decode)
+
+
+@dataclass
+class Rerun:
+    """One profiled script run"""
+    started_at: float
+    page: str = ""
+    total: float = 0.0
+    phases: Dict[str, PhaseTiming] = field(default_factory=dict)
+    pstats_data: Optional[bytes] = None  # marshalled pstats, when cProfile capture was on
+    _stack: List[List[Any]] = field(default_factory=list, repr=False)  # [name, started, nested, categories]
+    _category: Optional[str] = field(default=None, repr=False)
+
+
+class RenderProfiler:
+    """Opt-in timing of Streamlit reruns, phase by phase.
+
+    rerun() wraps one script run; inside it, phase() names a section (main's
+    header and sidebar, each show_* page) and track() marks time spent
+    waiting on the network or decoding images. Each phase's own time is
+    split into network, decode and the remainder, which is rendering. Phases
+    nest: a page's time excludes the sub-pages it calls.
+
+    The last `window` reruns are kept for the admin page. With capture_calls
+    on, a rerun is also run under cProfile, one at a time per process since
+    the profiler is process-wide; pstats are kept for the last `keep_pstats`.
+    """
+
+    def __init__(self, window: int = 50, enabled: bool = False, capture_calls: bool = False,
+                 keep_pstats: int = 10):
+        self.enabled = enabled
+        self.capture_calls = capture_calls
+        self.keep_pstats = keep_pstats
+        self._reruns: "deque[Rerun]" = deque(maxlen=window)
+        self._cprofile_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def rerun(self, name: str = "main") -> Iterator[Optional[Rerun]]:
+        if not self.enabled or getattr(_local, "rerun", None) is not None:
+            yield None
+            return
+        record = Rerun(started_at=time.time())
+        calls = None
+        if self.capture_calls and self._cprofile_lock.acquire(blocking=False):
+            calls = cProfile.Profile()
+        _local.rerun = record
+        try:
+            if calls is not None:
+                calls.enable()
+            with phase(name):
+                yield record
+        finally:
+            _local.rerun = None
+            if calls is not None:
+                calls.disable()
+                self._cprofile_lock.release()
+                calls.create_stats()
+                record.pstats_data = marshal.dumps(calls.stats)
+            record.total = sum(timing.total for timing in record.phases.values())
+            with self._lock:
+                self._reruns.append(record)
+                for old in list(self._reruns)[:-self.keep_pstats or None]:
+                    old.pstats_data = None
+
+    def reruns(self) -> List[Rerun]:
+        """Recent reruns, newest first"""
+        with self._lock:
+            return list(reversed(self._reruns))
+
+    def clear(self):
+        with self._lock:
+            self._reruns.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per phase over the window: count, mean and p95 total, and the mean split"""
+        by_phase: Dict[str, List[PhaseTiming]] = {}
+        for record in self.reruns():
+            for name, timing in record.phases.items():
+                by_phase.setdefault(name, []).append(timing)
+        summary = {}
+        for name, timings in by_phase.items():
+            totals = sorted(t.total for t in timings)
+            n = len(timings)
+            summary[name] = {
+                "count": n,
+                "mean": sum(totals) / n,
+                "p95": totals[min(n - 1, int(0.95 * n))],
+                "network": sum(t.network for t in timings) / n,
+                "decode": sum(t.decode for t in timings) / n,
+                "render": sum(t.render for t in timings) / n,
+            }
+        return dict(sorted(summary.items(), key=lambda item: -item[1]["mean"] * item[1]["count"]))
+
+    def pstats_bytes(self) -> Optional[bytes]:
+        """The captured reruns merged into one pstats file (pstats.Stats / snakeviz / flameprof)"""
+        captured = [r.pstats_data for r in self.reruns() if r.pstats_data is not None]
+        if not captured:
+            return None
+        merged = pstats.Stats(_Loaded(captured[0]), stream=io.StringIO())
+        for data in captured[1:]:
+            merged.add(_Loaded(data))
+        return marshal.dumps(merged.stats)
+
+    def top_functions(self, limit: int = 25, sort: str = "cumulative") -> Optional[str]:
+        """Printable pstats table of the captured reruns"""
+        data = self.pstats_bytes()
+        if data is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(_Loaded(data), stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class _Loaded:
+    """Adapter so pstats.Stats accepts marshalled stats held in memory"""
+
+    def __init__(self, data: bytes):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+def current_rerun() -> Optional[Rerun]:
+    """The rerun being profiled on this thread, if any"""
+    return getattr(_local, "rerun", None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a named section of the current rerun; a no-op outside a profiled rerun"""
+    record: Optional[Rerun] = getattr(_local, "rerun", None)
+    if record is None:
+        yield
+        return
+    frame = [name, time.perf_counter(), 0.0, {NETWORK: 0.0, DECODE: 0.0}]
+    record._stack.append(frame)
+    try:
+        yield
+    finally:
+        record._stack.pop()
+        elapsed = time.perf_counter() - frame[1]
+        timing = record.phases.setdefault(name, PhaseTiming())
+        timing.total += elapsed - frame[2]
+        timing.network += frame[3][NETWORK]
+        timing.decode += frame[3][DECODE]
+        if record._stack:
+            record._stack[-1][2] += elapsed
+
+
+@contextmanager
+def track(category: str) -> Iterator[None]:
+    """Count the enclosed time as network or decode in the current phase.
+
+    Nested tracking (an image download inside a decode helper, say) counts
+    once, under the outermost category. A no-op outside a profiled rerun,
+    including on worker threads.
+    """
+    record: Optional[Rerun] = getattr(_local, "rerun", None)
+    if record is None or not record._stack or record._category is not None:
+        yield
+        return
+    frame = record._stack[-1]
+    record._category = category
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record._category = None
+        if record._stack and record._stack[-1] is frame:
+            frame[3][category] += time.perf_counter() - start
+
+
+def profiled(fn: Callable) -> Callable:
+    """Decorator: run fn as a phase named after it"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with phase(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+_shared_profiler: Optional[RenderProfiler] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_profiler(window: int = 50, enabled: bool = False, capture_calls: bool = False) -> RenderProfiler:
+    """Return the process-wide render profiler, creating it on first use"""
+    global _shared_profiler
+    with _shared_lock:
+        if _shared_profiler is None:
+            _shared_profiler = RenderProfiler(window=window, enabled=enabled, capture_calls=capture_calls)
+        return _shared_profiler
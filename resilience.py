@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+
+import requests
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while an endpoint's breaker is open.
+
+    It is a RequestException, so helpers that already handle network errors
+    fail fast through their existing error path.
+    """
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one endpoint.
+
+    After failure_threshold consecutive failures the breaker opens and every
+    call is refused for reset_timeout seconds. Then one probe is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._short_circuited = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; in half-open, only one at a time"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": HALF_OPEN if retry_in == 0.0 else self._state,
+                "consecutive_failures": self._failures,
+                "short_circuited": self._short_circuited,
+                "retry_in": retry_in,
+            }
+
+
+class LatencyWindow:
+    """The last `size` latencies of one endpoint, for adaptive timeouts and hedging"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        """Nearest-rank quantile, or None until min_samples have been seen"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
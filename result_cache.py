@@ -0,0 +1,124 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple
+
+
+def content_key(data: bytes) -> str:
+    """Cache key for an image: the SHA-256 of its bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class CachedResult:
+    result: Dict[str, Any]
+    generation: int
+    stored_at: float
+    limit: Optional[int] = None
+
+
+class ResultCache:
+    """LRU cache of /login and /search results keyed by image content hash.
+
+    Every entry records the collection generation it was computed against.
+    Enroll, remove and clear bump the generation (as does any change seen in
+    /collection/info), which invalidates all older entries at once. A search
+    cached with limit L also answers any later search with limit <= L.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], CachedResult]" = OrderedDict()
+        self._generation = 0
+        self._collection_fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def bump(self):
+        """Invalidate every cached result; call after the collection changes"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def observe_collection(self, info: Optional[Dict[str, Any]]):
+        """Bump the generation if /collection/info differs from the last one seen"""
+        if info is None:
+            return
+        fingerprint = json.dumps(info, sort_keys=True, default=str)
+        with self._lock:
+            changed = self._collection_fingerprint not in (None, fingerprint)
+            self._collection_fingerprint = fingerprint
+        if changed:
+            self.bump()
+
+    def get(self, kind: str, key: str, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            usable = (
+                entry is not None
+                and entry.generation == self._generation
+                and time.time() - entry.stored_at < self.ttl
+            )
+            if usable and limit is not None:
+                matches = entry.result["data"].get("matches") or []
+                # A smaller cached search still answers if the server had nothing more to give
+                usable = entry.limit >= limit or len(matches) < entry.limit
+            if not usable:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self._stats["hits"] += 1
+            result = entry.result
+
+        if limit is None:
+            return result
+        matches = (result["data"].get("matches") or [])[:limit]
+        return dict(result, data=dict(result["data"], matches=matches, total_matches=len(matches)))
+
+    def put(self, kind: str, key: str, result: Dict[str, Any], generation: int,
+            limit: Optional[int] = None):
+        """Store a successful result computed at generation (read it before the API call).
+
+        Results that raced a collection change are dropped, and a search only
+        replaces a cached one with a larger limit.
+        """
+        if not result.get("success"):
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            existing = self._entries.get((kind, key))
+            if (limit is not None and existing is not None and existing.generation == self._generation
+                    and existing.limit >= limit):
+                return
+            self._entries[(kind, key)] = CachedResult(result=result, generation=self._generation,
+                                                      stored_at=time.time(), limit=limit)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), generation=self._generation)
+
+
+_shared_cache: Optional[ResultCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_result_cache(max_entries: int = 1024, ttl: float = 300.0) -> ResultCache:
+    """Return the process-wide result cache, creating it on first use"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResultCache(max_entries=max_entries, ttl=ttl)
+        return _shared_cache
@@ -0,0 +1,204 @@
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from typing import Optional, Dict, Any, Callable, Iterable, List, Sequence
+
+from singleflight import SingleFlight
+
+ListFn = Callable[[Optional[int], Optional[int]], Optional[Dict[str, Any]]]
+DeltaFn = Callable[[int], Optional[Dict[str, Any]]]
+
+
+class RosterIndex:
+    """Sorted, compact roster of enrolled phone numbers.
+
+    All phones live in one newline-separated bytes blob with a uint32 array of
+    start offsets, so 100k entries cost roughly 1.5 MB instead of 100k Python
+    strings. Prefix search is a binary search; substring search scans the
+    blob with bytes.find and maps hits back to positions.
+
+    version is the collection version the roster was read at, when the API
+    reports one; it is what a later delta sync asks for changes since.
+    """
+
+    def __init__(self, phones: Iterable[str], version: Optional[int] = None):
+        self.version = version
+        ordered = sorted(set(phones))
+        self._blob = b"".join(phone.encode() + b"\n" for phone in ordered)
+        self._offsets = array("I", [0])
+        position = 0
+        for phone in ordered:
+            position += len(phone.encode()) + 1
+            self._offsets.append(position)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _item(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1] - 1]
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("roster index out of range")
+        return self._item(i).decode()
+
+    def _first_not_below(self, key: bytes, lo: int = 0) -> int:
+        hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._item(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _first_without_prefix(self, prefix: bytes, lo: int) -> int:
+        hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._item(mid).startswith(prefix):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def search(self, query: str = "", mode: str = "prefix") -> Sequence[int]:
+        """Return positions matching query, in sorted order.
+
+        mode is "prefix" (a contiguous range) or "contains" (an array of positions).
+        """
+        needle = query.strip().encode()
+        if not needle:
+            return range(len(self))
+        if mode == "prefix":
+            lo = self._first_not_below(needle)
+            return range(lo, self._first_without_prefix(needle, lo))
+
+        positions = array("I")
+        start = self._blob.find(needle)
+        while start != -1:
+            i = bisect_right(self._offsets, start) - 1
+            positions.append(i)
+            start = self._blob.find(needle, self._offsets[i + 1])
+        return positions
+
+    def apply(self, added: Iterable[str], removed: Iterable[str], version: Optional[int]) -> "RosterIndex":
+        """A new index with a delta applied; this one is left untouched for concurrent readers"""
+        gone = set(removed)
+        current = (self._item(i).decode() for i in range(len(self)))
+        return RosterIndex([phone for phone in current if phone not in gone] + list(added), version=version)
+
+    def page(self, positions: Sequence[int], page: int, page_size: int) -> List[str]:
+        """Decode only the phones on one page of a search result"""
+        start = max(page, 0) * page_size
+        return [self._item(i).decode() for i in positions[start:start + page_size]]
+
+
+def fetch_roster(list_fn: ListFn, page_size: int = 5000) -> Optional[RosterIndex]:
+    """Download the roster with offset/limit paging and build an index.
+
+    Works against APIs that ignore the paging parameters too: a response that
+    already holds total_count phones, or repeats the first page, ends the loop.
+    """
+    first = list_fn(0, page_size)
+    if first is None:
+        return None
+    phones = list(first.get("phones", []))
+    total = first.get("total_count", len(phones))
+
+    while phones and len(phones) < total:
+        batch = list_fn(len(phones), page_size)
+        if not batch or not batch.get("phones") or batch["phones"][0] == phones[0]:
+            break
+        phones.extend(batch["phones"])
+    return RosterIndex(phones, version=first.get("version"))
+
+
+def sync_roster(index: RosterIndex, delta_fn: DeltaFn) -> Optional[RosterIndex]:
+    """Bring index up to date from the changes since its version.
+
+    Returns None when the API can't serve a delta (no version, history
+    trimmed, or an answer without added/removed) or the result doesn't add
+    up to the reported total; the caller then downloads the full roster.
+    """
+    if index.version is None:
+        return None
+    changes = delta_fn(index.version)
+    if not changes or "added" not in changes or "removed" not in changes:
+        return None
+    if not changes["added"] and not changes["removed"] and changes.get("version") == index.version:
+        return index
+    updated = index.apply(changes["added"], changes["removed"], changes.get("version"))
+    if len(updated) != changes.get("total_count", len(updated)):
+        return None
+    return updated
+
+
+class RosterStore:
+    """Process-wide roster index, refreshed after ttl or on invalidate().
+
+    A stale index is kept rather than dropped: with a delta_fn, a refresh
+    fetches only the phones added and removed since it was built. Refreshes
+    run outside the lock, and concurrent ones share a single download; the
+    lock only guards swapping the index in.
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._index: Optional[RosterIndex] = None
+        self._loaded_at = 0.0
+        self._epoch = 0  # bumped by invalidate(), so a refresh that raced one isn't taken as fresh
+        self._stats = {"full": 0, "delta": 0}
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+
+    def get(self, list_fn: ListFn, page_size: int = 5000,
+            delta_fn: Optional[DeltaFn] = None) -> Optional[RosterIndex]:
+        with self._lock:
+            if self._index is not None and time.time() - self._loaded_at < self.ttl:
+                return self._index
+        index, _ = self._flights.do("roster", lambda: self._refresh(list_fn, page_size, delta_fn))
+        return index
+
+    def _refresh(self, list_fn: ListFn, page_size: int, delta_fn: Optional[DeltaFn]) -> Optional[RosterIndex]:
+        with self._lock:
+            current, epoch = self._index, self._epoch
+        index = None
+        if current is not None and delta_fn is not None:
+            index = sync_roster(current, delta_fn)
+        delta = index is not None
+        if index is None:
+            index = fetch_roster(list_fn, page_size)
+        with self._lock:
+            self._stats["delta" if delta else "full"] += 1
+            if index is not None:
+                self._index = index
+                self._loaded_at = time.time() if epoch == self._epoch else 0.0
+        return index
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+            self._epoch += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """How refreshes were served: full downloads vs delta syncs"""
+        with self._lock:
+            return dict(self._stats, size=len(self._index) if self._index is not None else 0,
+                        version=self._index.version if self._index is not None else None)
+
+
+_shared_store: Optional[RosterStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_roster_store(ttl: float = 30.0) -> RosterStore:
+    """Return the process-wide roster store, creating it on first use"""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = RosterStore(ttl=ttl)
+        return _shared_store
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Optional, Any, Callable, Dict, Hashable, Tuple
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_stats = {"started": 0, "ready": 0, "joined": 0, "cancelled": 0, "discarded": 0, "stale": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int = 4) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        return _executor
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def speculation_stats() -> Dict[str, int]:
+    """Process-wide counts: started, used when ready or joined in flight, and thrown away"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+@dataclass
+class Speculation:
+    key: Hashable
+    future: Future
+    tag: Any
+    started_at: float
+
+
+class Speculator:
+    """A head start on one page's main request, for one session.
+
+    start() runs fn in the background as soon as the input is known; take()
+    hands its result to the button click, waiting for it if still in flight.
+    Only the latest input is kept: starting a new key cancels the old call
+    if it has not begun and otherwise lets it finish unseen. A result is
+    thrown away if it is older than ttl or was computed under another tag
+    (the result cache generation, so a collection change invalidates it).
+    A key that was just taken is not started again for the same tag within
+    ttl, so the rerun after a click doesn't repeat the request it answered.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_workers: int = 4):
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._current: Optional[Speculation] = None
+        self._taken: Optional[Tuple[Hashable, Any, float]] = None  # (key, tag, when) of the last take()
+
+    def start(self, key: Hashable, fn: Callable[[], Any], tag: Any = None):
+        """Begin computing fn for key, unless that is already under way"""
+        if self._taken is not None and self._taken[:2] == (key, tag) and time.time() - self._taken[2] < self.ttl:
+            return
+        current = self._current
+        if current is not None:
+            if current.key == key and current.tag == tag and time.time() - current.started_at < self.ttl:
+                return
+            self.discard()
+        future = _get_executor(self.max_workers).submit(fn)
+        self._current = Speculation(key=key, future=future, tag=tag, started_at=time.time())
+        _count("started")
+
+    def take(self, key: Hashable, tag: Any = None, timeout: Optional[float] = None) -> Optional[Any]:
+        """The speculative result for key, or None if there is none worth using.
+
+        The speculation is consumed either way, so a second click asks again.
+        """
+        self._taken = (key, tag, time.time())
+        current, self._current = self._current, None
+        if current is None:
+            return None
+        if current.key != key:
+            self._current = current
+            return None
+        if current.tag != tag or time.time() - current.started_at >= self.ttl:
+            _count("stale")
+            current.future.cancel()
+            return None
+        ready = current.future.done()
+        try:
+            result = current.future.result(timeout=timeout)
+        except FutureTimeout:
+            _count("discarded")
+            return None
+        except Exception:
+            _count("failed")
+            return None
+        _count("ready" if ready else "joined")
+        return result
+
+    def discard(self):
+        """Drop the current speculation: cancelled if it has not started, else its result goes unused"""
+        current, self._current = self._current, None
+        if current is not None:
+            _count("cancelled" if current.future.cancel() else "discarded")
@@ -0,0 +1,314 @@
+"""Local stand-in for the Face Recognition API, for benchmarks and offline testing.
+
+Run with `python stub_api.py --port 8003 --latency 0.05 --jitter 0.02 --error-rate 0.01`
+and point API_BASE_URL at it, or start it in-process with serve_in_background().
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from urllib.parse import parse_qs
+
+PHONE_IN_NAME = re.compile(r"(\d{10,})")
+
+
+def parse_form(content_type: str, body: bytes) -> Tuple[Dict[str, str], Dict[str, bytes]]:
+    """Split a urlencoded or multipart body into (fields, files)"""
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        fields, files = {}, {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename() is not None:
+                files[name] = part.get_payload(decode=True)
+                fields.setdefault("_filename", part.get_filename())
+            else:
+                fields[name] = part.get_payload(decode=True).decode()
+        return fields, files
+    parsed = parse_qs(body.decode(), keep_blank_values=True)
+    return {key: values[-1] for key, values in parsed.items()}, {}
+
+
+class StubState:
+    """In-memory collection shared by all request handlers"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 endpoint_latency: Optional[Dict[str, float]] = None, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.endpoint_latency = endpoint_latency or {}
+        self.random = random.Random(seed)
+        self.phones: Dict[str, str] = {}  # phone -> fingerprint of the enrolled image
+        self.requests: Dict[str, int] = {}
+        self.bytes_received: Dict[str, int] = {}
+        self.idempotent: Dict[str, Dict[str, Any]] = {}  # Idempotency-Key -> successful enroll response
+        # Collection version, bumped by every change; the log of recent changes serves ?since= deltas
+        self.version = 0
+        self.changes: List[Tuple[int, str, str]] = []  # (version, "add" | "remove", phone)
+        self.max_changes = 10000
+        self.not_modified = 0
+        # Maps uploaded bytes to the fingerprint of the face they show; benchmarks swap in a
+        # recognizer that fails on blurry or badly exposed frames
+        self.recognize: Optional[Callable[[bytes], str]] = None
+        self.lock = threading.Lock()
+
+    def record_change(self, op: str, phone: str):
+        """Bump the collection version; call with the lock held"""
+        self.version += 1
+        self.changes.append((self.version, op, phone))
+        if len(self.changes) > self.max_changes:
+            del self.changes[:len(self.changes) - self.max_changes]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+    state: StubState
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _not_modified(self, version: int) -> Optional[Dict[str, str]]:
+        """Validator headers for this collection version; sends a 304 and returns None if the client is current"""
+        headers = {"ETag": f'"v{version}"', "X-Collection-Version": str(version)}
+        if headers["ETag"] in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            with self.state.lock:
+                self.state.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", headers["ETag"])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        return headers
+
+    def _inject(self, endpoint: str) -> bool:
+        """Apply configured latency/jitter; returns True if an injected 503 was sent"""
+        state = self.state
+        with state.lock:
+            state.requests[endpoint] = state.requests.get(endpoint, 0) + 1
+            delay = state.endpoint_latency.get(endpoint, state.latency)
+            if state.jitter > 0:
+                delay += state.random.uniform(0, state.jitter)
+            fail = state.error_rate > 0 and state.random.random() < state.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            self._send_json(503, {"detail": "Injected failure"})
+        return fail
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        endpoint = {"/health": "health", "/collection/info": "collection_info",
+                    "/collection/list": "collection_list"}.get(path, path)
+        if self._inject(endpoint):
+            return
+        if path == "/health":
+            self._send_json(200, {
+                "status": "healthy",
+                "face_model": "stub",
+                "collections": ["employees"],
+                "collection_loaded": True,
+            })
+        elif path == "/collection/info":
+            with self.state.lock:
+                count, version = len(self.state.phones), self.state.version
+            headers = self._not_modified(version)
+            if headers is not None:
+                self._send_json(200, {"collection_name": "employees", "status": "green", "points_count": count,
+                                      "version": version}, headers)
+        elif path == "/collection/list":
+            params = {key: values[-1] for key, values in parse_qs(query).items()}
+            with self.state.lock:
+                version = self.state.version
+                phones = sorted(self.state.phones)
+                oldest = self.state.changes[0][0] if self.state.changes else version + 1
+                since = int(params["since"]) if "since" in params else None
+                delta = None
+                if since is not None and oldest - 1 <= since <= version:
+                    # Net effect of the changes after `since`: the last op per phone wins
+                    net: Dict[str, str] = {}
+                    for change_version, op, phone in self.state.changes:
+                        if change_version > since:
+                            net[phone] = op
+                    delta = {"version": version, "since": since, "total_count": len(phones),
+                             "added": sorted(p for p, op in net.items() if op == "add"),
+                             "removed": sorted(p for p, op in net.items() if op == "remove")}
+            if delta is not None:
+                self._send_json(200, delta, {"X-Collection-Version": str(version)})
+                return
+            headers = self._not_modified(version)
+            if headers is None:
+                return
+            total = len(phones)
+            if "offset" in params or "limit" in params:
+                offset = int(params.get("offset", 0))
+                phones = phones[offset:offset + int(params.get("limit", total))]
+            self._send_json(200, {"phones": phones, "total_count": total, "version": version}, headers)
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def _match(self, fingerprint: str, phone: str) -> Dict[str, Any]:
+        if self.state.phones.get(phone) == fingerprint:
+            return {"phone": phone, "distance": 0.12, "confidence_score": 94.0, "match_quality": "excellent"}
+        return {"phone": phone, "distance": 0.92, "confidence_score": 8.0, "match_quality": "very poor"}
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.state.lock:
+            self.state.bytes_received[path] = self.state.bytes_received.get(path, 0) + len(body)
+        if self._inject(path.strip("/")):
+            return
+        fields, files = parse_form(self.headers.get("Content-Type", ""), body)
+
+        # Uploaded bytes and URLs both reduce to a fingerprint standing in for the face embedding
+        image = files.get("file")
+        if image is not None:
+            recognize = self.state.recognize
+            fingerprint = recognize(image) if recognize is not None else hashlib.sha256(image).hexdigest()
+            source_name = fields.get("_filename", "")
+        elif fields.get("image_url"):
+            fingerprint = hashlib.sha256(fields["image_url"].encode()).hexdigest()
+            source_name = fields["image_url"]
+        else:
+            self._send_json(422, {"detail": "Provide image_url or an uploaded file"})
+            return
+
+        if path == "/enroll":
+            key = self.headers.get("Idempotency-Key")
+            with self.state.lock:
+                replay = self.state.idempotent.get(key) if key else None
+            if replay is not None:
+                self._send_json(200, replay)
+                return
+            phone = fields.get("phone")
+            if not phone:
+                found = PHONE_IN_NAME.search(source_name.rsplit("/", 1)[-1])
+                phone = found.group(1) if found else None
+            if not phone:
+                self._send_json(400, {"detail": "Phone number not provided and not found in filename"})
+                return
+            body = {"message": "Employee enrolled successfully", "phone": phone}
+            with self.state.lock:
+                self.state.phones[phone] = fingerprint
+                self.state.record_change("add", phone)
+                if key:
+                    self.state.idempotent[key] = body
+            self._send_json(200, body)
+            return
+
+        with self.state.lock:
+            matches = sorted((self._match(fingerprint, phone) for phone in self.state.phones),
+                             key=lambda match: match["distance"])
+        if path == "/login":
+            if not matches:
+                self._send_json(404, {"detail": "No enrolled faces to match against"})
+                return
+            best = matches[0]
+            self._send_json(200, dict(best, is_authenticated=best["match_quality"] == "excellent"))
+        elif path == "/search":
+            limit = int(fields.get("limit", 5))
+            self._send_json(200, {"matches": matches[:limit], "total_matches": len(matches[:limit])})
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def do_DELETE(self):
+        path = self.path.split("?")[0]
+        if path == "/collection/clear":
+            if self._inject("clear"):
+                return
+            with self.state.lock:
+                for phone in self.state.phones:
+                    self.state.record_change("remove", phone)
+                self.state.phones.clear()
+            self._send_json(200, {"message": "Collection cleared successfully"})
+        elif path.startswith("/enroll/"):
+            if self._inject("remove"):
+                return
+            phone = path[len("/enroll/"):]
+            with self.state.lock:
+                removed = self.state.phones.pop(phone, None)
+                if removed is not None:
+                    self.state.record_change("remove", phone)
+            if removed is None:
+                self._send_json(404, {"detail": f"Phone {phone} not found"})
+            else:
+                self._send_json(200, {"message": "Enrollment removed successfully", "phone": phone})
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                error_rate: float = 0.0, endpoint_latency: Optional[Dict[str, float]] = None,
+                seed: Optional[int] = None) -> ThreadingHTTPServer:
+    """Build a stub server; port 0 picks a free port"""
+    state = StubState(latency=latency, jitter=jitter, error_rate=error_rate,
+                      endpoint_latency=endpoint_latency, seed=seed)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_background(latency: float = 0.0, **kwargs) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a stub server on a daemon thread and return it with its base URL.
+
+    The server's StubState is reachable as server.RequestHandlerClass.state.
+    """
+    server = make_server(latency=latency, **kwargs)
+    threading.Thread(target=server.serve_forever, name="stub-api", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Run a local stub Face Recognition API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random delay, 0..jitter seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--endpoint-latency", action="append", default=[], metavar="ENDPOINT=SECONDS",
+                        help="Per-endpoint latency override, e.g. login=0.3 (repeatable)")
+    parser.add_argument("--seed", type=int, help="Random seed for jitter and error injection")
+    args = parser.parse_args(argv)
+
+    endpoint_latency = {}
+    for item in args.endpoint_latency:
+        name, _, seconds = item.partition("=")
+        endpoint_latency[name] = float(seconds)
+
+    server = make_server(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate, endpoint_latency=endpoint_latency, seed=args.seed)
+    print(f"Stub Face Recognition API on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, RateLimit, TokenBucket, priority
+from api_client import ApiClient, EndpointPolicy
+from stub_api import serve_in_background
+
+
+def wait_until(predicate, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def test_queued_requests_are_admitted_by_priority_then_arrival():
+    controller = AdmissionController(max_concurrency=1)
+    controller.acquire("health")  # holds the only slot
+    order = []
+
+    def request(name, endpoint):
+        with priority(name):
+            controller.acquire(endpoint)
+        order.append(name)
+        controller.release()
+
+    threads = []
+    for name, endpoint in (("bulk", "enroll"), ("admin", "health"), ("login", "login"), ("search", "search")):
+        thread = threading.Thread(target=request, args=(name, endpoint))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda n=len(threads): controller.stats()["waiting"] == n)
+
+    controller.release()
+    for thread in threads:
+        thread.join(2)
+    assert order == ["login", "search", "bulk", "admin"]
+
+
+def test_request_is_rejected_at_its_queue_deadline():
+    controller = AdmissionController(max_concurrency=1, deadlines={"admin": 0.05})
+    controller.acquire("health")
+    start = time.monotonic()
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("health")
+    assert time.monotonic() - start >= 0.05
+    stats = controller.stats()
+    assert stats["classes"]["admin"]["rejected"] == 1
+    assert stats["waiting"] == 0
+    assert stats["in_flight"] == 1
+
+
+def test_rate_limited_endpoint_does_not_block_other_endpoints():
+    controller = AdmissionController(max_concurrency=4, limits={"search": RateLimit(rate=1, burst=1)},
+                                     default_priority={"search": "search", "login": "login"})
+    controller.acquire("search")  # spends the only search token
+    blocked = threading.Thread(target=lambda: controller.acquire("search"), daemon=True)
+    blocked.start()
+    wait_until(lambda: controller.stats()["waiting"] == 1)
+
+    start = time.monotonic()
+    assert controller.acquire("login") == "login"
+    assert time.monotonic() - start < 0.1
+    blocked.join(2)
+    assert not blocked.is_alive()  # admitted once the bucket refilled
+
+
+def test_token_bucket_refills_at_its_rate_up_to_burst():
+    bucket = TokenBucket(RateLimit(rate=10, burst=2))
+    now = bucket.updated_at
+    assert bucket.wait_time(now) == 0.0
+    bucket.take()
+    bucket.take()
+    assert bucket.wait_time(now) == pytest.approx(0.1)
+    assert bucket.wait_time(now + 0.1) == pytest.approx(0.0)
+    assert bucket.wait_time(now + 60) == 0.0
+    assert bucket.tokens == 2.0
+
+
+def test_try_acquire_never_jumps_the_queue_or_exceeds_the_cap():
+    controller = AdmissionController(max_concurrency=2, limits={"search": RateLimit(rate=0.001, burst=1)})
+    assert controller.try_acquire("health")
+    assert controller.try_acquire("search")
+    assert not controller.try_acquire("health")  # cap reached
+    controller.release()
+    assert not controller.try_acquire("search")  # bucket empty
+    assert controller.try_acquire("health")
+    controller.release()
+
+    queued = threading.Thread(target=lambda: (controller.acquire("login"), controller.release()))
+    controller.acquire("health")  # both slots held again
+    queued.start()
+    wait_until(lambda: controller.stats()["waiting"] == 1)
+    controller.release()  # the queued login takes the slot at once
+    queued.join(timeout=2)
+    controller.release()
+    assert controller.stats()["in_flight"] == 0 and controller.try_acquire("health")
+
+
+def hedging_client(max_concurrency):
+    server, url = serve_in_background(latency=0.2)
+    client = ApiClient(url, policies={"health": EndpointPolicy(timeout=5, hedge=True, coalesce=False)},
+                       admission=AdmissionController(max_concurrency=max_concurrency))
+    for _ in range(20):
+        client._window("health").add(0.01)  # recent p95 well under the stub's latency
+    return server, client
+
+
+@pytest.mark.parametrize("max_concurrency, hedges, skipped", [(1, 0, 1), (2, 1, 0)])
+def test_hedge_takes_its_own_admission_slot_or_is_skipped(max_concurrency, hedges, skipped):
+    server, client = hedging_client(max_concurrency)
+    try:
+        assert client.get("health", "/health").status_code == 200
+        stats = client.stats()
+        assert (stats["hedges"], stats["hedges_skipped"]) == (hedges, skipped)
+        wait_until(lambda: client.admission.stats()["in_flight"] == 0)  # the losing hedge gives its slot back
+    finally:
+        client.close()
+        server.shutdown()
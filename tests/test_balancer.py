@@ -0,0 +1,119 @@
+import collections
+import math
+import types
+
+import pytest
+
+import balancer
+from balancer import BackendPool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(balancer, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def measured(pool, latencies):
+    """Give each backend one successful sample, in order"""
+    for backend, latency in zip(pool.backends, latencies):
+        pool.start(backend)
+        pool.finish(backend, latency, ok=True)
+
+
+def test_two_choices_never_sends_to_the_most_expensive_replica(clock):
+    pool = BackendPool(["http://a", "http://b", "http://c"], seed=42)
+    measured(pool, [0.05, 0.10, 0.90])
+    picks = collections.Counter(pool.pick().url for _ in range(300))
+    assert picks["http://c"] == 0
+    assert picks["http://a"] > picks["http://b"] > 0  # b still wins when a isn't sampled
+
+
+def test_same_seed_same_picks(clock):
+    pools = []
+    for _ in range(2):
+        pool = BackendPool(["http://a", "http://b", "http://c"], seed=42)
+        measured(pool, [0.05, 0.10, 0.90])
+        pools.append(pool)
+    assert [pools[0].pick().url for _ in range(50)] == [pools[1].pick().url for _ in range(50)]
+
+
+def test_in_flight_work_raises_a_replicas_cost(clock):
+    pool = BackendPool(["http://a", "http://b"], seed=1)
+    measured(pool, [0.1, 0.15])
+    a, b = pool.backends
+    assert pool.pick() is a
+    pool.start(a)
+    pool.start(a)  # 0.1 x 3 queued > 0.15 x 1
+    assert pool.pick() is b
+
+
+def test_unmeasured_replica_gets_traffic_first(clock):
+    pool = BackendPool(["http://a", "http://b"], seed=3)
+    measured(pool, [0.2])
+    assert pool.pick().url == "http://b"
+
+
+def test_writes_go_to_the_primary_unless_balanced(clock):
+    pool = BackendPool(["http://a", "http://b"], seed=5)
+    measured(pool, [0.9, 0.01])
+    assert all(pool.pick(write=True).url == "http://a" for _ in range(20))
+    assert pool.pick(write=False).url == "http://b"
+
+    balanced = BackendPool(["http://a", "http://b"], write_routing="balanced", seed=5)
+    measured(balanced, [0.9, 0.01])
+    assert balanced.pick(write=True).url == "http://b"
+
+
+def test_failures_count_as_the_penalty_and_decay_slowly(clock):
+    pool = BackendPool(["http://a"], decay=10.0, eject_after=99)
+    a = pool.backends[0]
+    pool.start(a)
+    pool.finish(a, 0.01, ok=False, penalty=5.0)  # a fast failure is not cheap
+    assert a.ewma == 5.0
+    clock.now += 10.0  # one decay period
+    pool.start(a)
+    pool.finish(a, 0.1, ok=True)
+    assert a.ewma == pytest.approx(5.0 * math.exp(-1) + 0.1 * (1 - math.exp(-1)))
+    pool.start(a)
+    pool.finish(a, 9.0, ok=True)  # a peak is taken at once
+    assert a.ewma == 9.0
+
+
+def test_consecutive_failures_eject_until_timeout_or_health_check(clock):
+    pool = BackendPool(["http://a", "http://b"], eject_after=2, eject_for=15.0, seed=7)
+    a, b = pool.backends
+    for ok in (False, True, False):  # a success resets the run
+        pool.start(a)
+        pool.finish(a, 0.1, ok=ok)
+    assert a.ejected_until == 0.0
+    pool.start(a)
+    pool.finish(a, 0.1, ok=False)
+    assert all(pool.pick() is b for _ in range(20))
+    assert pool.pick(write=True) is b  # the primary is skipped while ejected
+
+    clock.now += 15.0
+    assert pool.snapshot()[0]["available"]
+
+    pool.mark_health(a, ok=False)
+    assert not pool.snapshot()[0]["available"]
+    pool.mark_health(a, ok=True)  # a passing check brings it straight back
+    assert pool.pick(write=True) is a
+
+
+def test_when_everything_is_ejected_the_soonest_back_is_used(clock):
+    pool = BackendPool(["http://a", "http://b"], eject_for=15.0)
+    a, b = pool.backends
+    pool.mark_health(a, ok=False)
+    clock.now += 5.0
+    pool.mark_health(b, ok=False)
+    assert pool.pick() is a and pool.pick(exclude=[a]) is b
@@ -0,0 +1,72 @@
+import random
+
+from bulk import EnrollmentOutcome, EnrollmentRow
+from dedupe import BulkDuplicateGuard, DuplicateIndex
+
+
+def flip(value, bits, rng):
+    for position in rng.sample(range(64), bits):
+        value ^= 1 << position
+    return value
+
+
+def test_multi_index_lookup_matches_a_linear_scan():
+    rng = random.Random(7)
+    index = DuplicateIndex(max_distance=6)
+    hashes = [rng.getrandbits(64) for _ in range(2000)]
+    index.load((value, f"p{i}", f"s{i}") for i, value in enumerate(hashes))
+
+    for _ in range(300):
+        target = rng.randrange(len(hashes))
+        query = flip(hashes[target], rng.randint(0, 6), rng)
+        expected = {f"s{i}" for i, value in enumerate(hashes) if (value ^ query).bit_count() <= 6}
+        found = {match.source for match in index.find(query)}
+        assert found == expected
+        assert f"s{target}" in found
+
+
+def test_matches_come_back_closest_first_and_respect_the_radius():
+    index = DuplicateIndex(max_distance=6)
+    base = 0x0123456789ABCDEF
+    index.add(base ^ 0b111, "far", "far")
+    index.add(base ^ 0b1, "near", "near")
+    index.add(base ^ 0x7F, "out", "out")  # 7 bits away
+    assert [m.phone for m in index.find(base)] == ["near", "far"]
+
+
+def test_log_replays_removals_and_assignments(tmp_path):
+    path = str(tmp_path / "index.jsonl")
+    index = DuplicateIndex(path)
+    index.add(1, None, "a")
+    index.add(0xFFFFFFFF00000000, "2", "b")
+    index.assign_phone("a", "1")
+    index.remove_phone("2")
+
+    reloaded = DuplicateIndex(path)
+    assert len(reloaded) == 1
+    assert reloaded.find(1)[0].phone == "1"
+    assert reloaded.find(0xFFFFFFFF00000000) == []
+
+
+def test_bulk_guard_settles_each_row_on_its_own(tmp_path):
+    index = DuplicateIndex(str(tmp_path / "index.jsonl"))
+    guard = BulkDuplicateGuard(index, lambda url: 0x0123456789ABCDEF, skip=False)
+    first = EnrollmentRow(line=1, image_url="https://img/same.jpg", phone="1000000001")
+    second = EnrollmentRow(line=2, image_url="https://img/same.jpg", phone="1000000002")
+    assert guard.check(first) is None and guard.check(second) is None
+
+    def outcome(row, success):
+        return EnrollmentOutcome(line=row.line, image_url=row.image_url, phone=row.phone, success=success,
+                                 status_code=200 if success else 400, detail="", attempts=1, latency=0.0)
+
+    guard.finish(outcome(second, False))  # must not take the first row's hash with it
+    guard.finish(outcome(first, True))
+    assert [m.phone for m in index.find(0x0123456789ABCDEF)] == ["1000000001"]
+    assert index.has_source("https://img/same.jpg")
+
+
+def test_bulk_guard_skips_a_second_copy_in_the_same_run():
+    guard = BulkDuplicateGuard(DuplicateIndex(), lambda url: 42, skip=True)
+    assert guard.check(EnrollmentRow(1, "https://img/a.jpg", None)) is None
+    reason = guard.check(EnrollmentRow(2, "https://img/b.jpg", None))
+    assert reason.startswith("Skipped: likely duplicate of row 1") and guard.skipped == 1
@@ -0,0 +1,152 @@
+import time
+
+from bulk import EnrollmentRow, iter_queued_enroll, row_idempotency_key
+from enroll_queue import DONE, FAILED, IN_FLIGHT, PENDING, EnrollmentQueue
+
+
+def result(status_code, **data):
+    return {"success": status_code == 200, "data": data, "status_code": status_code}
+
+
+class Server:
+    """enroll_fn answering each phone with a scripted list of status codes, recording the keys sent"""
+
+    def __init__(self, script):
+        self.script = {phone: list(codes) for phone, codes in script.items()}
+        self.keys = []
+
+    def __call__(self, job):
+        self.keys.append((job.phone, job.idempotency_key))
+        code = self.script[job.phone].pop(0)
+        return result(code, phone=job.phone, message="Enrolled") if code == 200 else result(code, detail=f"HTTP {code}")
+
+
+def make_queue(tmp_path, server, **kwargs):
+    kwargs.setdefault("backoff", 0.0)
+    return EnrollmentQueue(str(tmp_path / "queue.db"), server, **kwargs)
+
+
+def drain(queue):
+    """Claim and settle one batch on the calling thread"""
+    for job in queue._claim():
+        queue._attempt(job)
+
+
+def test_429_and_5xx_are_retried_but_other_4xx_are_final(tmp_path):
+    queue = make_queue(tmp_path, Server({"1": [429, 200], "2": [503, 200], "3": [400]}))
+    ids = [queue.submit(f"https://img/{p}.jpg", p) for p in ("1", "2", "3")]
+    drain(queue)
+    assert [(j.status, j.attempts) for j in queue.jobs(ids)] == [(PENDING, 1), (PENDING, 1), (FAILED, 1)]
+    drain(queue)
+    jobs = queue.jobs(ids)
+    assert [(j.status, j.attempts) for j in jobs] == [(DONE, 2), (DONE, 2), (FAILED, 1)]
+    assert jobs[2].status_code == 400 and jobs[2].detail == "HTTP 400"
+
+
+def test_retries_stop_at_max_attempts_and_per_job_limit(tmp_path):
+    queue = make_queue(tmp_path, Server({"1": [503] * 3, "2": [503] * 3}), max_attempts=3)
+    capped = queue.submit("https://img/1.jpg", "1")
+    limited = queue.submit("https://img/2.jpg", "2", meta={"max_attempts": 1})
+    for _ in range(3):
+        drain(queue)
+    assert [(j.status, j.attempts) for j in queue.jobs([capped, limited])] == [(FAILED, 3), (FAILED, 1)]
+
+
+def test_every_attempt_replays_the_same_idempotency_key(tmp_path):
+    server = Server({"1": [503, 503, 200], "2": [200]})
+    queue = make_queue(tmp_path, server)
+    queue.submit("https://img/1.jpg", "1")
+    queue.submit("https://img/2.jpg", "2", meta={"idempotency_key": "bulk-run-7"})
+    for _ in range(3):
+        drain(queue)
+    keys = [key for phone, key in server.keys if phone == "1"]
+    assert len(keys) == 3 and len(set(keys)) == 1
+    assert ("2", "bulk-run-7") in server.keys
+
+
+def test_double_submit_while_waiting_returns_the_waiting_job(tmp_path):
+    queue = make_queue(tmp_path, Server({"1": [200, 200]}))
+    first = queue.submit("https://img/1.jpg", "1")
+    assert queue.submit("https://img/1.jpg", "1") == first
+    drain(queue)
+    assert queue.submit("https://img/1.jpg", "1") != first  # a settled job is not reused
+
+
+def test_expired_lease_is_reclaimed_and_the_old_owner_cannot_settle(tmp_path):
+    server = Server({"1": [200]})
+    dead = make_queue(tmp_path, server, lease_seconds=0.05)
+    alive = make_queue(tmp_path, server, lease_seconds=0.05)
+    job_id = dead.submit("https://img/1.jpg", "1")
+    [stale] = dead._claim()
+    assert alive._claim() == []  # still leased
+    time.sleep(0.06)
+    [taken] = alive._claim()
+    assert taken.id == job_id
+    dead._attempt(stale)  # its lease is gone: it must not send or settle
+    assert server.keys == [] and alive.jobs([job_id])[0].status == IN_FLIGHT
+    alive._attempt(taken)
+    assert alive.jobs([job_id])[0].status == DONE and len(server.keys) == 1
+
+
+def test_settled_jobs_reach_on_complete_and_stats(tmp_path):
+    settled = []
+    queue = make_queue(tmp_path, Server({"1": [200], "2": [422], "3": [503, 200]}),
+                       on_complete=lambda job, result: settled.append((job.phone, job.status, job.result_phone)))
+    ids = [queue.submit(f"https://img/{p}.jpg", p) for p in ("1", "2", "3")]
+    drain(queue)
+    stats = queue.stats()
+    assert (stats["depth"], stats["done"], stats["failed"]) == (1, 1, 1)
+    assert stats["oldest_age"] is not None
+    assert sorted(settled) == [("1", DONE, "1"), ("2", FAILED, None)]  # a retry is not settled
+
+    drain(queue)
+    assert queue.stats()["depth"] == 0 and queue.stats()["oldest_age"] is None
+    assert [j.id for j in queue.failed()] == [ids[1]]
+    assert queue.retry_failed() == 1 and queue.stats()["depth"] == 1
+
+
+def test_bulk_rows_go_through_the_queue(tmp_path):
+    server = Server({"1000000001": [503, 200], "1000000002": [400], "1000000003": [200]})
+    queue = make_queue(tmp_path, server, poll_interval=0.01)
+    queue.start()
+    try:
+        rows = [EnrollmentRow(line=i, image_url=f"https://img/{i}.jpg", phone=f"100000000{i}") for i in (1, 2, 3, 4)]
+        runs = set()
+
+        def submit(row, run_id):
+            runs.add(run_id)
+            return queue.submit(row.image_url, row.phone, meta={
+                "run": run_id, "idempotency_key": row_idempotency_key(run_id, row), "max_attempts": 2})
+
+        def precheck(row):
+            return "Skipped: duplicate" if row.line == 4 else None
+
+        outcomes = {o.line: o for o in iter_queued_enroll(rows, submit, queue.jobs, precheck=precheck,
+                                                           poll_interval=0.01)}
+    finally:
+        queue.stop()
+
+    assert (outcomes[1].success, outcomes[1].attempts) == (True, 2)
+    assert (outcomes[2].success, outcomes[2].status_code, outcomes[2].detail) == (False, 400, "HTTP 400")
+    assert outcomes[3].success and outcomes[4].attempts == 0
+    [run] = runs
+    assert {key for _, key in server.keys} == {f"bulk-{run}-1", f"bulk-{run}-2", f"bulk-{run}-3"}
+    assert queue.run_counts(run) == {DONE: 2, FAILED: 1}
+
+
+def test_transport_errors_are_retried(tmp_path):
+    calls = []
+
+    def enroll(job):
+        calls.append(job.id)
+        if len(calls) == 1:
+            return {"success": False, "data": {"detail": "Could not reach the API: timed out"}, "status_code": 0,
+                    "transport_error": True}
+        return result(200, phone=job.phone)
+
+    queue = make_queue(tmp_path, enroll)
+    job_id = queue.submit("https://img/1.jpg", "1")
+    drain(queue)
+    assert queue.jobs([job_id])[0].status == PENDING
+    drain(queue)
+    assert queue.jobs([job_id])[0].status == DONE and len(calls) == 2
@@ -0,0 +1,92 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from frames import FrameBurst, FrameScore, login_best_frames, score_frames
+
+
+def checkerboard(side=64, cell=4, low=60, high=180):
+    cells = (np.indices((side, side)) // cell).sum(axis=0) % 2
+    return np.where(cells, high, low).astype(np.uint8)
+
+
+def blurred(gray, radius=3):
+    return np.asarray(Image.fromarray(gray).filter(ImageFilter.GaussianBlur(radius)))
+
+
+def encode(gray, fmt="PNG"):
+    out = BytesIO()
+    Image.fromarray(gray).save(out, fmt)
+    return out.getvalue()
+
+
+def test_sharper_frames_rank_first():
+    sharp = checkerboard()
+    stack = np.stack([blurred(sharp, 3), sharp, blurred(sharp, 1)])
+    scored = score_frames(stack, np.array([[640, 480]] * 3))
+    assert list(np.argsort(-scored["score"])) == [1, 2, 0]
+    # Sharpness is normalised to the sharpest frame, so the score is its exposure x size
+    assert abs(scored["score"][1] - scored["exposure"][1]) < 1e-6
+
+
+def test_dark_blown_out_and_small_frames_score_lower():
+    sharp = checkerboard()
+    dark = checkerboard(low=0, high=40)
+    blown = checkerboard(low=215, high=255)
+    stack = np.stack([sharp, dark, blown, sharp])
+    scored = score_frames(stack, np.array([[640, 480], [640, 480], [640, 480], [160, 120]]), min_side=320)
+    assert scored["exposure"][0] > max(scored["exposure"][1], scored["exposure"][2])
+    assert scored["size"][3] == 120 / 320 and scored["size"][0] == 1.0
+    assert int(np.argmax(scored["score"])) == 0
+
+
+def test_contrast_alone_does_not_read_as_sharpness():
+    stack = np.stack([checkerboard(low=100, high=140), checkerboard(low=20, high=220)])
+    sharpness = score_frames(stack, np.array([[640, 480]] * 2))["sharpness"]
+    assert abs(sharpness[0] - sharpness[1]) / sharpness[1] < 0.01
+
+
+def test_burst_keeps_aspect_ratio_by_center_cropping():
+    wide = np.full((200, 400), 255, dtype=np.uint8)
+    wide[:, 100:300] = 0  # the centered square is all black; a squash would keep the white sides
+    burst = FrameBurst([encode(wide)], side=64)
+    assert burst.gray.shape == (1, 64, 64)
+    assert burst.gray.mean() < 5  # squashed, half the square would be white
+    assert burst.scores()[0].width == 400 and burst.scores()[0].height == 200
+
+
+def test_burst_ranks_frames_of_an_animation():
+    sharp = checkerboard(side=128)
+    frames = [Image.fromarray(blurred(sharp, 4)), Image.fromarray(sharp)]
+    out = BytesIO()
+    frames[0].save(out, "GIF", save_all=True, append_images=frames[1:])
+    burst = FrameBurst([out.getvalue()], side=64)
+    assert len(burst) == 2
+    assert [frame.index for frame in burst.ranked(min_side=64)] == [1, 0]
+
+
+def frame(index):
+    return FrameScore(index=index, score=1.0, sharpness=1.0, exposure=1.0, size=1.0, width=640, height=480)
+
+
+def login_result(authenticated):
+    return {"success": True, "data": {"is_authenticated": authenticated}, "status_code": 200}
+
+
+def test_only_upstream_logins_count_as_calls():
+    answers = {0: (login_result(False), True), 1: (login_result(True), False)}
+    result, used, calls = login_best_frames([frame(0), frame(1), frame(2)], answers.__getitem__, attempts=3)
+    assert result["data"]["is_authenticated"] and used.index == 1
+    assert calls == 1  # frame 0 was answered by the result cache
+
+
+def test_login_stops_at_attempts():
+    tried = []
+
+    def login(index):
+        tried.append(index)
+        return login_result(False), False
+
+    _, used, calls = login_best_frames([frame(3), frame(1), frame(2)], login, attempts=2)
+    assert tried == [3, 1] and calls == 2 and used.index == 1
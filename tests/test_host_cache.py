@@ -0,0 +1,58 @@
+import json
+
+from host_cache import HostCache
+
+
+def test_workers_share_entries_through_the_file(tmp_path):
+    path = str(tmp_path / "host.db")
+    one, two = HostCache(path), HostCache(path)
+    assert one.put("health", "", b'{"status": "healthy"}', ttl=10)
+    assert two.get_json("health", "") == {"status": "healthy"}
+
+
+def test_invalidation_drops_collection_entries_and_refuses_stale_writes(tmp_path):
+    path = str(tmp_path / "host.db")
+    writer, other = HostCache(path), HostCache(path)
+    writer.collection_changed()
+    other.collection_changed()
+    generation = writer.generation()
+    writer.put("image", "u", b"bytes", ttl=10)
+    writer.put("collection_info", "", b"{}", ttl=10, generation=generation)
+
+    assert other.invalidate_collection() == generation + 1
+    assert writer.get("collection_info", "") is None
+    assert writer.get("image", "u") is not None  # not derived from the collection
+    # A read that started before the invalidation must not be published after it
+    assert not writer.put("collection_info", "", b"{}", ttl=10, generation=generation)
+    assert writer.stats()["refused"] == 1
+    assert writer.collection_changed() and not other.collection_changed()
+
+
+def test_fetch_json_skips_storing_across_an_invalidation(tmp_path):
+    path = str(tmp_path / "host.db")
+    cache, other = HostCache(path), HostCache(path)
+
+    def fetch():
+        other.invalidate_collection()  # an enroll lands while the read is in flight
+        return {"phones": ["1"]}
+
+    assert cache.fetch_json("collection_list", "0:10", 10, fetch, collection=True) == {"phones": ["1"]}
+    assert cache.get("collection_list", "0:10") is None
+
+
+def test_expiry_and_size_limit(tmp_path):
+    cache = HostCache(str(tmp_path / "host.db"), max_bytes=1000, max_entry_bytes=600)
+    assert not cache.put("image", "big", b"x" * 700, ttl=10)
+    cache.put("image", "gone", b"x", ttl=-1)
+    assert cache.get("image", "gone") is None
+    for i in range(5):
+        cache.put("image", str(i), b"x" * 300, ttl=10)
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert cache.get("image", "4") is not None
+
+
+def test_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "host.db")
+    HostCache(path).put_json("health", "", {"status": "healthy"}, ttl=10)
+    assert HostCache(path).get("health", "").value == json.dumps({"status": "healthy"}).encode()
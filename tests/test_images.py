@@ -0,0 +1,137 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import pytest
+import requests
+from PIL import Image
+
+from images import ImageProbeError, ImageTooLarge, probe_image
+
+
+def jpeg(width, height):
+    out = BytesIO()
+    Image.new("RGB", (width, height), (90, 120, 150)).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+class ImageServer:
+    """Serves one body at /img, honouring Range or not, and records what each request asked for"""
+
+    def __init__(self, body, honour_range=True):
+        self.body = body
+        self.honour_range = honour_range
+        self.requests = []  # (method, Range header)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                server.requests.append(("HEAD", self.headers.get("Range")))
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(server.body)))
+                self.end_headers()
+
+            def do_GET(self):
+                requested = self.headers.get("Range")
+                server.requests.append(("GET", requested))
+                if self.path != "/img":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                match = re.match(r"bytes=(\d+)-(\d+)", requested or "")
+                if match and server.honour_range:
+                    start, end = int(match.group(1)), min(int(match.group(2)), len(server.body) - 1)
+                    part = server.body[start:end + 1]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(server.body)}")
+                else:
+                    part = server.body
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(part)))
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                try:
+                    for i in range(0, len(part), 4096):
+                        self.wfile.write(part[i:i + 4096])
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the probe hung up once it had the header
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/img"
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(body, honour_range=True):
+        servers.append(ImageServer(body, honour_range))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.httpd.shutdown()
+
+
+def test_probe_reads_header_with_a_range_request(serve):
+    body = jpeg(640, 480)
+    server = serve(body)
+    info = probe_image(server.url, max_probe_bytes=1024)
+    assert (info.format, info.width, info.height) == ("JPEG", 640, 480)
+    assert info.size == len(body)  # from Content-Range, no HEAD needed
+    assert info.etag == '"v1"'
+    assert server.requests == [("GET", "bytes=0-1023")]
+
+
+def test_probe_cuts_off_a_full_body_when_the_server_ignores_range(serve):
+    body = jpeg(2000, 1500) + b"\0" * (2 * 1024 * 1024)  # a large file behind a small header
+    server = serve(body, honour_range=False)
+    info = probe_image(server.url, max_probe_bytes=64 * 1024, chunk_size=1024)
+    assert (info.width, info.height) == (2000, 1500)
+    assert info.size == len(body)  # the 200's Content-Length
+    assert [method for method, _ in server.requests] == ["GET"]
+
+
+def test_probe_falls_back_to_head_for_the_size(serve):
+    body = jpeg(32, 32)
+    server = serve(body, honour_range=False)
+
+    class NoLength:
+        """Session wrapper dropping Content-Length from GET responses"""
+
+        def __init__(self):
+            self.session = requests.Session()
+
+        def get(self, *args, **kwargs):
+            response = self.session.get(*args, **kwargs)
+            del response.headers["Content-Length"]
+            return response
+
+        def head(self, *args, **kwargs):
+            return self.session.head(*args, **kwargs)
+
+    info = probe_image(server.url, session=NoLength())
+    assert info.size == len(body)
+    assert [method for method, _ in server.requests] == ["GET", "HEAD"]
+
+
+def test_pixel_cap_rejects_oversized_images_from_the_header(serve):
+    server = serve(jpeg(3000, 2000))
+    with pytest.raises(ImageTooLarge):
+        probe_image(server.url, max_pixels=1000 * 1000)
+    assert probe_image(server.url, max_pixels=3000 * 2000).width == 3000
+
+
+def test_unreadable_or_missing_images_raise_probe_errors(serve):
+    server = serve(b"not an image" * 100)
+    with pytest.raises(ImageProbeError):
+        probe_image(server.url, max_probe_bytes=512)
+    with pytest.raises(ImageProbeError, match="HTTP 404"):
+        probe_image(server.url.replace("/img", "/missing"))
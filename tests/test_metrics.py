@@ -0,0 +1,70 @@
+import re
+
+from metrics import ApiMetrics, Histogram
+
+
+def test_quantile_interpolates_inside_its_bucket():
+    histogram = Histogram(buckets=(0.1, 0.2, 0.4))
+    assert histogram.quantile(0.5) is None
+    for value in (0.05, 0.15, 0.15, 0.3):
+        histogram.observe(value)
+    assert histogram.quantile(0.25) == 0.1  # all of the first bucket
+    assert abs(histogram.quantile(0.5) - 0.15) < 1e-9  # halfway through (0.1, 0.2]
+    assert abs(histogram.quantile(1.0) - 0.4) < 1e-9
+
+
+def test_values_on_a_bound_and_beyond_the_last_bucket():
+    histogram = Histogram(buckets=(0.1, 0.2))
+    histogram.observe(0.1)  # le="0.1" includes the bound itself
+    assert histogram.counts == [1, 0, 0]
+    histogram.observe(5.0)
+    assert histogram.quantile(0.99) == 0.2  # +Inf reports the last finite bound
+
+
+def test_merge_adds_counts_and_sums():
+    one, two = Histogram(buckets=(1.0,)), Histogram(buckets=(1.0,))
+    one.observe(0.5)
+    two.observe(2.0)
+    one.merge(two)
+    assert one.counts == [1, 1] and one.count == 2 and one.sum == 2.5
+
+
+def samples(text, name):
+    """{labels: value} for one metric in Prometheus text output"""
+    return {labels: float(value) for labels, value in re.findall(rf"^{name}\{{(.*)\}} (\S+)$", text, re.M)}
+
+
+def test_render_prometheus_histograms_are_cumulative():
+    metrics = ApiMetrics(buckets=(0.1, 1.0))
+    for latency in (0.05, 0.5, 0.5, 3.0):
+        metrics.observe("login", "200", latency, request_bytes=10, response_bytes=100)
+    text = metrics.render_prometheus()
+
+    assert "# TYPE face_api_request_duration_seconds histogram" in text
+    buckets = samples(text, "face_api_request_duration_seconds_bucket")
+    assert buckets == {'endpoint="login",status="200",le="0.1"': 1, 'endpoint="login",status="200",le="1.0"': 3,
+                       'endpoint="login",status="200",le="+Inf"': 4}
+    assert samples(text, "face_api_request_duration_seconds_count") == {'endpoint="login",status="200"': 4}
+    assert samples(text, "face_api_request_duration_seconds_sum") == {'endpoint="login",status="200"': 4.05}
+    assert samples(text, "face_api_request_bytes_total") == {'endpoint="login"': 40}
+    assert samples(text, "face_api_response_bytes_total") == {'endpoint="login"': 400}
+    assert text.endswith("\n")
+
+
+def test_render_prometheus_counters_and_admission_metrics():
+    metrics = ApiMetrics(buckets=(0.1,))
+    metrics.record_error("search", "timeout")
+    metrics.record_error("search", "timeout")
+    metrics.record_coalesced("collection_list")
+    metrics.record_not_modified("collection_info", saved_bytes=512)
+    metrics.observe_queue_wait("enroll", "bulk", 0.5, admitted=False)
+    text = metrics.render_prometheus(prefix="test")
+
+    assert samples(text, "test_request_errors_total") == {'endpoint="search",kind="timeout"': 2}
+    assert samples(text, "test_coalesced_requests_total") == {'endpoint="collection_list"': 1}
+    assert samples(text, "test_saved_response_bytes_total") == {'endpoint="collection_info"': 512}
+    assert samples(text, "test_admission_wait_seconds_count") == {'endpoint="enroll",priority="bulk"': 1}
+    assert samples(text, "test_admission_rejected_total") == {'endpoint="enroll",priority="bulk"': 1}
+    # Every metric is declared once, before its samples
+    declared = re.findall(r"^# TYPE (\S+) ", text, re.M)
+    assert len(declared) == len(set(declared))
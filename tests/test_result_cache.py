@@ -0,0 +1,76 @@
+from result_cache import ResultCache
+
+
+def search_result(count):
+    matches = [{"phone": str(i), "similarity": 99 - i} for i in range(count)]
+    return {"success": True, "data": {"matches": matches, "total_matches": count}, "status_code": 200}
+
+
+def test_bump_drops_entries_and_refuses_results_from_an_older_generation():
+    cache = ResultCache()
+    generation = cache.generation
+    cache.put("login", "k", {"success": True, "data": {"phone": "1"}}, generation)
+    assert cache.get("login", "k")["data"] == {"phone": "1"}
+
+    cache.bump()  # an enroll lands
+    assert cache.get("login", "k") is None
+    # A login that was sent before the enroll must not be cached after it
+    cache.put("login", "k", {"success": True, "data": {"phone": "1"}}, generation)
+    assert cache.get("login", "k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_failed_results_are_not_cached():
+    cache = ResultCache()
+    cache.put("login", "k", {"success": False, "data": {}}, cache.generation)
+    assert cache.get("login", "k") is None
+
+
+def test_a_larger_search_answers_a_smaller_one_but_not_the_reverse():
+    cache = ResultCache()
+    cache.put("search", "k", search_result(10), cache.generation, limit=10)
+    smaller = cache.get("search", "k", limit=3)
+    assert [m["phone"] for m in smaller["data"]["matches"]] == ["0", "1", "2"]
+    assert smaller["data"]["total_matches"] == 3
+
+    cache = ResultCache()
+    cache.put("search", "k", search_result(5), cache.generation, limit=5)
+    assert cache.get("search", "k", limit=10) is None
+    # and a smaller search never replaces the larger one already cached
+    cache.put("search", "k", search_result(10), cache.generation, limit=10)
+    cache.put("search", "k", search_result(2), cache.generation, limit=2)
+    assert len(cache.get("search", "k", limit=10)["data"]["matches"]) == 10
+
+
+def test_a_short_result_answers_any_larger_limit():
+    cache = ResultCache()
+    cache.put("search", "k", search_result(2), cache.generation, limit=5)  # the server had only two
+    assert len(cache.get("search", "k", limit=20)["data"]["matches"]) == 2
+
+
+def test_collection_fingerprint_change_bumps_the_generation():
+    cache = ResultCache()
+    cache.observe_collection({"count": 3, "name": "faces"})  # first sight is the baseline
+    cache.put("login", "k", {"success": True, "data": {}}, cache.generation)
+    generation = cache.generation
+
+    cache.observe_collection({"name": "faces", "count": 3})  # same info, different key order
+    cache.observe_collection(None)  # monitor had nothing
+    assert cache.generation == generation and cache.get("login", "k") is not None
+
+    cache.observe_collection({"count": 4, "name": "faces"})  # another worker enrolled someone
+    assert cache.generation == generation + 1
+    assert cache.get("login", "k") is None
+
+
+def test_expired_and_least_recently_used_entries_are_dropped():
+    cache = ResultCache(max_entries=2, ttl=0)
+    cache.put("login", "a", {"success": True, "data": {}}, cache.generation)
+    assert cache.get("login", "a") is None
+
+    cache = ResultCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.put("login", key, {"success": True, "data": {}}, cache.generation)
+    cache.get("login", "a")
+    cache.put("login", "c", {"success": True, "data": {}}, cache.generation)
+    assert cache.get("login", "b") is None and cache.get("login", "a") is not None
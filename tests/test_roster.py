@@ -0,0 +1,84 @@
+import threading
+
+from roster import RosterIndex, RosterStore, sync_roster
+
+
+def test_delta_applies_adds_and_removes():
+    index = RosterIndex(["300", "100", "200"], version=4)
+    updated = sync_roster(index, lambda since: {"added": ["150"], "removed": ["300"], "version": 5,
+                                                "total_count": 3})
+    assert list(updated.page(range(len(updated)), 0, 10)) == ["100", "150", "200"]
+    assert updated.version == 5
+    assert len(index) == 3 and index.version == 4  # the old index is untouched for readers
+
+
+def test_unchanged_delta_keeps_the_index():
+    index = RosterIndex(["1"], version=7)
+    assert sync_roster(index, lambda since: {"added": [], "removed": [], "version": 7}) is index
+
+
+def test_unusable_delta_falls_back_to_a_full_download():
+    assert sync_roster(RosterIndex(["1"]), lambda since: {"added": [], "removed": []}) is None  # no version
+    index = RosterIndex(["1"], version=1)
+    assert sync_roster(index, lambda since: None) is None
+    assert sync_roster(index, lambda since: {"phones": ["1"]}) is None
+    # Doesn't add up to the reported total: changes were missed
+    assert sync_roster(index, lambda since: {"added": ["2"], "removed": [], "version": 2, "total_count": 5}) is None
+
+
+def test_store_refreshes_by_delta_after_invalidate():
+    store = RosterStore(ttl=60)
+    full_calls = []
+
+    def list_fn(offset, limit):
+        full_calls.append(offset)
+        return {"phones": ["1", "2"], "total_count": 2, "version": 1}
+
+    def delta_fn(since):
+        assert since == 1
+        return {"added": ["3"], "removed": ["1"], "version": 2, "total_count": 2}
+
+    assert len(store.get(list_fn, delta_fn=delta_fn)) == 2
+    store.invalidate()
+    index = store.get(list_fn, delta_fn=delta_fn)
+    assert index[0] == "2" and index[1] == "3"
+    assert full_calls == [0]
+    assert store.stats()["delta"] == 1 and store.stats()["full"] == 1
+
+
+def test_concurrent_refreshes_share_one_download_outside_the_lock():
+    store = RosterStore(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def list_fn(offset, limit):
+        calls.append(offset)
+        started.set()
+        release.wait(2)
+        return {"phones": ["1"], "total_count": 1, "version": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.get(list_fn))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(2)
+    # The download is in flight, yet the store's lock is free for stats() and invalidate()
+    assert store.stats()["size"] == 0
+    release.set()
+    for thread in threads:
+        thread.join(timeout=2)
+    assert calls == [0] and len(results) == 4 and all(index is results[0] for index in results)
+
+
+def test_refresh_that_raced_an_invalidate_is_not_taken_as_fresh():
+    store = RosterStore(ttl=60)
+    versions = iter([1, 2])
+
+    def list_fn(offset, limit):
+        version = next(versions)
+        if version == 1:
+            store.invalidate()  # an enroll lands while the roster is downloading
+        return {"phones": [str(version)], "total_count": 1, "version": version}
+
+    assert store.get(list_fn)[0] == "1"
+    assert store.get(list_fn)[0] == "2"  # refreshed again instead of serving the raced copy
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def wait_for_followers(flight, count, timeout=2.0):
+    end = time.monotonic() + timeout
+    while flight.stats()["followers"] < count:
+        assert time.monotonic() < end, "callers never joined the flight"
+        time.sleep(0.001)
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Start callers threads on the same key while fn is held in flight; return their outcomes"""
+    outcomes = []
+    lock = threading.Lock()
+
+    def call():
+        try:
+            outcome = flight.do(key, fn)
+        except Exception as e:
+            outcome = e
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    threads, outcomes = run_concurrently(flight, "k", fn, 8)
+    wait_for_followers(flight, 7)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in outcomes) == [False] + [True] * 7
+    assert {value for value, _ in outcomes} == {"value"}
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_error_is_raised_in_every_waiting_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(2)
+        raise ValueError("upstream failed")
+
+    threads, outcomes = run_concurrently(flight, "k", fn, 5)
+    wait_for_followers(flight, 4)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert len(outcomes) == 5
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+
+def test_nothing_is_cached_after_the_call_returns():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("first")))
+    assert flight.do("k", lambda: 2) == (2, False)
+    assert flight.do("k", lambda: 3) == (3, False)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Optional, Dict, Any
+
+from PIL import Image, ImageOps
+
+
+def make_thumbnail(data: bytes, max_side: int = 600, quality: int = 80) -> bytes:
+    """Decode image bytes at reduced size and return a small upright JPEG.
+
+    For JPEGs, Image.draft() asks libjpeg to decode at 1/2, 1/4 or 1/8 scale,
+    so a 12 MP photo is never fully materialised just to be shown at 300 px.
+    EXIF orientation is applied so phone photos are not shown sideways.
+    """
+    image = Image.open(BytesIO(data))
+    if image.format == "JPEG":
+        image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    out = BytesIO()
+    image.save(out, "JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
+class ThumbnailCache:
+    """Content-addressed on-disk thumbnail cache with size-based eviction.
+
+    Thumbnails are stored under the SHA-256 of the source bytes and the
+    thumbnail parameters, so identical photos at different URLs share one
+    file. A small alias file per URL lets a restarted process find the
+    thumbnail again without downloading the original, for up to max_age.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024,
+                 max_age: float = 300.0, max_side: int = 600, quality: int = 80):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_side = max_side
+        self.quality = quality
+        os.makedirs(os.path.join(directory, "thumbs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "urls"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "decode_seconds": 0.0}
+        self._size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(directory, "thumbs")))
+
+    def _thumb_path(self, key: str) -> str:
+        return os.path.join(self.directory, "thumbs", f"{key}.jpg")
+
+    def _alias_path(self, url: str) -> str:
+        return os.path.join(self.directory, "urls", hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def key_for(self, data: bytes) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(f":{self.max_side}:{self.quality}".encode())
+        return digest.hexdigest()
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._thumb_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        os.utime(path)  # mtime doubles as the LRU clock
+        return data
+
+    def get_for_url(self, url: str) -> Optional[bytes]:
+        """Return the thumbnail last stored for url, if the alias is still fresh"""
+        try:
+            with open(self._alias_path(url), encoding="utf-8") as f:
+                alias = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - alias.get("saved_at", 0) >= self.max_age:
+            return None
+        data = self._read(alias["key"])
+        if data is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+        return data
+
+    def get_or_create(self, data: bytes, url: Optional[str] = None) -> bytes:
+        """Return the thumbnail for source bytes, decoding only on a cache miss"""
+        key = self.key_for(data)
+        thumb = self._read(key)
+        if thumb is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+        else:
+            start = time.perf_counter()
+            thumb = make_thumbnail(data, self.max_side, self.quality)
+            elapsed = time.perf_counter() - start
+            self._write(key, thumb)
+            with self._lock:
+                self._stats["misses"] += 1
+                self._stats["decode_seconds"] += elapsed
+
+        if url:
+            alias_path = self._alias_path(url)
+            tmp_path = f"{alias_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "saved_at": time.time()}, f)
+            os.replace(tmp_path, alias_path)
+        return thumb
+
+    def _write(self, key: str, thumb: bytes):
+        path = self._thumb_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(thumb)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(thumb)
+            over_budget = self._size > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used thumbnails until the directory fits the budget"""
+        with self._lock:
+            entries = sorted(
+                (entry for entry in os.scandir(os.path.join(self.directory, "thumbs")) if entry.name.endswith(".jpg")),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            size = sum(entry.stat().st_size for entry in entries)
+            for entry in entries:
+                if size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    file_size = entry.stat().st_size
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                size -= file_size
+                self._stats["evictions"] += 1
+            self._size = size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, bytes=self._size, max_bytes=self.max_bytes)
+
+
+_shared_cache: Optional[ThumbnailCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_thumbnail_cache(directory: str, max_bytes: int = 256 * 1024 * 1024,
+                               max_age: float = 300.0, max_side: int = 600) -> ThumbnailCache:
+    """Return the process-wide thumbnail cache, creating it on first use"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ThumbnailCache(directory, max_bytes=max_bytes, max_age=max_age, max_side=max_side)
+        return _shared_cache
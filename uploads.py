@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+@dataclass
+class PreparedUpload:
+    """A photo normalised and re-encoded for sending to the API"""
+    data: bytes
+    width: int
+    height: int
+    quality: int
+    original_bytes: int
+    filename: str = "upload.jpg"
+
+
+def prepare_upload(data: bytes, max_side: int = 1024, target_bytes: int = 200 * 1024,
+                   min_quality: int = 40, max_quality: int = 90, filename: str = "upload.jpg") -> PreparedUpload:
+    """Apply EXIF orientation, downscale to max_side and re-encode as a size-targeted JPEG.
+
+    Quality is binary-searched for the best setting that fits target_bytes;
+    if even min_quality is too big, the min_quality encoding is returned.
+    """
+    image = Image.open(BytesIO(data))
+    if image.format == "JPEG":
+        image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    def encode(quality: int) -> bytes:
+        out = BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+    best_quality, best = min_quality, encode(min_quality)
+    lo, hi = min_quality + 1, max_quality
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        encoded = encode(quality)
+        if len(encoded) <= target_bytes:
+            best_quality, best = quality, encoded
+            lo = quality + 1
+        else:
+            hi = quality - 1
+
+    stem = filename.rsplit(".", 1)[0] or "upload"
+    return PreparedUpload(data=best, width=image.width, height=image.height, quality=best_quality,
+                          original_bytes=len(data), filename=f"{stem}.jpg")